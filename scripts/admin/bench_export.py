@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+bench_export.py: Stage-by-stage benchmark of the export pipeline on synthetic configs.
+
+For each scale it generates a lab-config.yml-shaped file and an encrypted secrets
+file under a throwaway key, then times every stage of export-config.py separately:
+key load, decrypt, YAML parse (config and secrets), merge, flatten and each writer.
+Each stage reports the best of --repeat runs in milliseconds.
+
+Results are written as JSON (--output). With --baseline, any stage that is more than
+--threshold slower than the baseline (and above the --min-ms noise floor) is reported
+and the script exits 1, which is what `make bench` enforces. A --baseline that does
+not exist, or shares no scale with this run, exits 2: the gate never passes unchecked.
+"""
+import argparse
+import base64
+import contextlib
+import datetime
+import importlib.util
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SUBSCRIBER_DIR = Path(__file__).resolve().parent.parent / 'subscriber'
+sys.path.insert(0, str(SUBSCRIBER_DIR))
+import yaml
+import secrets_store
+import yaml_loader
+
+# name -> (leaf keys, nesting depth)
+SCALES = {
+    '100': (100, 3),
+    '1k': (1000, 3),
+    '10k': (10000, 3),
+    '100k': (100000, 3),
+    'deep': (2000, 40),
+}
+DEFAULT_SCALES = ['100', '1k', '10k', 'deep']
+
+
+def load_export_config():
+    """Dynamically load export-config.py module"""
+    spec = importlib.util.spec_from_file_location("export_config", SUBSCRIBER_DIR / 'export-config.py')
+    export_config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(export_config)
+    return export_config
+
+
+def synthetic_tree(keys, depth, label):
+    """A nested dict with `keys` leaves spread over branches `depth` levels deep."""
+    tree = {}
+    per_branch = 10
+    for i in range(0, keys, per_branch):
+        node = tree
+        for level in range(depth - 1):
+            node = node.setdefault(f"{label}_{level}_{(i // per_branch) % (level + 2)}", {})
+        branch = node.setdefault(f"item_{i // per_branch:06d}", {})
+        for j in range(min(per_branch, keys - i)):
+            if j == 0:
+                branch['allowed_groups'] = ['PureSEs', 'PureGuests']
+            else:
+                branch[f"value_{j}"] = f"{label}-value-{i + j}"
+    return tree
+
+
+def write_inputs(directory, keys, depth):
+    """Write lab-config.yml, secrets.yml.encrypted and a key file; return their paths."""
+    config_path = directory / 'lab-config.yml'
+    secrets_path = directory / 'secrets.yml.encrypted'
+    key_path = directory / 'bench.key'
+    key = os.urandom(32)
+    key_path.write_text(base64.b64encode(key).decode())
+    config_path.write_text(yaml.safe_dump(synthetic_tree(keys, depth, 'config'), sort_keys=False))
+    secrets_yaml = yaml.safe_dump(synthetic_tree(max(10, keys // 10), 2, 'secret'), sort_keys=False)
+    secrets_path.write_bytes(secrets_store.encrypt_bytes(secrets_yaml.encode(), key))
+    return config_path, secrets_path, key_path
+
+
+def best_of(fn, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_scale(exporter, name, repeat):
+    keys, depth = SCALES[name]
+    stages = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        directory = Path(temp_dir)
+        config_path, secrets_path, key_path = write_inputs(directory, keys, depth)
+
+        def key_load():
+            secrets_store.invalidate()
+            return secrets_store.load_key(key_path)
+        stages['key_load'], key = best_of(key_load, repeat)
+        ciphertext = secrets_path.read_bytes()
+        stages['decrypt'], plaintext = best_of(lambda: secrets_store.decrypt_bytes(ciphertext, key), repeat)
+        raw_config = config_path.read_bytes()
+        stages['yaml_parse_config'], config = best_of(lambda: yaml_loader.safe_load(raw_config), repeat)
+        stages['yaml_parse_secrets'], secrets = best_of(lambda: yaml_loader.safe_load(bytes(plaintext)), repeat)
+        stages['merge'], merged = best_of(lambda: exporter.merge_config(config, secrets), repeat)
+        stages['flatten'], flat = best_of(lambda: list(exporter.iter_flatten(merged, list_format='join')), repeat)
+        for export_type in sorted(exporter.EXPORTERS):
+            output = directory / f"lab-config.{export_type}"
+            pairs = flat if exporter.DEFAULT_LIST_FORMATS[export_type] == 'join' else list(exporter.iter_flatten(merged))
+            with contextlib.redirect_stdout(io.StringIO()):
+                stages[f"write_{export_type}"], _ = best_of(lambda: exporter.EXPORTERS[export_type](pairs, output), repeat)
+    return {'scale': name, 'keys': len(flat), 'depth': depth, 'stages': {k: round(v, 3) for k, v in stages.items()}}
+
+
+def compare(results, baseline, threshold, min_ms):
+    """Return (scale, stage, baseline ms, current ms) for every regression."""
+    previous = {entry['scale']: entry['stages'] for entry in baseline.get('results', [])}
+    regressions = []
+    for entry in results:
+        for stage, ms in entry['stages'].items():
+            base = previous.get(entry['scale'], {}).get(stage)
+            if base is None or ms < min_ms:
+                continue
+            if ms > base * (1 + threshold):
+                regressions.append((entry['scale'], stage, base, ms))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark export-config.py stages on synthetic configs.")
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=DEFAULT_SCALES, help='Scales to run (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage; the best is reported')
+    parser.add_argument('--output', help='Write JSON results to this file')
+    parser.add_argument('--baseline', help='Baseline JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed slowdown vs baseline (0.25 = 25%%)')
+    parser.add_argument('--min-ms', type=float, default=5.0, help='Ignore stages faster than this (timer noise)')
+    args = parser.parse_args()
+
+    exporter = load_export_config()
+    report = {
+        'meta': {
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'yaml_loader': yaml_loader.LOADER_NAME,
+            'repeat': args.repeat,
+        },
+        'results': [],
+    }
+    for name in args.scales:
+        entry = bench_scale(exporter, name, args.repeat)
+        report['results'].append(entry)
+        print(f"{name:>5} ({entry['keys']} keys, depth {entry['depth']}):")
+        for stage, ms in entry['stages'].items():
+            print(f"    {stage:<20} {ms:10.3f} ms")
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ Results written to {args.output}")
+
+    if args.baseline:
+        if not Path(args.baseline).exists():
+            print(f"❌ No baseline at {args.baseline}; run 'make bench-baseline' to record one", file=sys.stderr)
+            return 2
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        compared = {entry['scale'] for entry in baseline.get('results', [])} & set(args.scales)
+        if not compared:
+            print(f"❌ {args.baseline} has none of the scales {', '.join(args.scales)}; "
+                  f"record a new baseline with 'make bench-baseline'", file=sys.stderr)
+            return 2
+        regressions = compare(report['results'], baseline, args.threshold, args.min_ms)
+        if regressions:
+            print(f"\n❌ {len(regressions)} stage(s) regressed by more than {args.threshold:.0%}:")
+            for scale, stage, base, ms in regressions:
+                print(f"    {scale:>5} {stage:<20} {base:10.3f} ms -> {ms:10.3f} ms")
+            return 1
+        print(f"\n✅ No stage regressed by more than {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+bench_yaml_loader.py: Compare YAML loading paths on a synthetic lab config.
+
+Generates a lab-config.yml-shaped file with --keys leaf values (default 10k) and
+times the pure-Python SafeLoader, the libyaml CSafeLoader (when available) and
+yaml_loader.load_cached() hits.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'subscriber'))
+import yaml
+import yaml_loader
+
+
+def synthetic_config(keys):
+    """A vm_template_pipeline-like tree with roughly `keys` leaf values."""
+    config = {'lab_info': {'name': 'Synthetic_Lab', 'version': '1.0.0'}, 'vm_template_pipeline': {}}
+    pipeline = config['vm_template_pipeline']
+    for i in range(max(1, keys // 10)):
+        pipeline[f"template_{i:05d}"] = {
+            'template_name': f"synthetic-template-{i}",
+            'source_candidate': f"candidate_{i}",
+            'network_type': 'single_homed',
+            'status': 'planned',
+            'network_config': {'primary_adapter': 'vmxnet3', 'primary_network': 'MgmtDPG', 'dhcp_enabled': True},
+            'preparation_steps': ['cleanup-logs', 'reset-network-config'],
+            'version': '1.0.0',
+        }
+    return config
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark YAML loading paths.")
+    parser.add_argument('--keys', type=int, default=10000, help='Approximate number of leaf keys')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement (best is reported)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        yaml_loader.CACHE_DIR = Path(temp_dir) / 'cache'
+        config_path = Path(temp_dir) / 'lab-config.yml'
+        config_path.write_text(yaml.safe_dump(synthetic_config(args.keys), sort_keys=False))
+        raw = config_path.read_bytes()
+        print(f"Synthetic config: {len(raw) / 1024:.0f} KiB, ~{args.keys} keys")
+        print(f"Default loader: {yaml_loader.LOADER_NAME}")
+
+        results = [('SafeLoader (pure Python)', best_of(lambda: yaml.load(raw, Loader=yaml.SafeLoader), args.repeat))]
+        if hasattr(yaml, 'CSafeLoader'):
+            results.append(('CSafeLoader (libyaml)', best_of(lambda: yaml.load(raw, Loader=yaml.CSafeLoader), args.repeat)))
+        yaml_loader.load_cached(config_path)
+        results.append(('load_cached, unchanged file', best_of(lambda: yaml_loader.load_cached(config_path), args.repeat)))
+
+        def touched_load():
+            os.utime(config_path)
+            yaml_loader.load_cached(config_path)
+        results.append(('load_cached, touched file', best_of(touched_load, args.repeat)))
+
+        baseline = results[0][1]
+        for name, ms in results:
+            print(f"  {name:<30} {ms:9.2f} ms  {baseline / ms:6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+config_diff.py: Semantic diff of lab-config.yml and the encrypted secrets between git revisions.
+
+Reads both files at each revision from a single `git cat-file --batch` process,
+decrypts the secrets in memory, merges and flattens them with the export code and
+reports the keys that were added, removed or changed, as they would appear in the
+exports. Values that come from the secrets are masked.
+
+Parsed (and decrypted) blobs are cached by blob hash, so walking a long range
+commit by commit with --each only parses each distinct version of a file once.
+
+    python3 config_diff.py main origin/main          # what merging origin/main changes
+    python3 config_diff.py --each main origin/main   # the same, commit by commit
+    python3 config_diff.py --json HEAD~5 HEAD
+"""
+import argparse
+import importlib
+import json
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+# The export code lives with the subscriber scripts
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'subscriber'))
+import secrets_store
+import yaml_loader
+
+KEY_FILE = Path.home() / '.purestorage/se-lab-melau.key'
+MASK = '********'
+
+
+def git_version():
+    output = subprocess.run(['git', '--version'], capture_output=True, text=True).stdout
+    numbers = re.findall(r'\d+', output)[:2]
+    return tuple(int(number) for number in numbers) if len(numbers) == 2 else (0, 0)
+
+
+class GitObjects:
+    """Blobs read through one long-running `git cat-file` process.
+
+    With git 2.36+ it runs --batch-command, so the blob hash of rev:path can be
+    looked up without transferring the content; callers that already parsed that
+    blob never read it. Older git runs --batch, which always sends the content;
+    it is kept until the following contents() call.
+    """
+
+    def __init__(self, repo=None):
+        self.batch_command = git_version() >= (2, 36)
+        mode = '--batch-command' if self.batch_command else '--batch'
+        self.process = subprocess.Popen(['git', 'cat-file', mode], cwd=repo,
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.reads = 0
+        self._pending = {}
+
+    def _request(self, line):
+        self.process.stdin.write(f"{line}\n".encode())
+        self.process.stdin.flush()
+        header = self.process.stdout.readline()
+        if not header:
+            raise RuntimeError("git cat-file exited unexpectedly")
+        return header.split()
+
+    def blob(self, rev, path):
+        """Blob hash of path at rev, or None where it does not exist (or is not a file)."""
+        if self.batch_command:
+            fields = self._request(f"info {rev}:{path}")
+            return fields[0].decode() if len(fields) == 3 and fields[1] == b'blob' else None
+        fields = self._request(f"{rev}:{path}")
+        if len(fields) != 3:
+            return None
+        content = self._read_exact(int(fields[2]) + 1)[:-1]  # content and its trailing newline
+        if fields[1] != b'blob':
+            return None
+        self.reads += 1
+        self._pending = {fields[0].decode(): content}
+        return fields[0].decode()
+
+    def contents(self, blob):
+        """Content of a blob returned by blob()."""
+        if blob in self._pending:
+            return self._pending.pop(blob)
+        fields = self._request(f"contents {blob}")
+        if len(fields) != 3:
+            raise RuntimeError(f"git cat-file: blob {blob} is missing")
+        self.reads += 1
+        return self._read_exact(int(fields[2]) + 1)[:-1]
+
+    def _read_exact(self, size):
+        data = bytearray()
+        while len(data) < size:
+            part = self.process.stdout.read(size - len(data))
+            if not part:
+                raise RuntimeError("git cat-file exited unexpectedly")
+            data += part
+        return bytes(data)
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+
+class ConfigDiff:
+    """Flattened export views of the config + secrets at any revision, cached per blob."""
+
+    def __init__(self, git, config_path='lab-config.yml', secrets_path='secrets.yml.encrypted',
+                 key_path=KEY_FILE, with_secrets=True):
+        self.git = git
+        self.config_path = config_path
+        self.secrets_path = secrets_path
+        self.key_path = key_path
+        self.with_secrets = with_secrets
+        self.exporter = importlib.import_module('export-config')
+        self.parsed = {}   # (kind, blob hash) -> parsed tree, or an Exception for a blob that failed
+        self.views = {}    # (config blob, secrets blob) -> (flat dict, secret keys, decrypt error)
+        self.parses = 0
+
+    def _parse(self, kind, blob):
+        if (kind, blob) not in self.parsed:
+            self.parses += 1
+            content = self.git.contents(blob)
+            try:
+                if kind == 'config':
+                    self.parsed[kind, blob] = yaml_loader.safe_load(content.decode('utf-8')) or {}
+                else:
+                    self.parsed[kind, blob] = secrets_store.load_secrets_bytes(content, self.key_path) or {}
+            except Exception as e:
+                self.parsed[kind, blob] = e
+        return self.parsed[kind, blob]
+
+    def view(self, rev):
+        """(flattened merged config, keys holding secrets, secrets blob, decrypt error or None) at rev."""
+        # Each blob is parsed right after its lookup: without --batch-command its content arrives with it
+        config_blob = self.git.blob(rev, self.config_path)
+        config = {} if config_blob is None else self._parse('config', config_blob)
+        if isinstance(config, Exception):
+            raise ValueError(f"{self.config_path} at {rev} is not valid YAML: {config}")
+        secrets_blob = self.git.blob(rev, self.secrets_path) if self.with_secrets else None
+        cache_key = (config_blob, secrets_blob)
+        if cache_key not in self.views:
+            secrets, error = {}, None
+            if secrets_blob is not None:
+                secrets = self._parse('secrets', secrets_blob)
+                if isinstance(secrets, Exception):
+                    secrets, error = {}, secrets
+            flat = self.exporter.flatten_dict(self.exporter.merge_config(config, secrets))
+            self.views[cache_key] = (flat, set(self.exporter.flatten_dict(secrets)), error)
+        return self.views[cache_key] + (secrets_blob,)
+
+    def diff(self, old_rev, new_rev):
+        """Changes from old_rev to new_rev: added, removed and changed keys with masked secrets."""
+        old, old_secret, old_error, old_blob = self.view(old_rev)
+        new, new_secret, new_error, new_blob = self.view(new_rev)
+        secret = old_secret | new_secret
+        warnings = []
+        if old_blob != new_blob and (old_error or new_error):
+            # Without both sides decrypted, secret keys would show up as spurious additions or removals
+            warnings.append(f"{self.secrets_path} changed but could not be decrypted "
+                            f"({old_error or new_error}); secrets not compared")
+            old = {key: value for key, value in old.items() if key not in secret}
+            new = {key: value for key, value in new.items() if key not in secret}
+
+        def shown(key, value):
+            return MASK if key in secret else value
+
+        return {
+            'from': old_rev,
+            'to': new_rev,
+            'added': {key: shown(key, new[key]) for key in sorted(new.keys() - old.keys())},
+            'removed': {key: shown(key, old[key]) for key in sorted(old.keys() - new.keys())},
+            'changed': {key: [shown(key, old[key]), shown(key, new[key])]
+                        for key in sorted(new.keys() & old.keys()) if old[key] != new[key]},
+            'warnings': warnings,
+        }
+
+
+def format_value(value):
+    return value if isinstance(value, str) else json.dumps(value, default=str)
+
+
+def print_diff(result, title=None):
+    print(f"📋 {title or result['from'] + '..' + result['to']}")
+    for warning in result['warnings']:
+        print(f"  ⚠️  {warning}")
+    for key, value in result['added'].items():
+        print(f"  + {key} = {format_value(value)}")
+    for key, value in result['removed'].items():
+        print(f"  - {key} = {format_value(value)}")
+    for key, (old, new) in result['changed'].items():
+        if old == new == MASK:
+            print(f"  ~ {key}: secret value changed")
+        else:
+            print(f"  ~ {key}: {format_value(old)} → {format_value(new)}")
+    counts = [len(result[kind]) for kind in ('added', 'removed', 'changed')]
+    print("  (no config changes)" if not any(counts)
+          else f"  {counts[0]} added, {counts[1]} removed, {counts[2]} changed")
+
+
+def commits_between(old_rev, new_rev, repo=None):
+    """(hash, subject) of the commits in old_rev..new_rev, oldest first."""
+    output = subprocess.run(['git', 'log', '--reverse', '--format=%H %s', f"{old_rev}..{new_rev}"],
+                            cwd=repo, capture_output=True, text=True, check=True).stdout
+    return [tuple(line.split(' ', 1)) if ' ' in line else (line, '') for line in output.splitlines()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Semantic diff of the lab config and secrets between git revisions.")
+    parser.add_argument('old', nargs='?', default='main', help='Old revision (default: main)')
+    parser.add_argument('new', nargs='?', default='origin/main', help='New revision (default: origin/main)')
+    parser.add_argument('--each', action='store_true', help='Show the changes of every commit in old..new separately')
+    parser.add_argument('--config-path', default='lab-config.yml', help='Config path within the repository')
+    parser.add_argument('--secrets-path', default='secrets.yml.encrypted', help='Encrypted secrets path within the repository')
+    parser.add_argument('--key', default=str(KEY_FILE), help='Key file for decrypting the secrets')
+    parser.add_argument('--no-secrets', action='store_true', help='Compare lab-config.yml only')
+    parser.add_argument('--json', action='store_true', help='Print the changes as JSON')
+    parser.add_argument('--stats', action='store_true', help='Report blobs read and parsed on stderr')
+    parser.add_argument('--exit-code', action='store_true', help='Exit 1 when there are changes (like git diff --exit-code)')
+    args = parser.parse_args()
+
+    git = GitObjects()
+    differ = ConfigDiff(git, args.config_path, args.secrets_path, args.key, with_secrets=not args.no_secrets)
+    try:
+        if args.each:
+            pairs = [(f"{commit}^", commit, f"{commit[:10]} {subject}")
+                     for commit, subject in commits_between(args.old, args.new)]
+        else:
+            pairs = [(args.old, args.new, None)]
+        results = []
+        for old_rev, new_rev, title in pairs:
+            result = differ.diff(old_rev, new_rev)
+            results.append(result)
+            if not args.json:
+                print_diff(result, title)
+    except (subprocess.CalledProcessError, RuntimeError, ValueError) as e:
+        print(f"❌ {e.stderr.strip() if isinstance(e, subprocess.CalledProcessError) else e}", file=sys.stderr)
+        sys.exit(2)
+    finally:
+        git.close()
+        secrets_store.invalidate()
+
+    if args.json:
+        # YAML dates and timestamps are not JSON; show them as text, as delta_feed.digest does
+        print(json.dumps(results if args.each else results[0], indent=2, default=str))
+    if args.stats:
+        print(f"{len(pairs)} comparison(s): {git.reads} blobs read, {differ.parses} parsed", file=sys.stderr)
+    if args.exit_code and any(result[kind] for result in results for kind in ('added', 'removed', 'changed')):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,42 +1,59 @@
 """
 decrypt_secrets.py: Decrypts secrets.yml.encrypted to secrets.yml for editing.
+
+Reads the per-subtree envelope (and the older single-stream formats) one subtree
+or chunk at a time; secrets.yml only appears once everything has been authenticated.
+With --only, just the named top-level subtrees are decrypted, and their names are
+recorded in .secrets.yml.only so encrypt_secrets.py keeps the other subtrees.
 """
+import argparse
+import os
 import sys
 from pathlib import Path
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.backends import default_backend
-import base64
-import yaml
+
+# Key handling and decryption are shared with the subscriber export scripts
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'subscriber'))
+import secrets_store
 
 ENCRYPTED_FILE = Path('secrets.yml.encrypted')
 DECRYPTED_FILE = Path('secrets.yml')
+# Names of the subtrees in a partial secrets.yml; read (and removed) by encrypt_secrets.py
+PARTIAL_FILE = Path('.secrets.yml.only')
 KEY_FILE = Path.home() / '.purestorage/se-lab-melau.key'
 
 
 def load_key():
-    with open(KEY_FILE, 'r') as f:
-        key_b64 = f.read().strip()
-    return base64.b64decode(key_b64)
-
-
-def decrypt_file():
-    with open(ENCRYPTED_FILE, 'rb') as f:
-        iv = f.read(16)
-        ciphertext = f.read()
-    key = load_key()
-    cipher = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend())
-    decryptor = cipher.decryptor()
-    padded = decryptor.update(ciphertext) + decryptor.finalize()
-    # Remove PKCS7 padding
-    pad_len = padded[-1]
-    plaintext = padded[:-pad_len]
-    with open(DECRYPTED_FILE, 'wb') as f:
-        f.write(plaintext)
-    print(f"Decrypted secrets to {DECRYPTED_FILE}")
+    return secrets_store.load_key(KEY_FILE)
+
+
+def decrypt_file(only=None):
+    tmp_file = DECRYPTED_FILE.with_name(f".{DECRYPTED_FILE.name}.{os.getpid()}.tmp")
+    fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            secrets_store.decrypt_file_to(ENCRYPTED_FILE, KEY_FILE, f, only)
+        os.replace(tmp_file, DECRYPTED_FILE)
+        if only is None:
+            PARTIAL_FILE.unlink(missing_ok=True)
+        else:
+            PARTIAL_FILE.write_text(''.join(f"{name}\n" for name in only))
+    except BaseException:
+        # Never leave partially decrypted output behind
+        tmp_file.unlink(missing_ok=True)
+        raise
+    finally:
+        secrets_store.invalidate()
+    print(f"Decrypted {'secrets' if only is None else ', '.join(only)} to {DECRYPTED_FILE}")
+    if only is not None:
+        print(f"Re-encrypt with: encrypt_secrets.py --only {','.join(only)}")
 
 
 def main():
-    decrypt_file()
+    parser = argparse.ArgumentParser(description="Decrypt secrets.yml.encrypted to secrets.yml.")
+    parser.add_argument('--only', type=lambda value: [name.strip() for name in value.split(',') if name.strip()] or None,
+                        metavar='NAME[,NAME...]', help='Decrypt only these top-level subtrees')
+    args = parser.parse_args()
+    decrypt_file(args.only)
 
 if __name__ == '__main__':
     main()
@@ -1,42 +1,106 @@
 """
 encrypt_secrets.py: Encrypts secrets.yml to secrets.yml.encrypted after editing.
+
+Writes the per-subtree envelope (see secrets_envelope.py). Subtrees whose text is
+unchanged keep their existing ciphertext; only edited ones are re-encrypted.
+
+The encrypted file ends up holding exactly what secrets.yml holds, so deleting a
+subtree from secrets.yml deletes it from secrets.yml.encrypted. Subtrees that
+secrets.yml never held are carried over untouched: the ones not decrypted by
+decrypt_secrets.py --only (recorded in .secrets.yml.only), the ones not named by
+--only here, or all of them with --keep. --prune never carries any over.
 """
+import argparse
 import sys
 from pathlib import Path
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.backends import default_backend
-import base64
 import os
 
+# Key handling and encryption are shared with the subscriber export scripts
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'subscriber'))
+import secrets_envelope
+import secrets_store
+
 DECRYPTED_FILE = Path('secrets.yml')
+PARTIAL_FILE = Path('.secrets.yml.only')  # written by decrypt_secrets.py --only
 ENCRYPTED_FILE = Path('secrets.yml.encrypted')
 KEY_FILE = Path.home() / '.purestorage/se-lab-melau.key'
 
 
 def load_key():
-    with open(KEY_FILE, 'r') as f:
-        key_b64 = f.read().strip()
-    return base64.b64decode(key_b64)
+    return secrets_store.load_key(KEY_FILE)
+
+
+def open_previous(key):
+    """The existing envelope, read from the file as needed; None when there is none (or it is in an older format)."""
+    try:
+        f = open(ENCRYPTED_FILE, 'rb')
+    except FileNotFoundError:
+        return None
+    if not secrets_envelope.is_envelope(f.read(len(secrets_envelope.MAGIC))):
+        f.close()
+        print(f"Converting {ENCRYPTED_FILE} to the per-subtree format")
+        return None
+    f.seek(0)
+    try:
+        return secrets_envelope.Envelope(f, key)
+    except BaseException:
+        f.close()
+        raise
+
+
+def partial_names():
+    """Subtrees secrets.yml was decrypted with (decrypt_secrets.py --only), or None after a full decrypt."""
+    try:
+        return [line.strip() for line in PARTIAL_FILE.read_text().splitlines() if line.strip()]
+    except FileNotFoundError:
+        return None
 
 
-def pad(data):
-    pad_len = 16 - (len(data) % 16)
-    return data + bytes([pad_len] * pad_len)
+def carried_over(previous, given, only=None, partial=None, keep=False, prune=False):
+    """Subtrees of the previous envelope to copy over although secrets.yml does not have them."""
+    if previous is None or prune:
+        return []
+    missing = [name for name in previous.names if name not in given]
+    if keep or only is not None:
+        return missing
+    if partial is not None:
+        # A decrypted subtree that is gone from secrets.yml was deleted on purpose
+        return [name for name in missing if name not in partial]
+    return []
 
 
-def encrypt_file():
-    with open(DECRYPTED_FILE, 'rb') as f:
-        plaintext = f.read()
+def encrypt_file(only=None, prune=False, keep_missing=False):
     key = load_key()
-    iv = os.urandom(16)
-    cipher = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend())
-    encryptor = cipher.encryptor()
-    padded = pad(plaintext)
-    ciphertext = encryptor.update(padded) + encryptor.finalize()
-    with open(ENCRYPTED_FILE, 'wb') as f:
-        f.write(iv)
-        f.write(ciphertext)
-    print(f"Encrypted secrets to {ENCRYPTED_FILE}")
+    tmp_file = ENCRYPTED_FILE.with_name(f".{ENCRYPTED_FILE.name}.{os.getpid()}.tmp")
+    previous = None
+    try:
+        subtrees = secrets_envelope.split_subtrees(DECRYPTED_FILE.read_text())
+        if only is not None:
+            selected = set(secrets_envelope.select([name for name, _ in subtrees], only))
+            subtrees = [(name, text) for name, text in subtrees if name in selected]
+        previous = open_previous(key)
+        given = {name for name, _ in subtrees}
+        keep = carried_over(previous, given, only, partial_names(), keep_missing, prune)
+        removed = [name for name in (previous.names if previous else []) if name not in given and name not in keep]
+        # Bodies are encrypted (or copied from the previous file) straight into the temp file
+        with open(tmp_file, 'wb') as f:
+            reused = secrets_envelope.write_subtrees(subtrees, key, f, previous, keep)
+        os.replace(tmp_file, ENCRYPTED_FILE)
+        PARTIAL_FILE.unlink(missing_ok=True)
+    except BaseException:
+        tmp_file.unlink(missing_ok=True)
+        raise
+    finally:
+        if previous is not None:
+            previous.close()
+        secrets_store.invalidate()
+    changed = [name for name, _ in subtrees if name not in reused]
+    print(f"Encrypted secrets to {ENCRYPTED_FILE} "
+          f"(re-encrypted: {', '.join(changed) or 'none'}; unchanged: {len(reused)})")
+    if keep:
+        print(f"Kept subtrees not in {DECRYPTED_FILE}: {', '.join(keep)}")
+    if removed:
+        print(f"Removed subtrees deleted from {DECRYPTED_FILE}: {', '.join(removed)}")
     
     # Remove the unencrypted file for security
     os.remove(DECRYPTED_FILE)
@@ -44,7 +108,16 @@ def encrypt_file():
 
 
 def main():
-    encrypt_file()
+    parser = argparse.ArgumentParser(description="Encrypt secrets.yml to secrets.yml.encrypted.")
+    parser.add_argument('--only', type=lambda value: [name.strip() for name in value.split(',') if name.strip()] or None,
+                        metavar='NAME[,NAME...]', help='Re-encrypt only these subtrees of secrets.yml')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--prune', action='store_true',
+                       help='Drop every subtree not in secrets.yml, also after decrypt_secrets.py --only')
+    group.add_argument('--keep', action='store_true',
+                       help='Keep every subtree of secrets.yml.encrypted that is not in secrets.yml')
+    args = parser.parse_args()
+    encrypt_file(args.only, args.prune, args.keep)
 
 if __name__ == '__main__':
     main()
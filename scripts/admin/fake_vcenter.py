@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+fake_vcenter.py: Local stand-in for the vCenter REST API endpoints vcenter_reconcile.py uses.
+
+Serves, over plain HTTP/1.1 with keep-alive, an inventory of VMs (each optionally
+in a VM folder) and content libraries:
+
+    POST   /api/session                          basic auth -> session id
+    DELETE /api/session
+    GET    /api/vcenter/vm?names=&folders=
+    GET    /api/vcenter/folder?names=&type=VIRTUAL_MACHINE
+    POST   /api/content/library?action=find          {"name": ...}
+    POST   /api/content/library/item?action=find     {"library_id": ..., "name": ...}
+    GET    /api/content/library/item/{id}
+
+Every other call needs the vmware-api-session-id header. --latency delays every
+response (so concurrency is visible), and names listed in `hang` are answered only
+after --hang seconds (to exercise timeouts). It counts requests, connections and
+the most requests handled at once. Without --inventory the inventory is built from
+lab-config.yml: every pipeline item whose status is ready/active/exported/completed
+exists. Only the standard library is used.
+
+    python3 fake_vcenter.py --port 8089 --latency 0.05
+    python3 vcenter_reconcile.py --server http://127.0.0.1:8089 --username administrator@vsphere.local --password fake
+"""
+import argparse
+import base64
+import json
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'subscriber'))
+import template_pipeline
+import yaml_loader
+
+USERNAME = 'administrator@vsphere.local'
+PASSWORD = 'fake'
+
+
+class FakeVCenter:
+    """Inventory, credentials and counters; start() serves it on a background thread."""
+
+    def __init__(self, inventory, username=USERNAME, password=PASSWORD, latency=0.0, hang_seconds=30.0):
+        self.username, self.password = username, password
+        self.latency, self.hang_seconds = latency, hang_seconds
+        self.hang = set(inventory.get('hang') or [])
+        self.folders = {}
+        self.vms = []
+        for number, vm in enumerate(inventory.get('vms') or [], start=1):
+            folder = vm.get('folder')
+            if folder and folder not in self.folders:
+                self.folders[folder] = f"group-v{100 + len(self.folders)}"
+            self.vms.append({'vm': f"vm-{number}", 'name': vm['name'], 'folder': self.folders.get(folder),
+                             'power_state': vm.get('power_state', 'POWERED_OFF')})
+        self.libraries = {}
+        self.items = {}
+        for name, items in (inventory.get('libraries') or {}).items():
+            library_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"library/{name}"))
+            self.libraries[name] = library_id
+            for item in items:
+                item_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{name}/{item}"))
+                self.items[item_id] = {'id': item_id, 'name': item, 'library_id': library_id, 'type': 'ovf'}
+        self.sessions = set()
+        self.requests = 0
+        self.connections = 0
+        self.peak = 0
+        self._active = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """Everything the config marks ready/active/exported/completed exists; the rest does not."""
+        index = template_pipeline.PipelineIndex(config)
+        folder = index.infrastructure.get('vcenter_folder')
+        vms, items = [], []
+        for kind in ('candidate', 'template', 'ova'):
+            for key in index.items[kind]:
+                if index.status((kind, key)) not in template_pipeline.READY_STATUSES:
+                    continue
+                name = index.name((kind, key))
+                if kind == 'candidate':
+                    vms.append({'name': name, 'power_state': 'POWERED_ON'})
+                elif kind == 'template':
+                    vms.append({'name': name, 'folder': folder})
+                else:
+                    items.append(name[:-len('.ova')] if name.endswith('.ova') else name)
+        return cls({'vms': vms, 'libraries': {index.infrastructure.get('content_library'): items}}, **kwargs)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self, host='127.0.0.1', port=0):
+        fake = self
+
+        class Handler(FakeHandler):
+            vcenter = fake
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def begin(self):
+        with self._lock:
+            self.requests += 1
+            self._active += 1
+            self.peak = max(self.peak, self._active)
+
+    def end(self):
+        with self._lock:
+            self._active -= 1
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    vcenter = None
+
+    def setup(self):
+        super().setup()
+        with self.vcenter._lock:
+            self.vcenter.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body=None):
+        payload = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status, message):
+        self._reply(status, {'error_type': 'ERROR', 'messages': [{'default_message': message}]})
+
+    def _handle(self, method):
+        vcenter = self.vcenter
+        vcenter.begin()
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length)) if length else {}
+            parts = urlsplit(self.path)
+            query = parse_qs(parts.query)
+            names = set(query.get('names', [])) | ({body.get('name')} if isinstance(body, dict) else set())
+            time.sleep(vcenter.hang_seconds if names & vcenter.hang else vcenter.latency)
+            self._route(method, parts.path, query, body)
+        finally:
+            vcenter.end()
+
+    def _route(self, method, path, query, body):
+        vcenter = self.vcenter
+        if path == '/api/session' and method == 'POST':
+            expected = base64.b64encode(f"{vcenter.username}:{vcenter.password}".encode()).decode()
+            if self.headers.get('Authorization') != f"Basic {expected}":
+                return self._error(401, 'Authentication required.')
+            session = uuid.uuid4().hex
+            vcenter.sessions.add(session)
+            return self._reply(201, session)
+        session = self.headers.get('vmware-api-session-id')
+        if session not in vcenter.sessions:
+            return self._error(401, 'Authentication required.')
+        if path == '/api/session' and method == 'DELETE':
+            vcenter.sessions.discard(session)
+            return self._reply(204)
+        if path == '/api/vcenter/vm' and method == 'GET':
+            names, folders = set(query.get('names', [])), set(query.get('folders', []))
+            return self._reply(200, [{key: vm[key] for key in ('vm', 'name', 'power_state')} for vm in vcenter.vms
+                                     if (not names or vm['name'] in names) and (not folders or vm['folder'] in folders)])
+        if path == '/api/vcenter/folder' and method == 'GET':
+            names = set(query.get('names', []))
+            return self._reply(200, [{'folder': folder_id, 'name': name, 'type': 'VIRTUAL_MACHINE'}
+                                     for name, folder_id in vcenter.folders.items() if not names or name in names])
+        if path == '/api/content/library' and method == 'POST' and query.get('action') == ['find']:
+            return self._reply(200, [library_id for name, library_id in vcenter.libraries.items()
+                                     if body.get('name') in (None, name)])
+        if path == '/api/content/library/item' and method == 'POST' and query.get('action') == ['find']:
+            return self._reply(200, [item['id'] for item in vcenter.items.values()
+                                     if item['library_id'] == body.get('library_id')
+                                     and body.get('name') in (None, item['name'])])
+        if path.startswith('/api/content/library/item/') and method == 'GET':
+            item = vcenter.items.get(path.rsplit('/', 1)[1])
+            return self._reply(200, item) if item else self._error(404, 'Item not found.')
+        return self._error(404, f"No such endpoint: {method} {path}")
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake vCenter REST API for offline reconciliation tests.")
+    parser.add_argument('--inventory', help='YAML with vms: [{name, folder, power_state}], libraries: {name: [items]}, hang: [names]')
+    parser.add_argument('--config', default=str(template_pipeline.default_config_path()),
+                        help='Without --inventory: build the inventory from this config')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to delay every response')
+    parser.add_argument('--hang', type=float, default=30.0, help='Seconds to delay responses about names listed in hang')
+    parser.add_argument('--username', default=USERNAME)
+    parser.add_argument('--password', default=PASSWORD)
+    args = parser.parse_args()
+
+    options = {'username': args.username, 'password': args.password, 'latency': args.latency, 'hang_seconds': args.hang}
+    if args.inventory:
+        fake = FakeVCenter(yaml_loader.load_cached(Path(args.inventory)) or {}, **options)
+    else:
+        fake = FakeVCenter.from_config(yaml_loader.load_cached(Path(args.config)) or {}, **options)
+    fake.start(args.host, args.port)
+    print(f"🧪 Fake vCenter at {fake.url} ({len(fake.vms)} VMs, {len(fake.items)} library items); Ctrl-C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print(f"\n{fake.requests} requests on {fake.connections} connections, at most {fake.peak} at once")
+        fake.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+lock_requirements.py: Regenerate scripts/subscriber/requirements.lock from requirements.in.
+
+requirements.in pins every package the venv needs, including transitive
+dependencies, as `name==version` lines with optional environment markers. This
+script looks each release up on PyPI and writes the lockfile with the sha256 of
+every published file (all wheels plus the sdist), so `pip install --require-hashes`
+works on any platform the release supports.
+
+    python3 scripts/admin/lock_requirements.py
+"""
+import argparse
+import json
+import re
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+SUBSCRIBER_DIR = Path(__file__).resolve().parent.parent / 'subscriber'
+PIN_RE = re.compile(r'^([A-Za-z0-9._-]+)==([A-Za-z0-9._+!-]+)\s*(;.*)?$')
+
+
+def fetch_release(name, version, index_url, attempts=4):
+    """sha256 digests of every file of name==version on the index's JSON API."""
+    url = f"{index_url.rstrip('/')}/{name}/json"
+    for attempt in range(attempts):
+        try:
+            with urllib.request.urlopen(url, timeout=30) as response:
+                body = response.read()
+            if body:
+                files = json.loads(body)['releases'].get(version)
+                if not files:
+                    raise RuntimeError(f"{name}=={version} is not published on {index_url}")
+                return sorted({f['digests']['sha256'] for f in files})
+        except (OSError, ValueError) as e:
+            if attempt == attempts - 1:
+                raise RuntimeError(f"Could not fetch {url}: {e}") from e
+        time.sleep(1 + attempt)
+    raise RuntimeError(f"Empty response from {url}")
+
+
+def parse_pins(path):
+    pins = []
+    for line in Path(path).read_text().splitlines():
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        match = PIN_RE.match(line)
+        if not match:
+            raise ValueError(f"{path}: expected 'name==version [; marker]', got: {line}")
+        name, version, marker = match.groups()
+        pins.append((name, version, (marker or '').lstrip(';').strip()))
+    return pins
+
+
+def render_lock(pins, hashes, source_name):
+    lines = [
+        f"# Generated by scripts/admin/lock_requirements.py from {source_name}; do not edit by hand.",
+        "# Install with: pip install --require-hashes -r requirements.lock",
+    ]
+    for name, version, marker in pins:
+        requirement = f"{name}=={version}" + (f" ; {marker}" if marker else '')
+        lines.append(requirement + ' \\')
+        digests = hashes[name]
+        for i, digest in enumerate(digests):
+            lines.append(f"    --hash=sha256:{digest}" + (' \\' if i < len(digests) - 1 else ''))
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a hash-locked requirements file from exact pins.")
+    parser.add_argument('--input', default=str(SUBSCRIBER_DIR / 'requirements.in'), help='Pinned requirements')
+    parser.add_argument('--output', default=str(SUBSCRIBER_DIR / 'requirements.lock'), help='Lockfile to write')
+    parser.add_argument('--index-url', default='https://pypi.org/pypi', help='Base URL of a PyPI JSON API')
+    args = parser.parse_args()
+
+    pins = parse_pins(args.input)
+    hashes = {}
+    for name, version, _ in pins:
+        hashes[name] = fetch_release(name, version, args.index_url)
+        print(f"  {name}=={version}: {len(hashes[name])} files")
+    Path(args.output).write_text(render_lock(pins, hashes, Path(args.input).name))
+    print(f"✓ Wrote {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test script for the IP address index in address_index.py.
+Checks conflict detection, same-owner aliases, gateway/DNS and range handling and
+next-free allocation on small synthetic configs, then checks that the repo's
+lab-config.yml has no address conflicts. No secrets needed.
+"""
+
+import ipaddress
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'subscriber'))
+import address_index
+
+REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+
+
+def make_config(**deployments):
+    config = {
+        'infrastructure': {'network': {
+            'management': {'subnet': '10.0.0.0/24', 'gateway': '10.0.0.1', 'dns_servers': ['10.0.0.2']},
+            'storage': {'subnet': '10.0.1.0/24', 'gateway': '10.0.1.1'},
+        }},
+        'services': {'web': {'admin_vm_ip': '10.0.0.10', 'admin_vm_hostname': 'web-01'},
+                     'dhcp': {'pool_range': '10.0.1.100-10.0.1.199'}},
+        'vm_deployments': {},
+    }
+    for name, (ip, gateway) in deployments.items():
+        config['vm_deployments'][name] = {'hostname': name, 'network': {'management': {
+            'ip_address': ip, 'netmask': '255.255.255.0', 'gateway': gateway}}}
+    return config
+
+
+def errors_matching(index, text):
+    return [message for message in index.errors() if text in message]
+
+
+def test_conflicts():
+    """Two owners on one address, and claims on gateways, DNS servers or ranges, are errors."""
+    index = address_index.AddressIndex(make_config(**{
+        'web-01': ('10.0.0.10', '10.0.0.1'),   # same owner as services.web.admin_vm_ip
+        'db-01': ('10.0.0.11', '10.0.0.1'),
+        'db-02': ('10.0.0.11', '10.0.0.1'),    # conflict with db-01
+        'dns-clash': ('10.0.0.2', '10.0.0.1'),  # the DNS server's address
+        'in-pool': ('10.0.1.150', '10.0.1.1'),  # inside the DHCP range
+        'bad-gw': ('10.0.0.20', '10.0.1.1'),    # gateway in another network
+    }))
+    checks = [
+        (errors_matching(index, 'db-02'), "Duplicate address with another owner"),
+        (errors_matching(index, 'referenced as dns_servers'), "Claim on a DNS server address"),
+        (errors_matching(index, 'in-pool'), "Claim inside a claimed range"),
+        (errors_matching(index, 'gateway 10.0.1.1 is outside'), "Gateway outside the interface network"),
+    ]
+    ok = True
+    for found, description in checks:
+        print(f"  {'✓' if found else '✗'} {description}")
+        ok = ok and bool(found)
+    if errors_matching(index, 'web-01') or len(index.errors()) != 4:
+        print(f"  ✗ Unexpected errors: {index.errors()}")
+        return False
+    aliases = index.lookup('10.0.0.10')[1][0].aliases
+    print(f"  {'✓' if aliases else '✗'} Same hostname on two paths is one owner, not a conflict")
+    return ok and bool(aliases)
+
+
+def test_next_free():
+    """Allocation skips claims, ranges, gateways and DNS servers."""
+    index = address_index.AddressIndex(make_config(**{'a': ('10.0.0.3', '10.0.0.1'), 'b': ('10.0.0.5', '10.0.0.1')}))
+    free = [str(address) for address in index.next_free('10.0.0.0/24', 3)]
+    if free != ['10.0.0.4', '10.0.0.6', '10.0.0.7']:
+        print(f"  ✗ Next free in 10.0.0.0/24: {free}")
+        return False
+    print(f"  ✓ Next free addresses: {', '.join(free)}")
+    free = [str(address) for address in index.next_free('10.0.1.0/24', 2, after='10.0.1.98')]
+    if free != ['10.0.1.99', '10.0.1.200']:
+        print(f"  ✗ Next free around the DHCP range: {free}")
+        return False
+    print("  ✓ Allocation jumps over the DHCP range")
+    tail = index.next_free('10.0.1.0/24', 5, after='10.0.1.252')
+    if [str(address) for address in tail] != ['10.0.1.253', '10.0.1.254']:
+        print(f"  ✗ End of subnet: {tail}")
+        return False
+    print("  ✓ Broadcast address is never handed out")
+    return True
+
+
+def test_scale():
+    """Thousands of claims index in well under a second."""
+    network = ipaddress.ip_network('10.100.0.0/16')
+    hosts = list(network.hosts())[10:20010]
+    config = {'net': {'subnet': str(network)},
+              'vm_deployments': {f"vm{i}": {'hostname': f"vm{i}", 'ip_address': str(ip)}
+                                 for i, ip in enumerate(reversed(hosts))}}
+    start = time.perf_counter()
+    index = address_index.AddressIndex(config)
+    elapsed = time.perf_counter() - start
+    if index.errors() or len(index.subnets[network].claims) != len(hosts):
+        print(f"  ✗ Expected {len(hosts)} clean claims, got errors {index.errors()[:3]}")
+        return False
+    print(f"  ✓ Indexed {len(hosts)} claims in {elapsed * 1000:.0f}ms")
+    return elapsed < 5
+
+
+def test_repo_config():
+    """The lab-config.yml in this repo has no address conflicts."""
+    index = address_index.load_index(REPO_ROOT / 'lab-config.yml')
+    if index.errors():
+        print(f"  ✗ lab-config.yml: {index.errors()}")
+        return False
+    print(f"  ✓ lab-config.yml: {len(index.subnets)} subnets, no conflicts")
+    return True
+
+
+def main():
+    print("🧪 Testing IP Address Index")
+    print("=" * 50)
+    tests = [
+        ("Conflicts", test_conflicts),
+        ("Next Free", test_next_free),
+        ("Scale", test_scale),
+        ("Repo Config", test_repo_config),
+    ]
+    results = []
+    for test_name, test_func in tests:
+        print(f"\n--- {test_name} ---")
+        results.append((test_name, test_func()))
+
+    print(f"\n{'='*50}")
+    print("Test Results Summary:")
+    for test_name, success in results:
+        print(f"  {test_name}: {'✓ PASS' if success else '✗ FAIL'}")
+    if all(success for _, success in results):
+        print("\n🎉 All address index tests passed!")
+        return 0
+    print("\n❌ Some address index tests failed!")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
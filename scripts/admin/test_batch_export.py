@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Test script for the multi-site batch export in batch_export.py.
+Builds three throwaway sites (one with a wrong key) in a temp directory, exports
+them in parallel and checks that the broken site fails alone, that the others'
+files are written, and that a second run skips every up-to-date site. No real
+secrets needed.
+"""
+
+import base64
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'subscriber'))
+import batch_export
+import secrets_store
+import yaml_loader
+
+CONFIG_YAML = """lab_info:
+  name: {site}
+infrastructure:
+  network:
+    management:
+      subnet: 10.{octet}.0.0/24
+"""
+SECRETS_YAML = """infrastructure:
+  vcenter:
+    password: {site}-password
+"""
+SITES_YAML = """defaults:
+  config: sites/{site}/lab-config.yml
+  secrets: sites/{site}/secrets.yml.encrypted
+  key: sites/{site}/test.key
+  formats: [env, json]
+  output_dir: export/{site}
+sites:
+  melbourne: {}
+  sydney:
+    overlays: [overlays/sydney.yml]
+  perth:
+    key: sites/melbourne/test.key   # wrong key: must fail without stopping the others
+"""
+
+
+def make_sites(root):
+    for octet, site in enumerate(('melbourne', 'sydney', 'perth'), start=1):
+        site_dir = root / 'sites' / site
+        site_dir.mkdir(parents=True)
+        key = os.urandom(32)
+        (site_dir / 'test.key').write_text(base64.b64encode(key).decode())
+        (site_dir / 'lab-config.yml').write_text(CONFIG_YAML.format(site=site, octet=octet))
+        (site_dir / 'secrets.yml.encrypted').write_bytes(
+            secrets_store.encrypt_bytes(SECRETS_YAML.format(site=site).encode(), key))
+    (root / 'overlays').mkdir()
+    (root / 'overlays' / 'sydney.yml').write_text("lab_info:\n  location: Sydney\n")
+    (root / 'sites.yml').write_text(SITES_YAML)
+
+
+def test_batch(root):
+    """Sites export in parallel; a failing site is reported without stopping the rest."""
+    sites = batch_export.load_sites('sites.yml')
+    results = {result.name: result for result in batch_export.run_batch(sites, jobs=2)}
+    ok = True
+    checks = [
+        (results['melbourne'].ok and results['sydney'].ok, "Good sites exported"),
+        (not results['perth'].ok and results['perth'].log, "Site with the wrong key failed with a message"),
+        (not (root / 'export' / 'perth' / 'lab-config.env').exists(), "Failed site wrote no files"),
+    ]
+    for passed, description in checks:
+        print(f"  {'✓' if passed else '✗'} {description}")
+        ok = ok and bool(passed)
+    sydney = json.loads((root / 'export' / 'sydney' / 'lab-config.json').read_text())
+    expected = {'lab_info_name': 'sydney', 'lab_info_location': 'Sydney',
+                'infrastructure_network_management_subnet': '10.2.0.0/24',
+                'infrastructure_vcenter_password': 'sydney-password'}
+    passed = all(sydney.get(key) == value for key, value in expected.items())
+    print(f"  {'✓' if passed else '✗'} Each site gets its own config, overlays and secrets")
+    return ok and passed
+
+
+def test_up_to_date(root):
+    """A second run starts no workers for sites whose exports are current."""
+    sites = batch_export.load_sites('sites.yml', ['melbourne', 'sydney'])
+    results = batch_export.run_batch(sites, jobs=2)
+    if results:
+        print(f"  ✗ Re-exported {[result.name for result in results]}")
+        return False
+    print("  ✓ Unchanged sites skipped")
+    (root / 'overlays' / 'sydney.yml').write_text("lab_info:\n  location: Sydney CBD\n")
+    results = batch_export.run_batch(sites, jobs=2)
+    passed = [result.name for result in results] == ['sydney'] and results[0].ok
+    print(f"  {'✓' if passed else '✗'} Changing an overlay re-exports only that site")
+    return passed
+
+
+def test_manifest_errors(root):
+    """Unknown sites and targets shared between sites are rejected up front."""
+    (root / 'clash.yml').write_text("defaults: {config: a.yml, secrets: b, output_dir: export/shared}\n"
+                                    "sites: {one: {}, two: {}}\n")
+    ok = True
+    for args, description in ((('sites.yml', ['hobart']), "Unknown site"),
+                              (('clash.yml',), "Two sites writing the same file")):
+        try:
+            batch_export.load_sites(*args)
+            print(f"  ✗ {description} was accepted")
+            ok = False
+        except ValueError as e:
+            print(f"  ✓ {description}: {e}")
+    return ok
+
+
+def main():
+    print("🧪 Testing Batch Export")
+    print("=" * 50)
+    tests = [
+        ("Batch", test_batch),
+        ("Up To Date", test_up_to_date),
+        ("Manifest Errors", test_manifest_errors),
+    ]
+    results = []
+    previous_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        # Keep the parsed-YAML cache of this run out of the user's cache directory
+        yaml_loader.CACHE_DIR = root / 'cache'
+        make_sites(root)
+        os.chdir(root)
+        try:
+            for test_name, test_func in tests:
+                print(f"\n--- {test_name} ---")
+                results.append((test_name, test_func(root)))
+        finally:
+            os.chdir(previous_cwd)
+
+    print(f"\n{'='*50}")
+    print("Test Results Summary:")
+    for test_name, success in results:
+        print(f"  {test_name}: {'✓ PASS' if success else '✗ FAIL'}")
+    if all(success for _, success in results):
+        print("\n🎉 All batch export tests passed!")
+        return 0
+    print("\n❌ Some batch export tests failed!")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Test script for the in-process certificate checks in cert_index.py.
+Generates a throwaway root CA, intermediate CA and a second root in a temp
+directory, with a config and a ca_bundle.cer, then checks that a clean set
+passes; that config drift, a bundle missing a CA, a bad signature and expiry are
+reported; that an unchanged set is not parsed again; and that the repository's
+own certificates pass. Needs cryptography (use the venv python).
+"""
+
+import datetime
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'subscriber'))
+import cert_index
+import yaml_loader
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+NOW = datetime.datetime(2030, 1, 1, tzinfo=datetime.timezone.utc)
+REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+
+
+def make_cert(cn, days, issuer=None):
+    """(certificate, private key) for a CA; self-signed unless issuer is a (certificate, key) pair."""
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, cn)])
+    issuer_cert, issuer_key = issuer if issuer else (None, key)
+    builder = (x509.CertificateBuilder()
+               .subject_name(name)
+               .issuer_name(issuer_cert.subject if issuer_cert else name)
+               .public_key(key.public_key())
+               .serial_number(x509.random_serial_number())
+               .not_valid_before(NOW - datetime.timedelta(days=365))
+               .not_valid_after(NOW + datetime.timedelta(days=days))
+               .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+               .add_extension(x509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False))
+    if issuer_cert:
+        builder = builder.add_extension(
+            x509.AuthorityKeyIdentifier.from_issuer_public_key(issuer_key.public_key()), critical=False)
+    return builder.sign(issuer_key, hashes.SHA256()), key
+
+
+def pem(*certs):
+    return b''.join(cert.public_bytes(serialization.Encoding.PEM) for cert in certs)
+
+
+def make_lab(directory):
+    """A config directory whose certificates and config agree; returns (directory, certs, config)."""
+    if directory.exists():
+        shutil.rmtree(directory)
+    (directory / 'certificates').mkdir(parents=True)
+    root = make_cert('Lab-RCA', 3650)
+    ica = make_cert('Lab-ICA', 1000, issuer=root)
+    ad = make_cert('Lab-AD-CA', 2000)
+    (directory / 'certificates' / 'vendor.cer').write_bytes(pem(ica[0], root[0]))
+    (directory / 'certificates' / 'ad.cer').write_bytes(ad[0].public_bytes(serialization.Encoding.DER))
+    (directory / 'certificates' / 'ca_bundle.cer').write_bytes(pem(ica[0], root[0], ad[0]))
+    config = {'certificates': {
+        'ca_bundle': {'path': 'certificates/ca_bundle.cer'},
+        'vendor_ca': {'path': 'certificates/vendor.cer', 'issuer': 'Lab-RCA',
+                      'valid_until': (NOW + datetime.timedelta(days=1000)).strftime('%Y-%m-%d')},
+        'ad_ca': {'path': 'certificates/ad.cer', 'issuer': 'Lab-AD-CA'},
+        'installation': {'ubuntu': 'sudo update-ca-certificates'},
+    }}
+    return directory, {'root': root, 'ica': ica, 'ad': ad}, config
+
+
+def check_messages(index, expected):
+    """Report whether each (severity, fragment) appears among the index issues."""
+    ok = True
+    for severity, fragment in expected:
+        found = any(s == severity and fragment in message for s, message in index.issues)
+        print(f"  {'✓' if found else '✗'} {severity}: {fragment}")
+        ok = ok and found
+    return ok
+
+
+def test_clean(tmp):
+    directory, _, config = make_lab(tmp / 'clean')
+    index = cert_index.CertIndex(config, directory, now=NOW, use_cache=False)
+    passed = not index.issues and len(index.certs) == 3 and len(index.files) == 3
+    print(f"  {'✓' if passed else '✗'} 3 files, {len(index.certs)} unique certificates, issues: {index.issues}")
+    return passed
+
+
+def test_drift(tmp):
+    directory, _, config = make_lab(tmp / 'drift')
+    config['certificates']['vendor_ca']['issuer'] = 'Old-RCA'
+    config['certificates']['vendor_ca']['valid_until'] = '2029-01-01'
+    config['certificates']['gone'] = {'path': 'certificates/gone.cer'}
+    (directory / 'certificates' / 'extra.crt').write_bytes(pem(make_cert('Extra', 500)[0]))
+    index = cert_index.CertIndex(config, directory, now=NOW, use_cache=False)
+    return check_messages(index, [
+        ('error', "certificates.vendor_ca.issuer is 'Old-RCA'"),
+        ('error', 'certificates.vendor_ca.valid_until is 2029-01-01'),
+        ('error', 'certificates.gone: certificates/gone.cer does not exist'),
+        ('warning', 'certificates/extra.crt is not listed'),
+        ('error', 'missing Extra from certificates/extra.crt'),
+    ])
+
+
+def test_bundle(tmp):
+    directory, certs, config = make_lab(tmp / 'bundle')
+    stray = make_cert('Stray-CA', 500)[0]
+    (directory / 'certificates' / 'ca_bundle.cer').write_bytes(pem(certs['root'][0], certs['ad'][0], stray))
+    index = cert_index.CertIndex(config, directory, now=NOW, use_cache=False)
+    return check_messages(index, [
+        ('error', 'ca_bundle.cer is missing Lab-ICA'),
+        ('warning', 'holds Stray-CA, which is in no individual certificate file'),
+    ])
+
+
+def test_signature(tmp):
+    directory, certs, config = make_lab(tmp / 'signature')
+    # Same subject name as the real root, different key: the intermediate no longer verifies
+    impostor = make_cert('Lab-RCA', 3650)[0]
+    for name in ('vendor.cer', 'ca_bundle.cer'):
+        path = directory / 'certificates' / name
+        path.write_bytes(path.read_bytes().replace(pem(certs['root'][0]), pem(impostor)))
+    orphan = make_cert('Orphan', 500, issuer=make_cert('Unknown-RCA', 3650))[0]
+    (directory / 'certificates' / 'orphan.pem').write_bytes(pem(orphan))
+    index = cert_index.CertIndex(config, directory, now=NOW, use_cache=False)
+    ok = check_messages(index, [
+        ('warning', "Orphan (certificates/orphan.pem): issuer 'Unknown-RCA' is not in any certificate file"),
+    ])
+    # The intermediate's AKI no longer matches the impostor's SKI, so it has no issuer; without
+    # key identifiers the subject match stands and the signature check must catch it
+    record = next(r for r in index.certs.values() if r['subject_cn'] == 'Lab-ICA')
+    impostor_record = next(r for r in index.certs.values() if r['subject_cn'] == 'Lab-RCA')
+    passed = not cert_index.signed_by(record, impostor_record) \
+        and cert_index.signed_by(record, cert_index.parse_certificates(pem(certs['root'][0]))[0])
+    print(f"  {'✓' if passed else '✗'} Signature verifies against the real root only")
+    record['authority_key_id'] = None
+    index.issues = []
+    index._check_chains()
+    ok = check_messages(index, [('error', "Lab-ICA (certificates/ca_bundle.cer, certificates/vendor.cer): "
+                                          "signature does not verify")]) and ok
+    return ok and passed
+
+
+def test_expiry(tmp):
+    directory, _, config = make_lab(tmp / 'expiry')
+    soon = cert_index.CertIndex(config, directory, now=NOW + datetime.timedelta(days=950), use_cache=False)
+    later = cert_index.CertIndex(config, directory, now=NOW + datetime.timedelta(days=1500), use_cache=False)
+    ok = check_messages(soon, [('warning', 'Lab-ICA (certificates/ca_bundle.cer, certificates/vendor.cer) '
+                                           'expires in 50 days')])
+    ok = check_messages(later, [('error', 'Lab-ICA (certificates/ca_bundle.cer, certificates/vendor.cer) '
+                                          'expired on')]) and ok
+    expiring = [record['subject_cn'] for record in soon.expiring(1100)]
+    passed = expiring == ['Lab-ICA', 'Lab-AD-CA']
+    print(f"  {'✓' if passed else '✗'} Expiring within 1100 days, soonest first: {expiring}")
+    return ok and passed
+
+
+def test_cache(tmp):
+    directory, _, config = make_lab(tmp / 'cache')
+    first = cert_index.CertIndex(config, directory, now=NOW)
+    first.save_cache()
+    second = cert_index.CertIndex(config, directory, now=NOW)
+    (directory / 'certificates' / 'extra.pem').write_bytes(pem(make_cert('Extra', 500)[0]))
+    third = cert_index.CertIndex(config, directory, now=NOW)
+    checks = [
+        (first.cache.parsed == 3, f"First run parses 3 files (parsed {first.cache.parsed})"),
+        (second.cache.parsed == 0 and not second.cache.changed and second.issues == first.issues,
+         f"Unchanged files: nothing parsed or verified (parsed {second.cache.parsed})"),
+        (third.cache.parsed == 1, f"One new file: only it is parsed (parsed {third.cache.parsed})"),
+    ]
+    ok = True
+    for passed, description in checks:
+        print(f"  {'✓' if passed else '✗'} {description}")
+        ok = ok and passed
+    return ok
+
+
+def test_repository(tmp):
+    index = cert_index.load_index(REPO_ROOT / 'lab-config.yml', use_cache=False)
+    errors = index.errors()
+    passed = not errors and len(index.certs) >= 1
+    print(f"  {'✓' if passed else '✗'} {len(index.certs)} repository certificates, errors: {errors}")
+    return passed
+
+
+def main():
+    print("🧪 Testing Certificate Index")
+    print("=" * 50)
+    tests = [
+        ("Clean Set", test_clean),
+        ("Config Drift", test_drift),
+        ("Bundle Membership", test_bundle),
+        ("Signatures", test_signature),
+        ("Expiry", test_expiry),
+        ("Parse Cache", test_cache),
+        ("Repository Certificates", test_repository),
+    ]
+    results = []
+    original_cache = cert_index.CACHE_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        cert_index.CACHE_DIR = Path(tmp) / 'cache-dir'
+        yaml_loader.CACHE_DIR = Path(tmp) / 'yaml-cache'
+        try:
+            for test_name, test_func in tests:
+                print(f"\n--- {test_name} ---")
+                results.append((test_name, test_func(Path(tmp))))
+        finally:
+            cert_index.CACHE_DIR = original_cache
+
+    print(f"\n{'='*50}")
+    print("Test Results Summary:")
+    for test_name, success in results:
+        print(f"  {test_name}: {'✓ PASS' if success else '✗ FAIL'}")
+    if all(success for _, success in results):
+        print("\n🎉 All certificate index tests passed!")
+        return 0
+    print("\n❌ Some certificate index tests failed!")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Test script for the resident config daemon (config_daemon.py) and its client (config_query.py).
+Serves a throwaway config and secrets on a temp socket, then checks get (including
+a key whose value is null and keys that do not exist), prefix and subtree lookups,
+the config_query command line, and that an edited config is picked up without a
+restart. No real secrets needed.
+"""
+
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from testlib import SUBSCRIBER_DIR, make_inputs, report, summarize, yaml_cache
+import config_daemon
+import config_query
+
+CONFIG_YAML = """lab_info:
+  name: Melbourne_SE_Lab
+  notes: null
+infrastructure:
+  vcenter:
+    server: vc01.lab.local
+    username: administrator@vsphere.local
+  dns_servers: [10.0.0.1, 10.0.0.2]
+"""
+
+
+def query(socket_path, *argv):
+    """Run config_query.py; returns (exit code, stdout, stderr)."""
+    result = subprocess.run([sys.executable, str(SUBSCRIBER_DIR / 'config_query.py'), '--socket', str(socket_path), *argv],
+                            capture_output=True, text=True)
+    return result.returncode, result.stdout, result.stderr
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def test_lookups(store, socket_path):
+    """get, prefix and subtree over the socket."""
+    request = lambda message: config_query.request(message, socket_path)
+    got = request({'op': 'get', 'keys': ['infrastructure_vcenter_server', 'LAB_INFO_NOTES', 'NO_SUCH_KEY']})
+    prefix = request({'op': 'prefix', 'prefix': 'infrastructure_vcenter_'})['values']
+    subtree = request({'op': 'subtree', 'path': 'infrastructure.vcenter'})['value']
+    try:
+        request({'op': 'subtree', 'path': 'infrastructure.nothing'})
+        missing_subtree = False
+    except RuntimeError as e:
+        missing_subtree = 'infrastructure.nothing' in str(e)
+    return report([
+        (got['values'].get('infrastructure_vcenter_server') == 'vc01.lab.local', "get matches keys case-insensitively"),
+        ('LAB_INFO_NOTES' in got['values'] and got['values']['LAB_INFO_NOTES'] is None,
+         "A null value is returned as null"),
+        ('NO_SUCH_KEY' not in got['values'] and got['missing'] == ['NO_SUCH_KEY'],
+         "An unknown key is listed in missing, not returned as null"),
+        (sorted(prefix) == ['INFRASTRUCTURE_VCENTER_PASSWORD', 'INFRASTRUCTURE_VCENTER_SERVER',
+                            'INFRASTRUCTURE_VCENTER_USERNAME'], "prefix returns the vcenter keys, secrets merged in"),
+        (subtree == {'server': 'vc01.lab.local', 'username': 'administrator@vsphere.local', 'password': 'lab-password'},
+         "subtree returns the merged block"),
+        (missing_subtree, "A missing subtree is an error naming the path"),
+    ])
+
+
+def test_query_cli(store, socket_path):
+    """config_query.py exit codes and output."""
+    code, out, err = query(socket_path, '--format', 'env', 'get', 'INFRASTRUCTURE_VCENTER_SERVER', 'LAB_INFO_NOTES')
+    unknown_code, unknown_out, unknown_err = query(socket_path, '--format', 'env', 'get', 'LAB_INFO_NAME', 'NO_SUCH_KEY')
+    json_code, json_out, _ = query(socket_path, '--format', 'json', 'get', 'LAB_INFO_NOTES')
+    return report([
+        (code == 0 and out.splitlines() == ['INFRASTRUCTURE_VCENTER_SERVER=vc01.lab.local', 'LAB_INFO_NOTES=None'],
+         "Keys that exist exit 0, a null one included (rendered as in lab-config.env)"),
+        (unknown_code == 1 and unknown_out.splitlines() == ['LAB_INFO_NAME=Melbourne_SE_Lab']
+         and 'Unknown keys: NO_SUCH_KEY' in unknown_err, "An unknown key exits 1 and is reported on stderr"),
+        (json_code == 0 and '"LAB_INFO_NOTES": null' in json_out, "--format json shows the null"),
+        (query(socket_path.with_name('no-daemon.sock'), 'ping')[0] == 2, "No daemon listening exits 2"),
+    ])
+
+
+def test_reload(store, socket_path):
+    """An edited config is served without restarting the daemon."""
+    version = store.snapshot.version
+    config = Path(store.config_path)
+    config.write_text(CONFIG_YAML.replace('vc01.lab.local', 'vc02.lab.local'))
+    server = lambda: config_query.request({'op': 'get', 'keys': ['INFRASTRUCTURE_VCENTER_SERVER']},
+                                          socket_path)['values'].get('INFRASTRUCTURE_VCENTER_SERVER')
+    reloaded = wait_for(lambda: server() == 'vc02.lab.local')
+    config.write_text("lab_info: [this is: not valid")
+    time.sleep(0.3)
+    kept = server() == 'vc02.lab.local'
+    ping = config_query.request({'op': 'ping'}, socket_path)
+    return report([
+        (reloaded, "Config edit picked up by the watcher"),
+        (ping['version'] == version + 1, f"Version went from {version} to {ping['version']}"),
+        (kept, "A config that fails to load keeps the previous snapshot"),
+    ])
+
+
+def main():
+    print("🧪 Testing Config Daemon")
+    print("=" * 50)
+    tests = [
+        ("Lookups", test_lookups),
+        ("Query CLI", test_query_cli),
+        ("Reload", test_reload),
+    ]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp, yaml_cache(Path(tmp) / 'yaml-cache'):
+        root = Path(tmp)
+        make_inputs(root, CONFIG_YAML)
+        store = config_daemon.ConfigStore(config_daemon.load_export_config(), root / 'lab-config.yml',
+                                          root / 'secrets.yml.encrypted', root / 'test.key')
+        store.reload(force=True)
+        socket_path = root / 'config.sock'
+        server = config_daemon.ConfigServer(socket_path, store)
+        stop_event = threading.Event()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        threading.Thread(target=store.watch, args=(0.05, stop_event), daemon=True).start()
+        try:
+            for test_name, test_func in tests:
+                print(f"\n--- {test_name} ---")
+                results.append((test_name, test_func(store, socket_path)))
+        finally:
+            stop_event.set()
+            server.shutdown()
+            server.server_close()
+
+    return summarize(results, "config daemon")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
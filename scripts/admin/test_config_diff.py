@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Test script for the semantic config diff in config_diff.py.
+Builds a throwaway git repository with a few commits of lab-config.yml and
+secrets.yml.encrypted (throwaway key), then checks the reported changes, that
+secret values never appear in the output, that each blob is parsed once across a
+commit range, and that a wrong key is reported instead of inventing changes.
+"""
+
+import base64
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'subscriber'))
+import config_diff
+import secrets_store
+
+KEY = os.urandom(32)
+CONFIG_V1 = """lab_info:
+  name: lab
+infrastructure:
+  vcenter:
+    server: vcsa1.example.com
+  network:
+    management:
+      dns_servers: [10.0.0.2]
+"""
+CONFIG_V2 = CONFIG_V1.replace('vcsa1', 'vcsa2') + "monitoring:\n  log_level: info\n"
+SECRETS_V1 = "infrastructure:\n  vcenter:\n    password: first-password\n"
+SECRETS_V2 = "infrastructure:\n  vcenter:\n    password: second-password\n"
+
+
+def git(repo, *args):
+    return subprocess.run(['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.com', *args],
+                          cwd=repo, capture_output=True, text=True, check=True).stdout.strip()
+
+
+def commit(repo, message, config=None, secrets=None, other=None):
+    if config is not None:
+        (repo / 'lab-config.yml').write_text(config)
+    if secrets is not None:
+        (repo / 'secrets.yml.encrypted').write_bytes(secrets_store.encrypt_bytes(secrets.encode(), KEY))
+    if other is not None:
+        (repo / 'README.md').write_text(other)
+    git(repo, 'add', '-A')
+    git(repo, 'commit', '-q', '-m', message)
+    return git(repo, 'rev-parse', 'HEAD')
+
+
+def make_repo(root):
+    repo = root / 'repo'
+    repo.mkdir()
+    git(repo, 'init', '-q')
+    key_path = root / 'test.key'
+    key_path.write_text(base64.b64encode(KEY).decode())
+    commits = [
+        commit(repo, 'Initial config', CONFIG_V1, SECRETS_V1, 'readme'),
+        commit(repo, 'Move to vcsa2', CONFIG_V2),
+        commit(repo, 'Rotate vCenter password', secrets=SECRETS_V2),
+        commit(repo, 'Docs only', other='readme v2'),
+    ]
+    return repo, key_path, commits
+
+
+def test_diff(repo, key_path, commits):
+    """Config changes are listed with values; secret changes are listed masked."""
+    git_objects = config_diff.GitObjects(repo)
+    differ = config_diff.ConfigDiff(git_objects, key_path=key_path)
+    result = differ.diff(commits[0], commits[-1])
+    git_objects.close()
+    checks = [
+        (result['changed'].get('infrastructure_vcenter_server') == ['vcsa1.example.com', 'vcsa2.example.com'],
+         "Changed config value shown old → new"),
+        (result['added'] == {'monitoring_log_level': 'info'}, "Added key shown with its value"),
+        (result['changed'].get('infrastructure_vcenter_password') == [config_diff.MASK, config_diff.MASK],
+         "Changed secret reported, value masked"),
+        ('-password' not in json.dumps(result), "No secret value in the output"),
+        (not result['removed'] and not result['warnings'], "Nothing removed, no warnings"),
+    ]
+    ok = True
+    for passed, description in checks:
+        print(f"  {'✓' if passed else '✗'} {description}")
+        ok = ok and passed
+    return ok
+
+
+def test_dates(repo, key_path, commits):
+    """YAML dates, which JSON has no type for, are printed as text by --json and the plain listing."""
+    dates = repo.parent / 'dates'
+    dates.mkdir()
+    git(dates, 'init', '-q')
+    commit(dates, 'Certificate expiry', "certs:\n  expires: 2030-01-01\n")
+    commit(dates, 'Renew certificate', "certs:\n  expires: 2031-01-01\n  renewed: 2026-10-18 09:30:00\n")
+    script = Path(__file__).resolve().parent / 'config_diff.py'
+    run = lambda *args: subprocess.run([sys.executable, str(script), '--no-secrets', 'HEAD^', 'HEAD', *args],
+                                       cwd=dates, capture_output=True, text=True)
+    as_json, as_text = run('--json'), run()
+    result = json.loads(as_json.stdout) if as_json.returncode == 0 else {}
+    checks = [
+        (result.get('changed') == {'certs_expires': ['2030-01-01', '2031-01-01']},
+         "--json shows the changed date as text"),
+        (result.get('added') == {'certs_renewed': '2026-10-18 09:30:00'}, "--json shows an added timestamp as text"),
+        (as_text.returncode == 0 and 'certs_expires: "2030-01-01" → "2031-01-01"' in as_text.stdout,
+         "The plain listing shows the dates too"),
+    ]
+    ok = True
+    for passed, description in checks:
+        print(f"  {'✓' if passed else '✗'} {description}")
+        ok = ok and passed
+    return ok
+
+
+def test_each(repo, key_path, commits):
+    """Walking the range commit by commit parses each distinct blob once, in both git modes."""
+    ok = True
+    for batch_command in (True, False):
+        version = config_diff.git_version
+        if not batch_command:
+            config_diff.git_version = lambda: (2, 0)  # force the plain --batch fallback
+        try:
+            git_objects = config_diff.GitObjects(repo)
+        finally:
+            config_diff.git_version = version
+        if git_objects.batch_command != batch_command:
+            print("  - git is older than 2.36; --batch-command not tested")
+            git_objects.close()
+            continue
+        differ = config_diff.ConfigDiff(git_objects, key_path=key_path)
+        pairs = config_diff.commits_between(commits[0], commits[-1], repo)
+        results = [differ.diff(f"{commit}^", commit) for commit, _ in pairs]
+        git_objects.close()
+        mode = '--batch-command' if batch_command else '--batch'
+        changed = [sorted(result['changed']) + sorted(result['added']) for result in results]
+        expected = [['infrastructure_vcenter_server', 'monitoring_log_level'],
+                    ['infrastructure_vcenter_password'], []]
+        passed = changed == expected
+        print(f"  {'✓' if passed else '✗'} {mode}: per-commit changes {changed}")
+        # Two versions each of the config and the secrets
+        parsed = differ.parses == 4
+        print(f"  {'✓' if parsed else '✗'} {mode}: {differ.parses} blobs parsed, {git_objects.reads} read "
+              f"for {len(pairs)} commits")
+        ok = ok and passed and parsed
+    return ok
+
+
+def test_wrong_key(repo, key_path, commits):
+    """Secrets that cannot be decrypted are reported, not shown as removed or added keys."""
+    wrong_key = key_path.with_name('wrong.key')
+    wrong_key.write_text(base64.b64encode(os.urandom(32)).decode())
+    git_objects = config_diff.GitObjects(repo)
+    result = config_diff.ConfigDiff(git_objects, key_path=wrong_key).diff(commits[1], commits[2])
+    git_objects.close()
+    passed = bool(result['warnings']) and not (result['added'] or result['removed'] or result['changed'])
+    print(f"  {'✓' if passed else '✗'} {result['warnings'][0] if result['warnings'] else 'no warning'}")
+    return passed
+
+
+def main():
+    print("🧪 Testing Config Diff")
+    print("=" * 50)
+    tests = [
+        ("Diff", test_diff),
+        ("Commit By Commit", test_each),
+        ("Wrong Key", test_wrong_key),
+        ("Dates", test_dates),
+    ]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        repo, key_path, commits = make_repo(Path(tmp))
+        for test_name, test_func in tests:
+            print(f"\n--- {test_name} ---")
+            results.append((test_name, test_func(repo, key_path, commits)))
+        secrets_store.invalidate()
+
+    print(f"\n{'='*50}")
+    print("Test Results Summary:")
+    for test_name, success in results:
+        print(f"  {test_name}: {'✓ PASS' if success else '✗ FAIL'}")
+    if all(success for _, success in results):
+        print("\n🎉 All config diff tests passed!")
+        return 0
+    print("\n❌ Some config diff tests failed!")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
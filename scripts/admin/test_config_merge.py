@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Test script for the layered config merge in config_merge.py.
+Checks the override/keep/error policies, list append, that untouched subtrees
+are shared rather than copied, that LayerCache reuses merged chain prefixes (also
+across the exporter's loads of several variants) and that secrets merge into the
+config instead of replacing whole top-level blocks. Uses a throwaway key; no real
+secrets needed.
+"""
+
+import base64
+import importlib
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'subscriber'))
+import config_merge
+import secrets_store
+import yaml_loader
+
+
+def make_config():
+    return {
+        'lab_info': {'name': 'lab', 'location': 'Melbourne'},
+        'infrastructure': {
+            'vcenter': {'server': 'vcsa1', 'datacenter': 'dc1'},
+            'network': {'management': {'subnet': '10.0.0.0/24', 'dns_servers': ['10.0.0.2']}},
+        },
+        'vm_deployments': {f"vm{i}": {'hostname': f"vm{i}", 'cpu': 2} for i in range(100)},
+    }
+
+
+def test_policies():
+    """override replaces, keep only adds keys, error names the conflicting path."""
+    config = make_config()
+    overlay = {'lab_info': {'location': 'Sydney', 'contact': 'ops@example.com'}}
+    ok = True
+    overridden = config_merge.deep_merge(config, overlay, 'override')
+    kept = config_merge.deep_merge(config, overlay, 'keep')
+    checks = [
+        (overridden['lab_info'] == {'name': 'lab', 'location': 'Sydney', 'contact': 'ops@example.com'},
+         "override: layer value wins"),
+        (kept['lab_info'] == {'name': 'lab', 'location': 'Melbourne', 'contact': 'ops@example.com'},
+         "keep: earlier value wins, new keys are added"),
+        (config['lab_info'] == {'name': 'lab', 'location': 'Melbourne'}, "base config is not modified"),
+    ]
+    for passed, description in checks:
+        print(f"  {'✓' if passed else '✗'} {description}")
+        ok = ok and passed
+    try:
+        config_merge.merge_layers([config_merge.Layer('config', config),
+                                   config_merge.Layer('site.yml', overlay, 'error')])
+        print("  ✗ error policy accepted a conflicting value")
+        return False
+    except config_merge.MergeConflict as e:
+        passed = 'site.yml' in str(e) and 'lab_info.location' in str(e)
+        print(f"  {'✓' if passed else '✗'} error: {e}")
+        ok = ok and passed
+    same = config_merge.deep_merge(config, {'lab_info': {'name': 'lab'}}, 'error')
+    print(f"  {'✓' if same is config else '✗'} error: identical values are not a conflict")
+    return ok and same is config
+
+
+def test_lists():
+    """Lists are replaced by default and concatenated with lists='append'."""
+    config = make_config()
+    overlay = {'infrastructure': {'network': {'management': {'dns_servers': ['10.9.9.9']}}}}
+    replaced = config_merge.deep_merge(config, overlay)
+    appended = config_merge.deep_merge(config, overlay, lists='append')
+    replaced_dns = replaced['infrastructure']['network']['management']['dns_servers']
+    appended_dns = appended['infrastructure']['network']['management']['dns_servers']
+    ok = replaced_dns == ['10.9.9.9'] and appended_dns == ['10.0.0.2', '10.9.9.9']
+    print(f"  {'✓' if ok else '✗'} replace: {replaced_dns}, append: {appended_dns}")
+    return ok
+
+
+def test_structural_sharing():
+    """Only the levels a layer touches are copied; everything else is the same object."""
+    config = make_config()
+    merged = config_merge.deep_merge(config, {'infrastructure': {'vcenter': {'cluster': 'c1'}}})
+    checks = [
+        (merged is not config and merged['infrastructure'] is not config['infrastructure'],
+         "Touched levels are new mappings"),
+        (merged['vm_deployments'] is config['vm_deployments'], "Untouched top-level block is shared"),
+        (merged['infrastructure']['network'] is config['infrastructure']['network'],
+         "Untouched sibling subtree is shared"),
+        (config_merge.deep_merge(config, {'lab_info': {'name': 'lab'}}) is config,
+         "A layer that changes nothing returns the base itself"),
+    ]
+    ok = True
+    for passed, description in checks:
+        print(f"  {'✓' if passed else '✗'} {description}")
+        ok = ok and passed
+    return ok
+
+
+def test_layer_cache():
+    """Chains sharing a base and site overlay merge that prefix once."""
+    config = make_config()
+    site = {'lab_info': {'location': 'Sydney'}}
+    environments = [{'lab_info': {'name': f"lab-{env}"}} for env in ('dev', 'test', 'prod')]
+    cache = config_merge.LayerCache()
+    base_layer = config_merge.Layer('config', config)
+    site_layer = config_merge.Layer('site', site)
+    results = [cache.merge([base_layer, site_layer, config_merge.Layer(f"env{i}", env)])
+               for i, env in enumerate(environments)]
+    expected = [config_merge.merge_layers([base_layer, site_layer, config_merge.Layer('env', env)])
+                for env in environments]
+    if results != expected:
+        print("  ✗ Cached merges differ from uncached merges")
+        return False
+    print("  ✓ Cached merges match merge_layers")
+    # config, config+site, and one entry per environment
+    passed = len(cache) == 2 + len(environments)
+    print(f"  {'✓' if passed else '✗'} {len(cache)} prefixes merged for {len(environments)} chains")
+    bounded = config_merge.LayerCache(max_entries=3)
+    for env in environments:
+        bounded.merge([base_layer, config_merge.Layer('env', env)])
+    evicted = len(bounded) == 3 and bounded.merge([base_layer]) is not None and bounded.hits == 3
+    print(f"  {'✓' if evicted else '✗'} max_entries keeps the {len(bounded)} most recently used prefixes")
+    return passed and evicted
+
+
+def test_export_variants():
+    """The exporter merges the base config and a shared site overlay once for all its variants."""
+    exporter = importlib.import_module('export-config')
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        original_cache = yaml_loader.CACHE_DIR
+        yaml_loader.CACHE_DIR = root / 'yaml-cache'
+        try:
+            key = os.urandom(32)
+            (root / 'test.key').write_text(base64.b64encode(key).decode())
+            (root / 'secrets.yml.encrypted').write_bytes(
+                secrets_store.encrypt_bytes(b"infrastructure:\n  vcenter:\n    password: secret\n", key))
+            (root / 'lab-config.yml').write_text("lab_info:\n  name: lab\n  location: Melbourne\n"
+                                                 "infrastructure:\n  vcenter:\n    server: vcsa1\n")
+            (root / 'sydney.yml').write_text("lab_info:\n  location: Sydney\n")
+            environments = ('dev', 'test', 'prod')
+            for env in environments:
+                (root / f"{env}.yml").write_text(f"lab_info:\n  name: lab-{env}\n")
+            cache = exporter.MERGE_CACHE = config_merge.LayerCache(max_entries=64)
+            loaded = [exporter.load_inputs(root / 'lab-config.yml', root / 'secrets.yml.encrypted', root / 'test.key',
+                                           overlays=[root / 'sydney.yml', root / f"{env}.yml"])
+                      for env in environments]
+        finally:
+            yaml_loader.CACHE_DIR = original_cache
+    uncached = [exporter.merge_config(result.config, result.secrets,
+                                      [('sydney', {'lab_info': {'location': 'Sydney'}}),
+                                       (env, {'lab_info': {'name': f"lab-{env}"}})])
+                for result, env in zip(loaded, environments)]
+    checks = [
+        ([result.merged for result in loaded] == uncached, "Variants match uncached merges"),
+        (all(result.config is loaded[0].config for result in loaded), "The base config is parsed once"),
+        (cache.misses == 2 + len(environments) and cache.hits == 2 * (len(environments) - 1),
+         f"config and config+sydney merged once: {cache.misses} merges, {cache.hits} reused"),
+        (loaded[0].merged['infrastructure']['vcenter'] == {'server': 'vcsa1', 'password': 'secret'},
+         "Secrets merge on top of the cached chain"),
+    ]
+    ok = True
+    for passed, description in checks:
+        print(f"  {'✓' if passed else '✗'} {description}")
+        ok = ok and passed
+    return ok
+
+
+def test_secrets_merge():
+    """Secrets add credentials inside config blocks without dropping their siblings."""
+    config = make_config()
+    secrets = {'infrastructure': {'vcenter': {'username': 'admin', 'password': 'secret'}},
+               'pure_storage': {'arrays': {'fa1': {'password': 'secret'}}}}
+    merged = config_merge.merge_layers([config_merge.Layer('config', config),
+                                        config_merge.Layer('secrets', secrets)])
+    infrastructure = merged['infrastructure']
+    checks = [
+        ('network' in infrastructure, "infrastructure.network survives the secrets layer"),
+        (infrastructure['vcenter'] == {'server': 'vcsa1', 'datacenter': 'dc1',
+                                       'username': 'admin', 'password': 'secret'},
+         "vcenter credentials merge next to the server settings"),
+        (merged['pure_storage'] is secrets['pure_storage'], "New top-level blocks are added as is"),
+    ]
+    ok = True
+    for passed, description in checks:
+        print(f"  {'✓' if passed else '✗'} {description}")
+        ok = ok and passed
+    return ok
+
+
+def main():
+    print("🧪 Testing Config Merge")
+    print("=" * 50)
+    tests = [
+        ("Policies", test_policies),
+        ("Lists", test_lists),
+        ("Structural Sharing", test_structural_sharing),
+        ("Layer Cache", test_layer_cache),
+        ("Export Variants", test_export_variants),
+        ("Secrets Merge", test_secrets_merge),
+    ]
+    results = []
+    for test_name, test_func in tests:
+        print(f"\n--- {test_name} ---")
+        results.append((test_name, test_func()))
+
+    print(f"\n{'='*50}")
+    print("Test Results Summary:")
+    for test_name, success in results:
+        print(f"  {test_name}: {'✓ PASS' if success else '✗ FAIL'}")
+    if all(success for _, success in results):
+        print("\n🎉 All config merge tests passed!")
+        return 0
+    print("\n❌ Some config merge tests failed!")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Test script for schema validation in config_schema.py.
+Compiles a small schema, checks that all errors are reported in one pass with
+their key paths, that duplicate keys are caught, that the compiled validators
+are reused from the cache, that only changed subtrees are re-checked and that
+export-config.py --validate schema checks overlay values and decrypts the secrets
+once. Then validates the repo's lab-config.yml against lab-config.schema.yml. Uses
+a temporary cache directory and a throwaway key; no real secrets needed.
+"""
+
+import base64
+import contextlib
+import importlib
+import io
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'subscriber'))
+import config_schema
+import secrets_store
+
+REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+SCHEMA = """
+config:
+  type: object
+  required: [servers]
+  additionalProperties: false
+  properties:
+    servers:
+      type: object
+      additionalProperties: {$ref: '#/$defs/server'}
+    settings:
+      type: object
+      properties:
+        port: {type: integer, minimum: 1, maximum: 65535}
+        mode: {enum: [fast, safe]}
+secrets:
+  type: object
+  additionalProperties:
+    type: object
+    patternProperties:
+      'password$': {type: string, minLength: 1}
+$defs:
+  server:
+    type: object
+    required: [ip]
+    properties:
+      ip: {type: string, format: ipv4}
+      legacy_name: {type: string, deprecated: "use hostname"}
+"""
+GOOD = """servers:
+  web: {ip: 10.0.0.1}
+  db: {ip: 10.0.0.2, legacy_name: db}
+settings:
+  port: 8080
+  mode: fast
+"""
+
+
+def write(directory, name, text):
+    path = Path(directory) / name
+    path.write_text(text)
+    return path
+
+
+def messages(issues, severity='error'):
+    return sorted(f"{path}: {message}" for level, path, message in issues if level == severity)
+
+
+def test_errors(directory):
+    """Every problem is reported in one pass, with its key path."""
+    schema = write(directory, 'schema.yml', SCHEMA)
+    config = write(directory, 'bad.yml', """servers:
+  web: {ip: 10.0.0.1}
+  db: {ip: 10.0.0.300}
+  web: {ip: 10.0.0.3}
+settings:
+  port: true
+  mode: quick
+extra: 1
+""")
+    errors = messages(config_schema.check_config(config, schema_path=schema))
+    expected = [
+        "extra: unknown key",
+        "servers.db.ip: '10.0.0.300' is not a valid ipv4",
+        "servers.web: duplicate key (lines 2 and 4); YAML keeps only the last one",
+        "settings.mode: 'quick' is not one of: fast, safe",
+        "settings.port: expected an integer, got true or false",
+    ]
+    if errors != sorted(expected):
+        print(f"  ✗ Got {errors}")
+        return False
+    print(f"  ✓ {len(errors)} errors reported in one pass, with key paths")
+    issues = config_schema.Validators(schema).check('secrets', {'vcenter': {'password': '', 'user': 'x'}})
+    if messages(issues) != ["vcenter.password: must be at least 1 character(s)"]:
+        print(f"  ✗ Secrets: {issues}")
+        return False
+    print("  ✓ Empty password in secrets is reported")
+    return True
+
+
+def test_compiled_cache(directory):
+    """The compiled validators are marshalled once and reused."""
+    schema = write(directory, 'schema.yml', SCHEMA)
+    first = config_schema.Validators(schema)
+    first.roots
+    second = config_schema.Validators(schema)
+    second.roots
+    if first.from_cache or not second.from_cache:
+        print(f"  ✗ from_cache: first {first.from_cache}, second {second.from_cache}")
+        return False
+    print("  ✓ Second load uses the cached compiled validators")
+    changed = config_schema.Validators(write(directory, 'schema.yml', SCHEMA + "\n# edited\n"))
+    changed.roots
+    if changed.from_cache or changed.schema_hash == first.schema_hash:
+        print("  ✗ Editing the schema did not recompile it")
+        return False
+    print("  ✓ Editing the schema recompiles it")
+    return True
+
+
+def test_incremental(directory):
+    """Unchanged files are skipped; edited files re-check only their changed subtrees."""
+    schema = write(directory, 'schema.yml', SCHEMA)
+    config = write(directory, 'config.yml', GOOD)
+    seen = []
+    original = config_schema.Validators.check
+
+    def spy(self, root, data, only=None):
+        seen.append(sorted(only) if only is not None else None)
+        return original(self, root, data, only)
+
+    config_schema.Validators.check = spy
+    try:
+        warnings = messages(config_schema.check_config(config, schema_path=schema), 'warning')
+        config_schema.check_config(config, schema_path=schema)
+        replayed = messages(config_schema.check_config(config, schema_path=schema), 'warning')
+        write(directory, 'config.yml', GOOD.replace('8080', '70000'))
+        os.utime(config, ns=(1, 1))  # new mtime even on coarse-grained filesystems
+        errors = messages(config_schema.check_config(config, schema_path=schema))
+    finally:
+        config_schema.Validators.check = original
+    if seen != [['servers', 'settings'], ['settings']]:
+        print(f"  ✗ Subtrees checked per run: {seen}")
+        return False
+    print("  ✓ Unchanged file was not re-checked; the edit re-checked only 'settings'")
+    if warnings != replayed or not warnings:
+        print(f"  ✗ Warnings not replayed: {warnings} vs {replayed}")
+        return False
+    print("  ✓ Warnings of unchanged subtrees are still reported")
+    if errors != ["settings.port: 70000 is above the maximum 65535"]:
+        print(f"  ✗ Got {errors}")
+        return False
+    print("  ✓ The edited subtree's error is reported")
+    return True
+
+
+def test_export_overlays(directory):
+    """--validate schema checks the config as overlaid, from the secrets decrypted for the export."""
+    write(directory, 'lab-config.schema.yml', SCHEMA)
+    write(directory, 'lab-config.yml', GOOD)
+    write(directory, 'site.yml', "settings:\n  port: 70000\n")
+    key = os.urandom(32)
+    write(directory, 'test.key', base64.b64encode(key).decode())
+    Path(directory, 'secrets.yml.encrypted').write_bytes(
+        secrets_store.encrypt_bytes(b"vcenter:\n  password: ''\n", key))
+    exporter = importlib.import_module('export-config')
+    calls = []
+    original = exporter.decrypt_secrets
+
+    def counting(*args, **kwargs):
+        calls.append(args)
+        return original(*args, **kwargs)
+
+    def export(*extra):
+        argv = ['--type', 'env', '--output', str(Path(directory) / 'lab-config.env'), '--no-cache', '--validate', 'schema',
+                '--config', str(Path(directory) / 'lab-config.yml'), '--secrets', str(Path(directory) / 'secrets.yml.encrypted'),
+                '--key', str(Path(directory) / 'test.key'), *extra]
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr), contextlib.redirect_stdout(io.StringIO()):
+            try:
+                exporter.main(argv)
+                status = 0
+            except SystemExit as e:
+                status = e.code
+        return status, stderr.getvalue()
+
+    exporter.decrypt_secrets = counting
+    try:
+        plain_status, plain = export()
+        plain_calls = len(calls)
+        overlay_status, overlay = export('--overlay', str(Path(directory) / 'site.yml'))
+    finally:
+        exporter.decrypt_secrets = original
+    checks = [
+        (plain_status == 1 and 'secrets: vcenter.password' in plain and 'settings.port' not in plain,
+         "Without the overlay only the empty secret is reported"),
+        (overlay_status == 1 and 'lab-config.yml + overlays: settings.port: 70000 is above the maximum' in overlay,
+         "The overlay's out-of-range port is reported"),
+        (plain_calls == 1 and len(calls) == 2, f"Secrets decrypted once per export ({plain_calls}, {len(calls) - plain_calls})"),
+        (not Path(directory, 'lab-config.env').exists(), "Nothing written when validation fails"),
+    ]
+    ok = True
+    for passed, description in checks:
+        print(f"  {'✓' if passed else '✗'} {description}")
+        ok = ok and passed
+    return ok
+
+
+def test_repo_config(directory):
+    """The repo's lab-config.yml matches lab-config.schema.yml."""
+    issues = config_schema.check_config(REPO_ROOT / 'lab-config.yml', use_snapshot=False)
+    errors = messages(issues)
+    if errors:
+        print(f"  ✗ lab-config.yml: {errors}")
+        return False
+    print(f"  ✓ lab-config.yml matches its schema ({len(issues)} warnings)")
+    return True
+
+
+def main():
+    print("🧪 Testing Config Schema Validation")
+    print("=" * 50)
+    tests = [
+        ("Error Reporting", test_errors),
+        ("Compiled Cache", test_compiled_cache),
+        ("Incremental", test_incremental),
+        ("Export Overlays", test_export_overlays),
+        ("Repo Config", test_repo_config),
+    ]
+    results = []
+    for test_name, test_func in tests:
+        print(f"\n--- {test_name} ---")
+        with tempfile.TemporaryDirectory() as directory:
+            config_schema.CACHE_DIR = Path(directory) / 'cache'
+            results.append((test_name, test_func(directory)))
+
+    print(f"\n{'='*50}")
+    print("Test Results Summary:")
+    for test_name, success in results:
+        print(f"  {test_name}: {'✓ PASS' if success else '✗ FAIL'}")
+    if all(success for _, success in results):
+        print("\n🎉 All config schema tests passed!")
+        return 0
+    print("\n❌ Some config schema tests failed!")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Test script for the binary config snapshot in config_snapshot.py.
+Renders flattened configs with render_snapshot, reads them back with SnapshotReader
+(get, [], in, prefix, items) and checks every value round-trips; checks that empty,
+truncated, padded and otherwise corrupt files are rejected with ValueError when
+opened, and that the config_snapshot.py command line reports them. No secrets needed.
+"""
+
+import random
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from testlib import SUBSCRIBER_DIR, report, summarize
+import config_snapshot
+
+FLAT = {
+    'lab_info_name': 'Melbourne_SE_Lab',
+    'lab_info_groups': 'PureSEs,PureGuests',
+    'lab_info_notes': None,
+    'lab_info_empty': '',
+    'infrastructure_vcenter_server': 'vc01.lab.local',
+    'infrastructure_vcenter_password': "p'a$s`w\"rd",
+    'infrastructure_vcenter': 'a key that is also a prefix',
+    'services_rds_server_ip': '10.0.0.20',
+    'services_rds_port': 3389,
+    'site_city': 'Zürich ☃',
+    'multi_line': "first line\nsecond line",
+}
+
+
+def write_snapshot(path, flat):
+    path.write_bytes(b''.join(config_snapshot.render_snapshot(flat.items())))
+    return path
+
+
+def rejected(path):
+    """The ValueError message for opening path, or None if it opened."""
+    try:
+        config_snapshot.SnapshotReader(path).close()
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def test_round_trip(root):
+    """Every key and value comes back, with prefix lookups in key order."""
+    expected = {key.upper(): str(value) for key, value in FLAT.items()}
+    with config_snapshot.SnapshotReader(write_snapshot(root / 'lab-config.snap', FLAT)) as reader:
+        values = {key: reader.get(key.lower()) for key in expected}
+        vcenter = list(reader.prefix('infrastructure_vcenter'))
+        try:
+            reader['NO_SUCH_KEY']
+            missing_raises = False
+        except KeyError:
+            missing_raises = True
+        checks = [
+            (len(reader) == len(expected), f"{len(reader)} entries"),
+            (values == expected, "get returns every value, keys case-insensitive, unicode and newlines intact"),
+            (reader.get('NO_SUCH_KEY') is None and reader.get('NO_SUCH_KEY', 'x') == 'x', "Unknown key gives the default"),
+            (missing_raises and 'LAB_INFO_NAME' in reader and 'NO_SUCH_KEY' not in reader, "[] and in"),
+            ([key for key, _ in vcenter] == ['INFRASTRUCTURE_VCENTER', 'INFRASTRUCTURE_VCENTER_PASSWORD',
+                                             'INFRASTRUCTURE_VCENTER_SERVER'], "prefix returns the matching keys, sorted"),
+            (dict(reader.prefix('SERVICES_RDS_')) == {'SERVICES_RDS_PORT': '3389',
+                                                      'SERVICES_RDS_SERVER_IP': '10.0.0.20'}, "prefix returns the values"),
+            (list(reader.prefix('ZZZ')) == [] and list(reader.prefix('A')) == [], "prefix past either end is empty"),
+            (list(reader.items()) == sorted(expected.items()), "items covers the whole snapshot in key order"),
+        ]
+    with config_snapshot.SnapshotReader(write_snapshot(root / 'empty.snap', {})) as reader:
+        checks.append((len(reader) == 0 and reader.get('A') is None and list(reader.items()) == [],
+                       "A snapshot with no entries"))
+    rng = random.Random(3)
+    flat = {f"k{rng.randint(0, 10 ** 6)}_{i}": 'v' * rng.randint(0, 40) for i in range(2000)}
+    with config_snapshot.SnapshotReader(write_snapshot(root / 'large.snap', flat)) as reader:
+        checks.append((all(reader.get(key) == value for key, value in flat.items()), f"{len(flat)} random keys"))
+    return report(checks)
+
+
+def test_corrupt(root):
+    """Damaged files are rejected with ValueError when opened."""
+    good = write_snapshot(root / 'good.snap', FLAT).read_bytes()
+    header = config_snapshot.HEADER.size
+    index_end = header + config_snapshot.ENTRY.size * len(FLAT)
+    cases = {
+        'empty': b'',
+        'half a header': good[:header // 2],
+        'header only': good[:header],
+        'cut inside the index': good[:index_end - 5],
+        'cut after the index': good[:index_end],
+        'cut inside the last value': good[:-1],
+        'trailing bytes': good + b'\0',
+        'wrong magic': b'SLMSNAP0' + good[8:],
+        'entry count too large': good[:8] + (len(FLAT) * 1000).to_bytes(4, 'little') + good[12:],
+        'last value offset too large': good[:index_end - 8] + (len(good) + 1).to_bytes(4, 'little') + good[index_end - 4:],
+    }
+    checks = []
+    for name, data in cases.items():
+        path = root / f"{name.replace(' ', '-')}.snap"
+        path.write_bytes(data)
+        message = rejected(path)
+        checks.append((message is not None and str(path) in message, f"{name}: {message}"))
+    opened = []
+    for cut in range(len(good)):
+        (root / 'cut.snap').write_bytes(good[:cut])
+        if rejected(root / 'cut.snap') is None:
+            opened.append(cut)
+    checks.append((not opened, f"Every one of the {len(good)} truncations is rejected"))
+
+    (root / 'cut.snap').write_bytes(good[:-3])
+    result = subprocess.run([sys.executable, str(SUBSCRIBER_DIR / 'config_snapshot.py'), str(root / 'cut.snap'),
+                             'LAB_INFO_NAME'], capture_output=True, text=True)
+    checks.append((result.returncode == 2 and 'truncated or corrupt' in result.stderr and not result.stdout,
+                   "config_snapshot.py exits 2 on a truncated file"))
+    return report(checks)
+
+
+def main():
+    print("🧪 Testing Config Snapshot")
+    print("=" * 50)
+    tests = [
+        ("Round Trip", test_round_trip),
+        ("Corrupt Files", test_corrupt),
+    ]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for test_name, test_func in tests:
+            print(f"\n--- {test_name} ---")
+            root = Path(tmp) / test_name.lower().replace(' ', '-')
+            root.mkdir()
+            results.append((test_name, test_func(root)))
+
+    return summarize(results, "config snapshot")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
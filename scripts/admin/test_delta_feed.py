@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Test script for the versioned export feed in delta_feed.py.
+Publishes a series of random flattened configs to a temp feed and checks that
+every "since N" patch, applied to version N, gives the current snapshot; that
+unchanged content adds no version; and that consumers behind the pruned history,
+ahead of the feed or on a recreated feed get a full reset. No secrets needed.
+"""
+
+import datetime
+import random
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'subscriber'))
+import delta_feed
+
+
+def mutate(flat, rng):
+    """A copy of flat with a few keys added, removed and changed."""
+    flat = dict(flat)
+    for _ in range(rng.randint(1, 5)):
+        action = rng.choice(['add', 'remove', 'change'])
+        if action == 'add' or not flat:
+            flat[f"key_{rng.randint(0, 200)}/x~{rng.randint(0, 3)}"] = rng.choice([1, 'a', [1, 2], None, True])
+        elif action == 'remove':
+            del flat[rng.choice(sorted(flat))]
+        else:
+            flat[rng.choice(sorted(flat))] = rng.randint(0, 10 ** 6)
+    return flat
+
+
+def test_since(directory):
+    """since(N) applied to version N reproduces the current snapshot, for every N."""
+    rng = random.Random(42)
+    feed = delta_feed.Feed(directory / 'feed')
+    history = [None]  # history[v] is the content at version v
+    flat = {f"base_{i}": i for i in range(50)}
+    for _ in range(30):
+        flat = mutate(flat, rng)
+        version = feed.publish(flat)
+        if version is not None:
+            history.append(flat)
+    current = feed.index()['version']
+    if current != len(history) - 1:
+        print(f"  ✗ Feed at version {current}, expected {len(history) - 1}")
+        return False
+    for since in range(current + 1):
+        result = feed.since(since)
+        applied = delta_feed.apply_ops(history[since] or {}, result['ops'])
+        if result.get('reset') or applied != flat:
+            print(f"  ✗ since {since} does not reproduce version {current}")
+            return False
+        paths = [op['path'] for op in result['ops']]
+        if len(paths) != len(set(paths)):
+            print(f"  ✗ since {since} has several operations for one key")
+            return False
+    print(f"  ✓ since N reproduces version {current} for all {current + 1} starting points")
+    one_step = feed.since(current - 1)['ops']
+    print(f"  ✓ Latest delta holds {len(one_step)} operation(s) for a {len(flat)}-key snapshot")
+    return True
+
+
+def test_unchanged(directory):
+    """Publishing the same content twice adds no version."""
+    feed = delta_feed.Feed(directory / 'unchanged')
+    first = feed.publish({'a': 1, 'b': [1, 2]}, inputs={'config': 'x'})
+    again = feed.publish({'b': [1, 2], 'a': 1}, inputs={'config': 'y'})
+    passed = first == 1 and again is None and feed.is_fresh({'config': 'y'})
+    print(f"  {'✓' if passed else '✗'} Same content: no new version, inputs recorded")
+
+    # YAML dates are not JSON: the snapshot holds their str(), which must not read as a change
+    dated = delta_feed.Feed(directory / 'dated')
+    dated.publish({'expires': datetime.date(2030, 1, 1), 'serial': 1})
+    dated.publish({'expires': datetime.date(2030, 1, 1), 'serial': 2})
+    ops = dated.since(1)['ops']
+    dates_ok = ops == [{'op': 'replace', 'path': '/serial', 'value': 2}]
+    print(f"  {'✓' if dates_ok else '✗'} Unchanged date value: no replace operation ({ops})")
+    return passed and dates_ok
+
+
+def test_resets(directory):
+    """Consumers outside the kept history, or on another feed, get the full snapshot."""
+    path = directory / 'resets'
+    feed = delta_feed.Feed(path)
+    for version in range(1, 11):
+        feed.publish({'version': version, 'static': 'x'}, keep=3)
+    index = feed.index()
+    kept = sorted(p.name for p in (path / delta_feed.DELTA_DIR).iterdir())
+    checks = [
+        (index['oldest'] == 8 and kept == ['00000008.json', '00000009.json', '00000010.json'],
+         f"Only the last 3 deltas kept: {kept}"),
+        (feed.since(7).get('ops') == [{'op': 'replace', 'path': '/version', 'value': 10}],
+         "since 7 still answered from deltas"),
+        (feed.since(6).get('reset') and feed.since(6)['snapshot']['version'] == 10, "since 6 is a reset"),
+        (feed.since(11).get('reset'), "A version ahead of the feed is a reset"),
+        (feed.since(9, feed_id='other').get('reset'), "Another feed id is a reset"),
+    ]
+    ok = True
+    for passed, description in checks:
+        print(f"  {'✓' if passed else '✗'} {description}")
+        ok = ok and bool(passed)
+    shutil.rmtree(path, ignore_errors=True)
+    return ok
+
+
+def main():
+    print("🧪 Testing Delta Feed")
+    print("=" * 50)
+    tests = [
+        ("Since Version", test_since),
+        ("Unchanged", test_unchanged),
+        ("Resets", test_resets),
+    ]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for test_name, test_func in tests:
+            print(f"\n--- {test_name} ---")
+            results.append((test_name, test_func(Path(tmp))))
+
+    print(f"\n{'='*50}")
+    print("Test Results Summary:")
+    for test_name, success in results:
+        print(f"  {test_name}: {'✓ PASS' if success else '✗ FAIL'}")
+    if all(success for _, success in results):
+        print("\n🎉 All delta feed tests passed!")
+        return 0
+    print("\n❌ Some delta feed tests failed!")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Test script for the export cache in export_cache.py.
+Exports a throwaway config twice and checks the second run is skipped, then checks
+that changing the config, the secrets, the key, an overlay or a render option
+regenerates the export. Also checks that the exporter version covers the modules
+export-config.py imports and nothing else, and that update.py parses --only,
+--validate and --feed-keep like export-config.py. No real secrets needed.
+"""
+
+import importlib
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from testlib import CONFIG_YAML, SECRETS_YAML, SUBSCRIBER_DIR, export_argv, make_inputs, report, summarize, write_secrets
+import export_cache
+
+UPDATE_SCRIPT = SUBSCRIBER_DIR / 'update.py'
+
+
+def export(root, *extra, key_name='test.key'):
+    """Run export-config.py on the env target; True if it wrote the file, False if it was up to date."""
+    argv = export_argv(root, '--type', 'env', '--output', 'export/lab-config.env', *extra, key_name=key_name)
+    result = subprocess.run(argv, cwd=root, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stdout + result.stderr)
+    return 'Config exported to' in result.stdout
+
+
+def test_invalidation(root):
+    """Each input and render option is part of the fingerprint."""
+    make_inputs(root)
+    (root / 'site.yml').write_text("lab_info:\n  location: Sydney\n")
+    checks = [(export(root), "First export writes the file"),
+              (not export(root), "Unchanged inputs: skipped")]
+
+    (root / 'lab-config.yml').write_text(CONFIG_YAML.replace('Melbourne', 'Sydney'))
+    checks.append((export(root) and not export(root), "Config edit: regenerated once"))
+
+    write_secrets(root, SECRETS_YAML.replace('lab-password', 'new-password'))
+    checks.append((export(root) and not export(root), "Secrets (and key) change: regenerated once"))
+
+    # Same secrets re-encrypted under a new key file: only the key differs
+    write_secrets(root, SECRETS_YAML.replace('lab-password', 'new-password'), key_name='rotated.key')
+    checks.append((export(root, key_name='rotated.key'), "Rotated key: regenerated"))
+
+    checks.append((export(root, '--list-format', 'index', key_name='rotated.key'), "--list-format change: regenerated"))
+    checks.append((export(root, '--overlay', 'site.yml', key_name='rotated.key'), "Overlay added: regenerated"))
+    (root / 'site.yml').write_text("lab_info:\n  location: Perth\n")
+    checks.append((export(root, '--overlay', 'site.yml', key_name='rotated.key'), "Overlay edit: regenerated"))
+    checks.append((not export(root, '--overlay', 'site.yml', key_name='rotated.key'), "Same options again: skipped"))
+    checks.append(('LAB_INFO_LOCATION=Perth' in (root / 'export' / 'lab-config.env').read_text(),
+                   "The file holds the latest export"))
+    return report(checks)
+
+
+def test_exporter_version(root):
+    """Only modules export-config.py imports count towards the exporter version."""
+    copy = root / 'subscriber'
+    copy.mkdir()
+    for source in SUBSCRIBER_DIR.glob('*.py'):
+        shutil.copy(source, copy / source.name)
+    original = export_cache.SUBSCRIBER_DIR
+    export_cache.SUBSCRIBER_DIR = copy
+    try:
+        names = [path.name for path in export_cache.exporter_sources()]
+        before = export_cache.exporter_version()
+        for unrelated in ('cert_index.py', 'config_daemon.py', 'file_watch.py', 'stage_profile.py'):
+            with open(copy / unrelated, 'a') as f:
+                f.write("\n# edited\n")
+        unrelated_edit = export_cache.exporter_version()
+        with open(copy / 'secrets_envelope.py', 'a') as f:
+            f.write("\n# edited\n")
+        lazy_edit = export_cache.exporter_version()
+    finally:
+        export_cache.SUBSCRIBER_DIR = original
+    return report([
+        ({'export-config.py', 'config_merge.py', 'secrets_store.py', 'secrets_envelope.py',
+          'config_schema.py', 'address_index.py'} <= set(names), f"Exporter sources: {', '.join(names)}"),
+        (not {'cert_index.py', 'config_daemon.py', 'file_watch.py', 'update.py'} & set(names),
+         "Modules the exporter does not import are left out"),
+        (unrelated_edit == before, "Editing cert_index.py, config_daemon.py or file_watch.py keeps the version"),
+        (lazy_edit != before, "Editing a lazily imported module (secrets_envelope.py) changes it"),
+    ])
+
+
+def test_arguments(root):
+    """update.py parses --only, --validate and --feed-keep like export-config.py."""
+    exporter = importlib.import_module('export-config')
+    make_inputs(root)
+
+    def update(*extra):
+        argv = export_argv(root, '--type', 'env', '--output', 'export/lab-config.env', *extra, script=UPDATE_SCRIPT)
+        return subprocess.run(argv, cwd=root, capture_output=True, text=True)
+
+    empty_only = update('--only', ' , ')
+    bad_validate = update('--validate', 'addresses,typo')
+    zero_keep = update('--feed-keep', '0')
+    for version in range(3):
+        (root / 'lab-config.yml').write_text(CONFIG_YAML.replace('Melbourne', f"Site{version}"))
+        kept = update('--feed', 'feed', '--feed-keep', '1')
+    deltas = list((root / 'feed' / 'deltas').iterdir()) if (root / 'feed' / 'deltas').is_dir() else []
+    return report([
+        (set(exporter.VALIDATORS) == set(export_cache.VALIDATOR_NAMES), "VALIDATOR_NAMES matches the exporter's VALIDATORS"),
+        (empty_only.returncode == 2 and 'expected one or more comma-separated names' in empty_only.stderr,
+         "--only with no names is an error, not 'everything'"),
+        (bad_validate.returncode == 2 and 'unknown validator(s) typo' in bad_validate.stderr,
+         "--validate rejects unknown validators before exporting"),
+        (zero_keep.returncode == 2 and '--feed-keep must be at least 1' in zero_keep.stderr,
+         "--feed-keep 0 is rejected instead of dropped"),
+        (kept.returncode == 0 and len(deltas) == 1, f"--feed-keep 1 is passed on: {len(deltas)} delta(s) kept"),
+    ])
+
+
+def main():
+    print("🧪 Testing Export Cache")
+    print("=" * 50)
+    tests = [
+        ("Invalidation", test_invalidation),
+        ("Exporter Version", test_exporter_version),
+        ("Arguments", test_arguments),
+    ]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for test_name, test_func in tests:
+            print(f"\n--- {test_name} ---")
+            root = Path(tmp) / test_name.lower().replace(' ', '-')
+            root.mkdir()
+            results.append((test_name, test_func(root)))
+
+    return summarize(results, "export cache")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
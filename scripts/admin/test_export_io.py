@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Test script for atomic export writes and single-flight export locking (export_io.py).
+Rewrites a file while a reader thread keeps reading it and checks every read is a
+complete version; checks the final mode is 0400 and that a failed write leaves the
+old file and no temp file; then starts two exporters on the same target while the
+lock is held and checks that only one writes it and the one that waited reuses it.
+No real secrets needed.
+"""
+
+import os
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from testlib import export_argv, make_inputs, report, summarize
+import export_io
+
+
+def slow_chunks(marker, count=64):
+    """A version of the file in many chunks, with pauses so a reader could catch it half-written."""
+    for _ in range(count):
+        yield marker * 4096
+        time.sleep(0.0005)
+
+
+def test_no_partial_reads(root):
+    """A reader running alongside repeated rewrites only ever sees complete versions."""
+    path = root / 'atomic.env'
+    versions = {marker * 4096 * 64 for marker in (b'a', b'b')}
+    export_io.atomic_write(path, slow_chunks(b'a'))
+    stop = threading.Event()
+    reads, partial = [], []
+
+    def read_loop():
+        while not stop.is_set():
+            data = path.read_bytes()
+            reads.append(len(data))
+            if data not in versions:
+                partial.append(len(data))
+
+    reader = threading.Thread(target=read_loop)
+    reader.start()
+    for number in range(20):
+        export_io.atomic_write(path, slow_chunks(b'b' if number % 2 == 0 else b'a'))
+    stop.set()
+    reader.join()
+    leftovers = [name for name in os.listdir(root) if name.endswith('.tmp')]
+    return report([
+        (reads and not partial, f"{len(reads)} reads during 20 rewrites, partial reads: {len(partial)}"),
+        (stat.S_IMODE(path.stat().st_mode) == 0o400, f"Mode {oct(stat.S_IMODE(path.stat().st_mode))} (0o400)"),
+        (not leftovers, "No temp files left behind"),
+    ])
+
+
+def test_failed_write(root):
+    """A write that fails part-way leaves the previous file untouched and removes its temp file."""
+    path = root / 'failed.env'
+    export_io.atomic_write(path, [b'OLD=1\n'])
+
+    def failing_chunks():
+        yield b'NEW=1\n'
+        raise RuntimeError('renderer failed')
+
+    try:
+        export_io.atomic_write(path, failing_chunks())
+        raised = False
+    except RuntimeError:
+        raised = True
+    leftovers = [name for name in os.listdir(root) if name.startswith('.failed.env.')]
+    return report([
+        (raised, "The renderer's error propagates"),
+        (path.read_bytes() == b'OLD=1\n', "Previous file kept"),
+        (not leftovers, "Temp file removed"),
+    ])
+
+
+def test_lock_waited(root):
+    """A second ExportLock on the same directory blocks until the first is released, and says it waited."""
+    directory = root / 'locked'
+    first = export_io.export_lock([directory / 'lab-config.env']).acquire()
+    second = export_io.export_lock([directory / 'lab-config.json'])
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (second.acquire(), acquired.set()))
+    thread.start()
+    blocked = not acquired.wait(0.3)
+    first.release()
+    thread.join(5)
+    second.release()
+    return report([
+        (blocked, "Second lock blocks while the first is held"),
+        (acquired.is_set() and second.waited and not first.waited, "Second lock acquired after release, .waited set"),
+    ])
+
+
+def exporter(root, output):
+    """Start export-config.py with --force on one env target; returns the Popen."""
+    argv = export_argv(root, '--type', 'env', '--output', output, '--force')
+    return subprocess.Popen(argv, cwd=root, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+
+
+def test_concurrent_exporters(root):
+    """Two exporters started while the lock is held: one writes the file, the one that waited after it reuses it."""
+    make_inputs(root)
+    output = root / 'export' / 'lab-config.env'
+
+    holder = export_io.export_lock([output]).acquire()
+    processes = [exporter(root, 'export/lab-config.env') for _ in range(2)]
+    time.sleep(1.0)
+    running = all(process.poll() is None for process in processes)
+    holder.release()
+    logs = [process.communicate(timeout=60)[0] for process in processes]
+    written = sum('Config exported to' in log for log in logs)
+    reused = sum('is up to date' in log for log in logs)
+    waited = sum('waiting for it' in log for log in logs)
+    mode = stat.S_IMODE(output.stat().st_mode) if output.exists() else None
+    return report([
+        (running, "Both exporters wait while another holds the lock"),
+        (all(process.returncode == 0 for process in processes), "Both exporters succeed"),
+        (waited == 2, f"Both report waiting ({waited})"),
+        (written == 1 and reused == 1, f"One writes the file, the other reuses it despite --force "
+                                       f"({written} written, {reused} reused)"),
+        (output.exists() and 'LAB_INFO_NAME=Melbourne_SE_Lab' in output.read_text(), "The export is complete"),
+        (mode == 0o400, f"Export mode {oct(mode) if mode is not None else 'missing'} (0o400)"),
+    ])
+
+
+def main():
+    print("🧪 Testing Atomic Export Writes and Locking")
+    print("=" * 50)
+    tests = [
+        ("No Partial Reads", test_no_partial_reads),
+        ("Failed Write", test_failed_write),
+        ("Lock Waits", test_lock_waited),
+        ("Concurrent Exporters", test_concurrent_exporters),
+    ]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for test_name, test_func in tests:
+            print(f"\n--- {test_name} ---")
+            root = Path(tmp) / test_name.lower().replace(' ', '-')
+            root.mkdir()
+            results.append((test_name, test_func(root)))
+
+    return summarize(results, "atomic write and locking")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
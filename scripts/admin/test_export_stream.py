@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Test script for streamed exports (--output -, fd:N and named pipes).
+Exports a throwaway config whose values contain quotes (curly ones too), $(...),
+backticks and newlines, evals the streamed env output in bash and checks every
+value comes back unchanged and nothing is executed; checks that fd:N and named
+pipe outputs carry the export, that status messages stay off stdout, and that streams leave no files
+or cache entries behind. No real secrets needed.
+"""
+
+import importlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+from testlib import export_argv, make_inputs, report, summarize
+
+TRICKY = {
+    'plain': 'Melbourne_SE_Lab',
+    'spaces': 'two words  and a tab\there',
+    'quotes': "it's a \"quoted\" value",
+    'command': "$(touch pwned) `touch pwned` ${HOME}",
+    'newline': "first line\nsecond line",
+    'semicolon': "a; touch pwned; b",
+    'smart_quotes': "\u2018left\u2019 \u201alow\u201b it\u2019s",
+}
+CONFIG_YAML = "lab_info:\n" + ''.join(f"  {key}: {json.dumps(value)}\n" for key, value in TRICKY.items())
+SECRETS_YAML = "infrastructure:\n  vcenter:\n    password: \"p'a$s`w\\\"rd\"\n"
+
+
+def export(root, targets, **kwargs):
+    """Run export-config.py in root with (type, output) targets; returns the CompletedProcess."""
+    args = []
+    for export_type, output in targets:
+        args += ['--type', export_type, '--output', output]
+    return subprocess.run(export_argv(root, *args), cwd=root, capture_output=True, **kwargs)
+
+
+def expected_values():
+    expected = {f"LAB_INFO_{key.upper()}": value for key, value in TRICKY.items()}
+    expected['INFRASTRUCTURE_VCENTER_PASSWORD'] = "p'a$s`w\"rd"
+    return expected
+
+
+def test_stdout(root):
+    """The env stream evals in bash to exactly the configured values; stdout holds only the export."""
+    result = export(root, [('env', '-')])
+    names = ' '.join(expected_values())
+    script = 'eval "$(cat)"; for name in ' + names + '; do printf "%s\\0" "${!name}"; done'
+    evaluated = subprocess.run(['bash', '-c', script], cwd=root, input=result.stdout, capture_output=True)
+    values = dict(zip(expected_values(), evaluated.stdout.decode().split('\0')))
+    checks = [
+        (result.returncode == 0, f"Export exited {result.returncode}"),
+        (result.stdout.startswith(b'export ') and '✓'.encode() not in result.stdout, "stdout holds only the export"),
+        (b'streamed to -' in result.stderr, "Status message on stderr"),
+        (evaluated.returncode == 0 and values == expected_values(), "eval gives back every value unchanged"),
+        (not (root / 'pwned').exists(), "Nothing in the values was executed"),
+    ]
+    return report(checks)
+
+
+def test_fd(root):
+    """fd:N writes to an inherited descriptor; json from a pipe parses to the flattened config."""
+    read_fd, write_fd = os.pipe()
+    received = []
+    reader = threading.Thread(target=lambda: received.append(os.fdopen(read_fd, 'rb').read()))
+    reader.start()
+    result = export(root, [('json', f"fd:{write_fd}")], pass_fds=[write_fd])
+    os.close(write_fd)
+    reader.join()
+    data = json.loads(received[0]) if received[0] else {}
+    closed = export(root, [('env', 'fd:97')])
+    stdout_twice = export(root, [('env', '-'), ('json', 'fd:1')])
+    read_fd, write_fd = os.pipe()
+    alias_fd = os.dup(write_fd)
+    aliases = export(root, [('env', f"fd:{write_fd}"), ('json', f"fd:{alias_fd}")], pass_fds=[write_fd, alias_fd])
+    separate = export(root, [('env', f"fd:{write_fd}"), ('json', 'fd:1')], pass_fds=[write_fd])
+    for fd in (read_fd, write_fd, alias_fd):
+        os.close(fd)
+    checks = [
+        (result.returncode == 0 and data.get('lab_info_command') == TRICKY['command'],
+         "json streamed through a pipe on an inherited descriptor"),
+        (closed.returncode != 0 and b'not open' in closed.stderr, "A descriptor that is not open is rejected"),
+        (stdout_twice.returncode != 0 and b'fd:1 writes to the same place as -' in stdout_twice.stderr,
+         "- and fd:1 together are rejected"),
+        (aliases.returncode != 0 and b'writes to the same place as' in aliases.stderr,
+         "Two descriptors on one pipe are rejected"),
+        (separate.returncode == 0, "Descriptors on different pipes are accepted"),
+    ]
+    return report(checks)
+
+
+def test_fifo(root):
+    """A named pipe output is streamed to its reader; ps1 values are single-quoted verbatim."""
+    fifo = root / 'config.pipe'
+    os.mkfifo(fifo)
+    received = []
+
+    def read_and_remove():
+        received.append(fifo.read_text())
+        fifo.unlink()  # gone before the exporter finishes: it must not then treat it as a file
+
+    reader = threading.Thread(target=read_and_remove)
+    reader.start()
+    result = export(root, [('ps1', 'config.pipe')])
+    reader.join()
+    lines = received[0].splitlines()
+    snap = export(root, [('snap', '-')])
+    not_pipe = export(root, [('env', 'fifo:lab-config.yml')])
+    os.mkfifo(root / 'twice.pipe')
+    twice = export(root, [('env', './twice.pipe'), ('json', f"fifo:{root / 'twice.pipe'}")])
+    (root / 'twice.pipe').unlink()
+    checks = [
+        (result.returncode == 0 and not fifo.exists(), "Named pipe streamed; removing it mid-export is harmless"),
+        (not (root / '.export-cache.json').exists(), "No cache entry for the pipe"),
+        ("$LAB_INFO_QUOTES = 'it''s a \"quoted\" value'" in lines, "Single quotes doubled inside '...'"),
+        ("$LAB_INFO_COMMAND = '$(touch pwned) `touch pwned` ${HOME}'" in lines, "$ and ` kept verbatim"),
+        ("$LAB_INFO_SMART_QUOTES = '\u2018\u2018left\u2019\u2019 \u201a\u201alow\u201b\u201b it\u2019\u2019s'" in lines,
+         "Curly single quotes (U+2018-U+201B) doubled too, as PowerShell ends strings at them"),
+        (snap.returncode != 0 and b'cannot be streamed' in snap.stderr, "snap cannot be streamed"),
+        (not_pipe.returncode != 0 and b'not a named pipe' in not_pipe.stderr, "fifo: on a regular file is rejected"),
+        (twice.returncode != 0 and b'same place' in twice.stderr, "One named pipe under two spellings is rejected"),
+    ]
+    return report(checks)
+
+
+def test_nothing_on_disk(root):
+    """Streams create no files, no cache manifest and no lock next to the config."""
+    before = set(os.listdir(root))
+    export(root, [('env', '-')])
+    export(root, [('json', 'fd:1')])
+    after = set(os.listdir(root))
+    exporter = importlib.import_module('export-config')
+    checks = [
+        (after == before, f"No new files in the export directory ({sorted(after - before) or 'none'})"),
+        (exporter.variable_name('ntp.server-1') == 'NTP_SERVER_1' and exporter.variable_name('1st') == '_1ST',
+         "Keys become valid variable names"),
+    ]
+    return report(checks)
+
+
+def main():
+    print("🧪 Testing Streamed Exports")
+    print("=" * 50)
+    tests = [
+        ("Stdout", test_stdout),
+        ("File Descriptor", test_fd),
+        ("Named Pipe", test_fifo),
+        ("Nothing On Disk", test_nothing_on_disk),
+    ]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_inputs(root, CONFIG_YAML, SECRETS_YAML)
+        for test_name, test_func in tests:
+            print(f"\n--- {test_name} ---")
+            results.append((test_name, test_func(root)))
+
+    return summarize(results, "streamed export")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
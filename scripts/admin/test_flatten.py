@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Test script for key flattening in export-config.py (iter_flatten and --list-format).
+Checks each list format (native, join, index, json) on nested dicts and lists
+against expected keys, compares iter_flatten with a plain recursive flatten on
+random trees, flattens nesting well past the recursion limit, and runs the
+exporter with each --list-format. No real secrets needed.
+"""
+
+import importlib
+import json
+import random
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from testlib import export_argv, make_inputs, report, summarize
+
+export_config = importlib.import_module('export-config')
+
+NESTED = {
+    'lab_info': {'name': 'Melbourne_SE_Lab', 'groups': ['PureSEs', 'PureGuests'], 'empty': {}},
+    'infrastructure': {
+        'dns_servers': ['10.0.0.1', '10.0.0.2'],
+        'hosts': [{'name': 'esx01', 'ports': [22, 443]}, {'name': 'esx02', 'ports': []}],
+        'matrix': [[1, 2], [3]],
+        'none': [],
+    },
+    'enabled': True,
+}
+EXPECTED = {
+    'native': {
+        'lab_info_name': 'Melbourne_SE_Lab',
+        'lab_info_groups': ['PureSEs', 'PureGuests'],
+        'infrastructure_dns_servers': ['10.0.0.1', '10.0.0.2'],
+        'infrastructure_hosts': [{'name': 'esx01', 'ports': [22, 443]}, {'name': 'esx02', 'ports': []}],
+        'infrastructure_matrix': [[1, 2], [3]],
+        'infrastructure_none': [],
+        'enabled': True,
+    },
+    'join': {
+        'lab_info_name': 'Melbourne_SE_Lab',
+        'lab_info_groups': 'PureSEs,PureGuests',
+        'infrastructure_dns_servers': '10.0.0.1,10.0.0.2',
+        'infrastructure_hosts': '{"name": "esx01", "ports": [22, 443]},{"name": "esx02", "ports": []}',
+        'infrastructure_matrix': '[1, 2],[3]',
+        'infrastructure_none': '',
+        'enabled': True,
+    },
+    'index': {
+        'lab_info_name': 'Melbourne_SE_Lab',
+        'lab_info_groups_0': 'PureSEs',
+        'lab_info_groups_1': 'PureGuests',
+        'infrastructure_dns_servers_0': '10.0.0.1',
+        'infrastructure_dns_servers_1': '10.0.0.2',
+        'infrastructure_hosts_0_name': 'esx01',
+        'infrastructure_hosts_0_ports_0': 22,
+        'infrastructure_hosts_0_ports_1': 443,
+        'infrastructure_hosts_1_name': 'esx02',
+        'infrastructure_matrix_0_0': 1,
+        'infrastructure_matrix_0_1': 2,
+        'infrastructure_matrix_1_0': 3,
+        'enabled': True,
+    },
+    'json': {
+        'lab_info_name': 'Melbourne_SE_Lab',
+        'lab_info_groups': '["PureSEs", "PureGuests"]',
+        'infrastructure_dns_servers': '["10.0.0.1", "10.0.0.2"]',
+        'infrastructure_hosts': '[{"name": "esx01", "ports": [22, 443]}, {"name": "esx02", "ports": []}]',
+        'infrastructure_matrix': '[[1, 2], [3]]',
+        'infrastructure_none': '[]',
+        'enabled': True,
+    },
+}
+
+
+def reference_flatten(d, list_format, prefix=''):
+    """Straightforward recursive flatten, to check iter_flatten against."""
+    result = {}
+    for k, v in (enumerate(d) if isinstance(d, list) else d.items()):
+        key = f"{prefix}_{k}" if prefix else k
+        if isinstance(v, dict) or (isinstance(v, list) and list_format == 'index'):
+            result.update(reference_flatten(v, list_format, key))
+        elif isinstance(v, list) and list_format == 'join':
+            result[key] = ','.join(json.dumps(item) if isinstance(item, (dict, list)) else str(item) for item in v)
+        elif isinstance(v, list) and list_format == 'json':
+            result[key] = json.dumps(v)
+        else:
+            result[key] = v
+    return result
+
+
+def random_tree(rng, depth=0):
+    if depth > 4 or rng.random() < 0.3:
+        return rng.choice([rng.randint(0, 99), f"s{rng.randint(0, 9)}", None, True, 1.5])
+    if rng.random() < 0.4:
+        return [random_tree(rng, depth + 1) for _ in range(rng.randint(0, 3))]
+    return {f"k{i}": random_tree(rng, depth + 1) for i in range(rng.randint(0, 4))}
+
+
+def test_formats():
+    """Every list format on nested dicts and lists."""
+    checks = []
+    for list_format, expected in EXPECTED.items():
+        pairs = list(export_config.iter_flatten(NESTED, list_format=list_format))
+        checks.append((dict(pairs) == expected and [key for key, _ in pairs] == list(expected),
+                       f"{list_format}: {len(expected)} keys, in document order"))
+        checks.append((export_config.flatten_dict(NESTED, list_format=list_format) == expected,
+                       f"{list_format}: flatten_dict agrees"))
+    prefixed = export_config.flatten_dict({'a': {'b': 1}}, parent_key='top', sep='.')
+    checks.append((prefixed == {'top.a.b': 1}, "parent_key and sep are applied"))
+    return report(checks)
+
+
+def test_random_trees():
+    """iter_flatten matches a recursive flatten on random trees."""
+    rng = random.Random(7)
+    trees = [{f"root{i}": random_tree(rng) for i in range(rng.randint(1, 5))} for _ in range(200)]
+    checks = []
+    for list_format in EXPECTED:
+        mismatches = sum(export_config.flatten_dict(tree, list_format=list_format) != reference_flatten(tree, list_format)
+                         for tree in trees)
+        checks.append((mismatches == 0, f"{list_format}: {len(trees)} random trees, {mismatches} mismatch(es)"))
+    return report(checks)
+
+
+def test_deep_nesting():
+    """Nesting deeper than the recursion limit flattens without a RecursionError."""
+    depth = sys.getrecursionlimit() * 3
+    tree = leaf = {}
+    for i in range(depth):
+        leaf['n'] = {} if i < depth - 1 else 'bottom'
+        leaf = leaf['n']
+    lists = inner = []
+    for _ in range(depth):
+        inner.append([])
+        inner = inner[0]
+    inner.append('bottom')
+    try:
+        dicts = export_config.flatten_dict(tree)
+        indexed = export_config.flatten_dict({'l': lists}, list_format='index')
+        native = export_config.flatten_dict({'l': lists})
+    except RecursionError:
+        return report([(False, f"{depth} levels raised RecursionError")])
+    return report([
+        (dicts == {'_'.join(['n'] * depth): 'bottom'}, f"{depth} nested dicts: one key"),
+        (indexed == {'l' + '_0' * (depth + 1): 'bottom'}, f"{depth} nested lists with index: one key"),
+        (native['l'] is lists, "native keeps the deep list as is"),
+    ])
+
+
+def test_export_list_formats():
+    """export-config.py --list-format on a real export."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_inputs(root, json.dumps(NESTED), "secret:\n  token: t\n")
+
+        def export(export_type, *extra):
+            argv = export_argv(root, '--type', export_type, '--output', '-', *extra)
+            result = subprocess.run(argv, cwd=root, capture_output=True, text=True)
+            return result.stdout if result.returncode == 0 else result.stderr
+
+        checks = []
+        for list_format, expected in EXPECTED.items():
+            exported = json.loads(export('json', '--list-format', list_format))
+            exported.pop('secret_token', None)
+            checks.append((exported == expected, f"--type json --list-format {list_format}"))
+        env = export('env')
+        checks.append(("export LAB_INFO_GROUPS=PureSEs,PureGuests\n" in env, "env defaults to join"))
+        checks.append((json.loads(export('json'))['lab_info_groups'] == ['PureSEs', 'PureGuests'], "json defaults to native"))
+    return report(checks)
+
+
+def main():
+    print("🧪 Testing Key Flattening")
+    print("=" * 50)
+    tests = [
+        ("List Formats", test_formats),
+        ("Random Trees", test_random_trees),
+        ("Deep Nesting", test_deep_nesting),
+        ("Export --list-format", test_export_list_formats),
+    ]
+    results = []
+    for test_name, test_func in tests:
+        print(f"\n--- {test_name} ---")
+        results.append((test_name, test_func()))
+
+    return summarize(results, "flatten")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
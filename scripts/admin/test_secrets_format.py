@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Test script for the encrypted secrets formats in secrets_store.py and secrets_envelope.py.
+Round-trips the streaming v2 format and the per-subtree envelope, checks that tampering
+is detected and that legacy IV+CBC files are still readable, that envelope subtrees
+stream in bounded memory, and that encrypt_secrets.py
+drops subtrees deleted from secrets.yml but keeps those a partial decrypt left out.
+Uses a throwaway key; no real secrets needed.
+"""
+
+import base64
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'subscriber'))
+import decrypt_secrets
+import encrypt_secrets
+import secrets_envelope
+import secrets_store
+
+KEY = os.urandom(32)
+CHUNK = 64
+SECRETS_YAML = """# Lab secrets
+vcenter:
+  username: administrator@vsphere.local
+  password: "s3cr3t"
+
+pure_storage:
+  api_token: abc-123   # rotated quarterly
+infrastructure:
+  vcenter:
+    password: hunter2
+"""
+
+
+def expect_rejected(data, description, key=KEY):
+    try:
+        secrets_store.decrypt_bytes(data, key)
+    except ValueError as e:
+        print(f"  ✓ {description}: {e}")
+        return True
+    print(f"  ✗ {description} was accepted")
+    return False
+
+
+def test_round_trip():
+    """Every size around the chunk boundaries decrypts to the original bytes."""
+    for size in (0, 1, CHUNK - 1, CHUNK, CHUNK + 1, 3 * CHUNK, 10 * CHUNK + 7):
+        plaintext = os.urandom(size)
+        ciphertext = secrets_store.encrypt_bytes(plaintext, KEY, chunk_size=CHUNK)
+        if bytes(secrets_store.decrypt_bytes(ciphertext, KEY)) != plaintext:
+            print(f"  ✗ {size} bytes did not round-trip")
+            return False
+    print("  ✓ Round-trips at and around chunk boundaries")
+    return True
+
+
+def test_streaming():
+    """encrypt_stream/iter_decrypt_stream work chunk by chunk on file objects."""
+    plaintext = os.urandom(5 * CHUNK + 3)
+    sealed = io.BytesIO()
+    secrets_store.encrypt_stream(io.BytesIO(plaintext), sealed, KEY, chunk_size=CHUNK)
+    sealed.seek(0)
+    chunks = list(secrets_store.iter_decrypt_stream(sealed, KEY))
+    if b''.join(chunks) != plaintext or max(len(chunk) for chunk in chunks) > CHUNK:
+        print("  ✗ Streamed decrypt did not return the plaintext in chunks")
+        return False
+    print(f"  ✓ Streamed {len(plaintext)} bytes as {len(chunks)} chunks")
+    return True
+
+
+def test_tampering():
+    """Bit flips, truncation, appended data, header edits and wrong keys are all rejected."""
+    ciphertext = secrets_store.encrypt_bytes(os.urandom(4 * CHUNK + 10), KEY, chunk_size=CHUNK)
+    header = secrets_store.V2_HEADER.size
+    sealed_chunk = CHUNK + secrets_store.TAG_SIZE
+    flipped = bytearray(ciphertext)
+    flipped[header + sealed_chunk + 5] ^= 1
+    edited_header = bytearray(ciphertext)
+    edited_header[12] ^= 1
+    swapped = ciphertext[:header] + ciphertext[header + sealed_chunk:header + 2 * sealed_chunk] \
+        + ciphertext[header:header + sealed_chunk] + ciphertext[header + 2 * sealed_chunk:]
+    checks = [
+        (bytes(flipped), "Bit flip in chunk 1"),
+        (ciphertext[:header + 2 * sealed_chunk], "Truncation at a chunk boundary"),
+        (ciphertext[:-1], "Truncation inside the final chunk"),
+        (ciphertext + b'\0', "Data after the final chunk"),
+        (bytes(edited_header), "Modified header salt"),
+        (swapped, "Reordered chunks"),
+    ]
+    results = [expect_rejected(data, description) for data, description in checks]
+    results.append(expect_rejected(ciphertext, "Wrong key", key=os.urandom(32)))
+    return all(results)
+
+
+def test_legacy():
+    """Files in the old IV + AES-CBC format still decrypt."""
+    plaintext = b"vcenter:\n  password: example\n"
+    iv = os.urandom(16)
+    pad_len = 16 - len(plaintext) % 16
+    encryptor = secrets_store._aes_cbc(KEY, iv).encryptor()
+    legacy = iv + encryptor.update(plaintext + bytes([pad_len]) * pad_len) + encryptor.finalize()
+    if bytes(secrets_store.decrypt_bytes(legacy, KEY)) != plaintext:
+        print("  ✗ Legacy file did not decrypt")
+        return False
+    # No wrong-key check here: without a MAC, a random key passes the padding check 1 time in ~256
+    print("  ✓ Legacy IV+CBC file decrypts")
+    return True
+
+
+def write_container(subtrees, previous=None):
+    """(container bytes, reused names) from write_subtrees()."""
+    out = io.BytesIO()
+    reused = secrets_envelope.write_subtrees(subtrees, KEY, out, previous)
+    return out.getvalue(), reused
+
+
+def test_envelope():
+    """Subtrees decrypt on their own, unchanged bodies are reused and index edits are rejected."""
+    subtrees = secrets_envelope.split_subtrees(SECRETS_YAML)
+    container, _ = write_container(subtrees)
+    envelope = secrets_envelope.Envelope(io.BytesIO(container), KEY)
+    if b''.join(b''.join(envelope.iter_decrypt(name)) for name in envelope.names).decode() != SECRETS_YAML:
+        print("  ✗ Decrypting every subtree did not give back the original text")
+        return False
+    print(f"  ✓ {len(envelope.names)} subtrees round-trip byte for byte, comments included")
+    if envelope.load('pure_storage') != {'api_token': 'abc-123'}:
+        print("  ✗ Single subtree did not parse")
+        return False
+    print("  ✓ A single subtree decrypts and parses on its own")
+
+    edited = SECRETS_YAML.replace('abc-123', 'def-456')
+    updated, reused = write_container(secrets_envelope.split_subtrees(edited), previous=envelope)
+    vcenter = envelope.body('vcenter').read()
+    if sorted(reused) != ['infrastructure', 'vcenter'] or vcenter not in updated:
+        print(f"  ✗ Expected only pure_storage to be re-encrypted, reused {reused}")
+        return False
+    if secrets_envelope.Envelope(io.BytesIO(updated), KEY).load('pure_storage') != {'api_token': 'def-456'}:
+        print("  ✗ The re-encrypted subtree did not decrypt")
+        return False
+    print("  ✓ Only the edited subtree is re-encrypted")
+
+    index_length = int.from_bytes(container[8:12], 'little')
+    index = json.loads(container[12:12 + index_length])
+    entries = index['subtrees']
+    entries[0]['name'], entries[1]['name'] = entries[1]['name'], entries[0]['name']
+    edited_index = json.dumps(index).encode()
+    swapped = container[:8] + len(edited_index).to_bytes(4, 'little') + edited_index + container[12 + index_length:]
+    try:
+        secrets_envelope.Envelope(io.BytesIO(swapped), KEY)
+    except ValueError as e:
+        print(f"  ✓ Swapped subtree names: {e}")
+        return True
+    print("  ✗ Swapped subtree names were accepted")
+    return False
+
+
+def test_envelope_memory():
+    """A large subtree is written, decrypted and parsed without holding the container or its plaintext."""
+    size = 8 * 1024 * 1024
+    text = "big:\n" + "".join(f"  key_{i}: {'x' * 100}\n" for i in range(size // 112))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'secrets.yml.encrypted'
+        tracemalloc.start()
+        with open(path, 'wb') as f:
+            secrets_envelope.write_subtrees([('big', text)], KEY, f)
+        _, write_peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        with open(path, 'rb') as f:
+            envelope = secrets_envelope.Envelope(f, KEY)
+            decrypted = sum(len(chunk) for chunk in envelope.iter_decrypt('big'))
+        _, decrypt_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        with open(path, 'rb') as f:
+            parsed = secrets_envelope.Envelope(f, KEY).load('big')
+    mib = 1024 * 1024
+    checks = [
+        (decrypted == len(text) and len(parsed) == size // 112, f"{len(text) / mib:.1f} MiB subtree round-trips"),
+        # One encoded copy of the subtree being written; no container, no ciphertext copy
+        (write_peak < 1.5 * len(text), f"Write peak {write_peak / mib:.1f} MiB"),
+        (decrypt_peak < mib, f"Decrypt peak {decrypt_peak / 1024:.0f} KiB (chunk by chunk)"),
+    ]
+    ok = True
+    for passed, description in checks:
+        print(f"  {'✓' if passed else '✗'} {description}")
+        ok = ok and passed
+    return ok
+
+
+def envelope_names():
+    data = encrypt_secrets.ENCRYPTED_FILE.read_bytes()
+    return secrets_envelope.Envelope(io.BytesIO(data), KEY).names
+
+
+def remove_subtree(name):
+    subtrees = secrets_envelope.split_subtrees(decrypt_secrets.DECRYPTED_FILE.read_text())
+    decrypt_secrets.DECRYPTED_FILE.write_text(''.join(text for key, text in subtrees if key != name))
+
+
+def test_edit_cycle():
+    """A full encrypt writes exactly secrets.yml; subtrees left out by decrypt --only or kept with --keep survive."""
+    all_names = ['vcenter', 'pure_storage', 'infrastructure']
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        key_file = Path(tmp) / 'test.key'
+        key_file.write_text(base64.b64encode(KEY).decode())
+        encrypt_secrets.KEY_FILE = decrypt_secrets.KEY_FILE = key_file
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                Path('secrets.yml').write_text(SECRETS_YAML)
+                encrypt_secrets.encrypt_file()
+                initial = envelope_names()
+
+                decrypt_secrets.decrypt_file()
+                remove_subtree('pure_storage')
+                encrypt_secrets.encrypt_file()
+                deleted = envelope_names()
+
+                decrypt_secrets.decrypt_file(['vcenter'])
+                marker = decrypt_secrets.PARTIAL_FILE.read_text().split()
+                encrypt_secrets.encrypt_file()
+                partial = envelope_names()
+                marker_removed = not decrypt_secrets.PARTIAL_FILE.exists()
+
+                decrypt_secrets.decrypt_file(['vcenter'])
+                remove_subtree('vcenter')
+                encrypt_secrets.encrypt_file()
+                partial_deleted = envelope_names()
+
+                Path('secrets.yml').write_text(SECRETS_YAML)
+                encrypt_secrets.encrypt_file()
+                decrypt_secrets.decrypt_file()
+                remove_subtree('infrastructure')
+                encrypt_secrets.encrypt_file(keep_missing=True)
+                kept = envelope_names()
+        finally:
+            os.chdir(cwd)
+    checks = [
+        (initial == all_names, f"Encrypted subtrees: {initial}"),
+        (deleted == ['vcenter', 'infrastructure'], f"A subtree deleted from secrets.yml is removed: {deleted}"),
+        (marker == ['vcenter'] and partial == ['vcenter', 'infrastructure'] and marker_removed,
+         f"After decrypt --only the other subtrees are kept: {partial}"),
+        (partial_deleted == ['infrastructure'], f"Deleting the decrypted subtree removes only it: {partial_deleted}"),
+        (kept == all_names, f"--keep keeps subtrees missing from secrets.yml: {kept}"),
+    ]
+    ok = True
+    for passed, description in checks:
+        print(f"  {'✓' if passed else '✗'} {description}")
+        ok = ok and passed
+    return ok
+
+
+def main():
+    print("🧪 Testing Encrypted Secrets Formats")
+    print("=" * 50)
+    tests = [
+        ("Round Trip", test_round_trip),
+        ("Streaming", test_streaming),
+        ("Tamper Detection", test_tampering),
+        ("Legacy Format", test_legacy),
+        ("Subtree Envelope", test_envelope),
+        ("Envelope Memory", test_envelope_memory),
+        ("Edit Cycle", test_edit_cycle),
+    ]
+    results = []
+    for test_name, test_func in tests:
+        print(f"\n--- {test_name} ---")
+        results.append((test_name, test_func()))
+
+    print(f"\n{'='*50}")
+    print("Test Results Summary:")
+    for test_name, success in results:
+        print(f"  {test_name}: {'✓ PASS' if success else '✗ FAIL'}")
+    if all(success for _, success in results):
+        print("\n🎉 All secrets format tests passed!")
+        return 0
+    print("\n❌ Some secrets format tests failed!")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
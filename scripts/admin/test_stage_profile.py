@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Test script for the per-stage profiler in stage_profile.py.
+Allocates inside nested stages and checks that each stage reports its own peak,
+that an outer stage's peak still covers what its nested stages allocated before
+and after they ran, and that stages on other threads report wall time only.
+No secrets needed.
+"""
+
+import os
+import sys
+import threading
+
+from testlib import report, summarize
+import stage_profile
+
+MIB = 1024 * 1024
+
+
+def peaks(profiler):
+    return {record['stage']: record['peak_kib'] for record in profiler.records}
+
+
+def test_nested_peaks():
+    """A nested stage's peak reset does not hide the outer stage's earlier peak."""
+    profiler = stage_profile.Profiler('json')
+    with profiler.stage('outer'):
+        big = bytearray(20 * MIB)
+        del big
+        with profiler.stage('inner'):
+            small = bytearray(MIB)
+            del small
+        with profiler.stage('after'):
+            pass
+    recorded = peaks(profiler)
+    return report([
+        (recorded['outer'] >= 20 * 1024, f"Outer peak {recorded['outer']} KiB covers the 20 MiB before the nested stages"),
+        (1024 <= recorded['inner'] < 2 * 1024, f"Inner peak {recorded['inner']} KiB is its own 1 MiB"),
+        (recorded['after'] < 1024, f"A later sibling starts from a fresh peak ({recorded['after']} KiB)"),
+    ])
+
+
+def test_inner_peak_reaches_outer():
+    """What a nested stage allocates counts towards the enclosing stage."""
+    profiler = stage_profile.Profiler('json')
+    with profiler.stage('outer'):
+        with profiler.stage('middle'):
+            with profiler.stage('inner'):
+                big = bytearray(8 * MIB)
+                del big
+    recorded = peaks(profiler)
+    return report([
+        (all(recorded[name] >= 8 * 1024 for name in ('outer', 'middle', 'inner')),
+         f"8 MiB in the innermost stage shows in all three ({recorded})"),
+        (not profiler._open, "No stages left open"),
+    ])
+
+
+def test_threads():
+    """Stages on other threads record wall time but no peak, and leave the main-thread stack alone."""
+    profiler = stage_profile.Profiler('json')
+    depths = []
+
+    def write():
+        with profiler.stage('writer'):
+            depths.append(len(profiler._open))
+            buffer = bytearray(4 * MIB)
+            del buffer
+
+    with profiler.stage('write targets'):
+        worker = threading.Thread(target=write)
+        worker.start()
+        worker.join()
+    recorded = peaks(profiler)
+    return report([
+        (recorded['writer'] is None, "Worker stage records wall time only"),
+        (depths == [1], f"Main-thread stage stack untouched by the worker (depth {depths})"),
+        (recorded['write targets'] >= 4 * 1024, f"'write targets' has the worker's peak ({recorded['write targets']} KiB)"),
+        (not profiler._open, "No stages left open"),
+    ])
+
+
+def main():
+    print("🧪 Testing Stage Profiler")
+    print("=" * 50)
+    tests = [
+        ("Nested Peaks", test_nested_peaks),
+        ("Inner Peak Reaches Outer", test_inner_peak_reaches_outer),
+        ("Threads", test_threads),
+    ]
+    results = []
+    # enable() exports the format for child interpreters; keep it out of this one's environment
+    saved = os.environ.get(stage_profile.ENV_VAR)
+    try:
+        for test_name, test_func in tests:
+            print(f"\n--- {test_name} ---")
+            results.append((test_name, test_func()))
+    finally:
+        if saved is None:
+            os.environ.pop(stage_profile.ENV_VAR, None)
+        else:
+            os.environ[stage_profile.ENV_VAR] = saved
+
+    return summarize(results, "stage profiler")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -120,6 +120,48 @@ def test_update_script(subscriber_repo, config_submodule):
     
     return success
 
+def test_multi_target_update(subscriber_repo, config_submodule):
+    """Test producing several export targets from one update.py run"""
+    print("Testing multi-target update.py in subscriber environment...")
+    
+    os.chdir(subscriber_repo)
+    update_script = config_submodule / "scripts" / "subscriber" / "update.py"
+    
+    targets = [
+        ("env", "export/multi/lab-config.env"),
+        ("json", "export/multi/lab-config.json"),
+        ("ps1", "export/multi/lab-config.ps1")
+    ]
+    cmd = [sys.executable, str(update_script)]
+    for export_type, output_path in targets:
+        cmd += ["--type", export_type, "--output", output_path]
+    cmd += [
+        "--config", str(config_submodule / "lab-config.yml"),
+        "--secrets", str(config_submodule / "secrets.yml.encrypted"),
+        "--key", str(Path.home() / ".purestorage/se-lab-melau.key")
+    ]
+    
+    try:
+        subprocess.run(cmd, capture_output=True, text=True, check=True)
+    except subprocess.CalledProcessError as e:
+        print(f"✗ multi-target export failed: {e}")
+        print(f"STDOUT: {e.stdout}")
+        print(f"STDERR: {e.stderr}")
+        return False
+    
+    success = True
+    for export_type, output_path in targets:
+        output_file = subscriber_repo / output_path
+        if not output_file.exists():
+            print(f"  ✗ {export_type} export file not created")
+            success = False
+        elif oct(output_file.stat().st_mode)[-3:] != "400":
+            print(f"  ✗ {export_type} file has incorrect permissions")
+            success = False
+        else:
+            print(f"  ✓ {export_type} export created: {output_file}")
+    return success
+
 def test_makefile_integration(subscriber_repo, config_submodule):
     """Test using a Makefile from subscriber repo"""
     print("Testing Makefile integration in subscriber environment...")
@@ -191,6 +233,7 @@ def main():
         tests = [
             ("Install Script", lambda: test_install_script(subscriber_repo, config_submodule)),
             ("Update Script", lambda: test_update_script(subscriber_repo, config_submodule)),
+            ("Multi-target Update", lambda: test_multi_target_update(subscriber_repo, config_submodule)),
             ("Makefile Integration", lambda: test_makefile_integration(subscriber_repo, config_submodule))
         ]
         
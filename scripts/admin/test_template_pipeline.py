@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Test script for the VM template pipeline index in template_pipeline.py.
+Builds the index from a small synthetic config and checks the forward and reverse
+lookups, dangling-reference detection and status rollups, then checks that the
+repo's lab-config.yml resolves cleanly. No secrets needed.
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'subscriber'))
+import template_pipeline
+
+REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+CONFIG = {
+    'vm_template_pipeline': {
+        'infrastructure': {'vcenter_folder': 'templates'},
+        'candidate_vms': {
+            'linux_candidate': {'vm_name': 'linux-candidate', 'status': 'active'},
+            'windows_candidate': {'vm_name': 'windows-candidate', 'status': 'planned'},
+        },
+        'source_templates': {
+            'linux_single': {'template_name': 'linux-single', 'source_candidate': 'linux_candidate', 'status': 'ready'},
+            'linux_dual': {'template_name': 'linux-dual', 'source_candidate': 'linux_candidate', 'status': 'building'},
+            'windows_single': {'template_name': 'windows-single', 'source_candidate': 'windows_candidate',
+                               'status': 'ready'},
+            'orphan': {'template_name': 'orphan', 'source_candidate': 'no_such_candidate', 'status': 'planned'},
+        },
+        'content_library_ovas': {
+            'linux_base': {'ova_name': 'linux-base.ova', 'source_template': 'linux_single', 'status': 'active'},
+            'linux_dual': {'ova_name': 'linux-dual.ova', 'source_template': 'linux_dual', 'status': 'planned'},
+        },
+    },
+    'vm_deployments': {
+        'web': {'hostname': 'web-01', 'content_library_template': 'linux-base.ova'},
+        'db': {'hostname': 'db-01', 'content_library_template': 'linux-base.ova'},
+        'typo': {'hostname': 'typo-01', 'content_library_template': 'linux-bsae.ova'},
+    },
+}
+
+
+def test_lookups():
+    """Upstream chains and downstream fan-out resolve across all four stages."""
+    index = template_pipeline.PipelineIndex(CONFIG)
+    upstream = [node[1] for node in index.upstream(('deployment', 'web'))]
+    if upstream != ['linux_base', 'linux_single', 'linux_candidate']:
+        print(f"  ✗ Upstream of web: {upstream}")
+        return False
+    print("  ✓ Deployment traces back through OVA and template to its candidate")
+    downstream = [index.name(node) for node in index.downstream(('candidate', 'linux_candidate'))]
+    if downstream != ['linux-single', 'linux-base.ova', 'web-01', 'db-01', 'linux-dual', 'linux-dual.ova']:
+        print(f"  ✗ Downstream of linux_candidate: {downstream}")
+        return False
+    print(f"  ✓ Candidate fans out to {len(downstream)} downstream items")
+    if index.find('linux-base.ova') != [('ova', 'linux_base')] or index.find('db-01') != [('deployment', 'db')]:
+        print("  ✗ Lookup by name failed")
+        return False
+    print("  ✓ Items are found by key or by name")
+    return True
+
+
+def test_dangling():
+    """References to missing items are reported, not silently dropped."""
+    index = template_pipeline.PipelineIndex(CONFIG)
+    dangling = sorted((kind, key, value) for kind, key, _, value in index.dangling)
+    expected = [('deployment', 'typo', 'linux-bsae.ova'), ('template', 'orphan', 'no_such_candidate')]
+    if dangling != expected:
+        print(f"  ✗ Dangling references: {dangling}")
+        return False
+    print(f"  ✓ Found {len(dangling)} dangling references")
+    blocked = [(node[1], parent[1]) for node, parent in index.blocked()]
+    if blocked != [('windows_single', 'windows_candidate')]:
+        print(f"  ✗ Blocked items: {blocked}")
+        return False
+    print("  ✓ Ready template on a planned candidate is flagged")
+    return True
+
+
+def test_rollup():
+    """Status counts per stage."""
+    counts = template_pipeline.PipelineIndex(CONFIG).status_counts()
+    if dict(counts['template']) != {'ready': 2, 'building': 1, 'planned': 1} or counts['ova']['active'] != 1:
+        print(f"  ✗ Unexpected counts: {counts}")
+        return False
+    print("  ✓ Status counts per stage are correct")
+    return True
+
+
+def test_repo_config():
+    """The lab-config.yml in this repo has no dangling pipeline references."""
+    index = template_pipeline.load_index(REPO_ROOT / 'lab-config.yml')
+    if index.dangling:
+        print(f"  ✗ lab-config.yml has dangling references: {index.dangling}")
+        return False
+    total = sum(len(items) for items in index.items.values())
+    print(f"  ✓ lab-config.yml: {total} pipeline items, all references resolve")
+    return True
+
+
+def main():
+    print("🧪 Testing VM Template Pipeline Index")
+    print("=" * 50)
+    tests = [
+        ("Lookups", test_lookups),
+        ("Dangling References", test_dangling),
+        ("Status Rollup", test_rollup),
+        ("Repo Config", test_repo_config),
+    ]
+    results = []
+    for test_name, test_func in tests:
+        print(f"\n--- {test_name} ---")
+        results.append((test_name, test_func()))
+
+    print(f"\n{'='*50}")
+    print("Test Results Summary:")
+    for test_name, success in results:
+        print(f"  {test_name}: {'✓ PASS' if success else '✗ FAIL'}")
+    if all(success for _, success in results):
+        print("\n🎉 All template pipeline tests passed!")
+        return 0
+    print("\n❌ Some template pipeline tests failed!")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
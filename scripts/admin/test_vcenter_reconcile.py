@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Test script for the asyncio vCenter reconciler in vcenter_reconcile.py.
+Runs fake_vcenter.py on a local port with a throwaway inventory and checks the
+proposed status updates; that many lookups overlap while never more than
+--concurrency requests (and connections) are in flight; that a lookup which
+hangs times out alone; that a bad login is reported; that --apply rewrites
+only the status values in the config file; and that a failed write is reported.
+No vCenter or secrets needed.
+"""
+
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from testlib import report, summarize, yaml_cache
+import fake_vcenter
+import template_pipeline
+import vcenter_reconcile
+import yaml_loader
+
+CONFIG_YAML = """# Test pipeline
+infrastructure:
+  vcenter:
+    server: vcsa.example.invalid
+vm_template_pipeline:
+  infrastructure:
+    vcenter_folder: templates
+    content_library: lab-library
+  candidate_vms:
+    ubuntu_candidate:
+      vm_name: ubuntu-candidate
+      status: planned      # built since, should become active
+    windows_candidate:
+      vm_name: windows-candidate
+      status: active       # deleted from vCenter, should become planned
+  source_templates:
+    ubuntu_template:
+      template_name: ubuntu-template
+      source_candidate: ubuntu_candidate
+      status: building     # finished, in the folder
+    stray_template:
+      template_name: stray-template
+      source_candidate: ubuntu_candidate
+      status: building     # a VM of that name exists, but outside the folder: left alone
+  content_library_ovas:
+    ubuntu_ova:
+      ova_name: ubuntu.ova
+      source_template: ubuntu_template
+      status: planned      # in the library without .ova
+    old_ova:
+      ova_name: old.ova
+      source_template: ubuntu_template
+      status: active       # still there: no change
+"""
+INVENTORY = {
+    'vms': [
+        {'name': 'ubuntu-candidate', 'power_state': 'POWERED_ON'},
+        {'name': 'ubuntu-template', 'folder': 'templates'},
+        {'name': 'stray-template', 'folder': 'elsewhere'},
+    ],
+    'libraries': {'lab-library': ['ubuntu', 'old.ova']},
+}
+
+
+def options(fake, **overrides):
+    values = {'server': fake.url, 'username': fake_vcenter.USERNAME, 'password': fake_vcenter.PASSWORD,
+              'ca_file': None, 'insecure': False, 'concurrency': 4, 'timeout': 5.0,
+              'kinds': list(vcenter_reconcile.KINDS)}
+    values.update(overrides)
+    return type('Args', (), values)
+
+
+def test_proposals(tmp):
+    config_path = tmp / 'lab-config.yml'
+    config_path.write_text(CONFIG_YAML)
+    config = yaml_loader.load_cached(config_path)
+    with fake_vcenter.FakeVCenter(INVENTORY) as fake:
+        observations, proposals, _ = asyncio.run(vcenter_reconcile.reconcile(config, config_path, options(fake)))
+    changes = {(p.kind, p.key): (p.current, p.proposed) for p in proposals}
+    expected = {
+        ('candidate', 'ubuntu_candidate'): ('planned', 'active'),
+        ('candidate', 'windows_candidate'): ('active', 'planned'),
+        ('template', 'ubuntu_template'): ('building', 'ready'),
+        ('ova', 'ubuntu_ova'): ('planned', 'exported'),
+    }
+    return report([
+        (changes == expected, f"Proposals: {changes}"),
+        (not any(o.error for o in observations), "Every lookup answered"),
+        (not fake.sessions, "Session closed after the run"),
+        (('template', 'stray_template') not in changes, "A building item that is not found is left alone"),
+    ])
+
+
+def test_concurrency(tmp):
+    """40 templates at 0.1s each: the lookups overlap, but never beyond the limit."""
+    templates = {f"t{i}": {'template_name': f"template-{i}", 'status': 'planned'} for i in range(40)}
+    config = {'vm_template_pipeline': {'infrastructure': {'vcenter_folder': 'templates'},
+                                       'source_templates': templates}}
+    inventory = {'vms': [{'name': f"template-{i}", 'folder': 'templates'} for i in range(0, 40, 2)]}
+    with fake_vcenter.FakeVCenter(inventory, latency=0.1) as fake:
+        started = time.monotonic()
+        observations, proposals, pool = asyncio.run(vcenter_reconcile.reconcile(
+            config, tmp / 'lab-config.yml', options(fake, concurrency=8, kinds=['template'])))
+        seconds = time.monotonic() - started
+    serial = fake.requests * 0.1
+    return report([
+        (len(proposals) == 20, f"{len(proposals)} of 40 templates found and proposed ready"),
+        (seconds < serial / 3, f"{fake.requests} requests in {seconds:.2f}s (serially at least {serial:.1f}s)"),
+        (fake.peak <= 8 and pool.peak <= 8, f"At most 8 in flight (server saw {fake.peak}, client {pool.peak})"),
+        (fake.connections <= 8 and pool.opened <= 8,
+         f"{pool.opened} pooled connections reused for {pool.requests} requests"),
+    ])
+
+
+def test_timeout(tmp):
+    """A lookup that hangs fails with a timeout; the others still complete."""
+    config_path = tmp / 'lab-config.yml'
+    config_path.write_text(CONFIG_YAML)
+    config = yaml_loader.load_cached(config_path)
+    inventory = dict(INVENTORY, hang=['windows-candidate'])
+    with fake_vcenter.FakeVCenter(inventory, hang_seconds=5) as fake:
+        started = time.monotonic()
+        observations, proposals, _ = asyncio.run(vcenter_reconcile.reconcile(
+            config, config_path, options(fake, timeout=0.5)))
+        seconds = time.monotonic() - started
+    errors = {o.key: o.error for o in observations if o.error}
+    return report([
+        (list(errors) == ['windows_candidate'] and 'no response within 0.5s' in errors['windows_candidate'],
+         f"Only the hanging lookup failed: {errors}"),
+        (('candidate', 'windows_candidate') not in {(p.kind, p.key) for p in proposals},
+         "No proposal for an item that could not be checked"),
+        (seconds < 2, f"Finished in {seconds:.2f}s, not after the 5s hang"),
+    ])
+
+
+def test_login(tmp):
+    config = {'vm_template_pipeline': {}}
+    with fake_vcenter.FakeVCenter(INVENTORY) as fake:
+        try:
+            asyncio.run(vcenter_reconcile.reconcile(config, tmp / 'lab-config.yml', options(fake, password='wrong')))
+            error = None
+        except vcenter_reconcile.VCenterError as e:
+            error = str(e)
+    return report([(error and 'HTTP 401' in error, f"Wrong password reported: {error}")])
+
+
+def test_apply_error(tmp):
+    """A config that cannot be rewritten is reported, not raised."""
+    directory = tmp / 'apply-error'
+    directory.mkdir()
+    config_path = directory / 'lab-config.yml'
+    config_path.write_text(CONFIG_YAML)
+    with fake_vcenter.FakeVCenter(INVENTORY) as fake:
+        argv = ['--config', str(config_path), '--server', fake.url,
+                '--username', fake_vcenter.USERNAME, '--password', fake_vcenter.PASSWORD, '--apply']
+        original = vcenter_reconcile.export_io.atomic_write
+
+        def failing_write(*args, **kwargs):
+            raise PermissionError(13, 'Permission denied', str(config_path))
+
+        vcenter_reconcile.export_io.atomic_write = failing_write
+        try:
+            status = vcenter_reconcile.main(argv)
+            error = None
+        except OSError as e:
+            status, error = None, e
+        finally:
+            vcenter_reconcile.export_io.atomic_write = original
+    return report([
+        (status == 2 and error is None, f"Write error reported with exit status {status} ({error or 'no traceback'})"),
+        (config_path.read_text() == CONFIG_YAML, "Config left as it was"),
+    ])
+
+
+def test_apply(tmp):
+    config_path = tmp / 'apply.yml'
+    config_path.write_text(CONFIG_YAML)
+    with fake_vcenter.FakeVCenter(INVENTORY) as fake:
+        argv = ['--config', str(config_path), '--server', fake.url,
+                '--username', fake_vcenter.USERNAME, '--password', fake_vcenter.PASSWORD, '--apply']
+        status = vcenter_reconcile.main(argv)
+        index = template_pipeline.PipelineIndex(yaml_loader.load_cached(config_path))
+        again = asyncio.run(vcenter_reconcile.reconcile(
+            yaml_loader.load_cached(config_path), config_path, options(fake)))[1]
+    text = config_path.read_text()
+    expected_text = (CONFIG_YAML
+                     .replace("status: planned      # built since", "status: active      # built since")
+                     .replace("status: active       # deleted", "status: planned       # deleted")
+                     .replace("status: building     # finished", "status: ready     # finished")
+                     .replace("status: planned      # in the library", "status: exported      # in the library"))
+    return report([
+        (status == 0, f"Exit status {status}"),
+        (text == expected_text, "Only the four status values changed; comments and layout kept"),
+        (index.status(('template', 'ubuntu_template')) == 'ready', "Config parses with the new statuses"),
+        (not again, "A second run proposes nothing"),
+    ])
+
+
+def main():
+    print("🧪 Testing vCenter Reconciliation")
+    print("=" * 50)
+    tests = [
+        ("Proposals", test_proposals),
+        ("Concurrency", test_concurrency),
+        ("Timeout", test_timeout),
+        ("Login", test_login),
+        ("Apply", test_apply),
+        ("Apply Error", test_apply_error),
+    ]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp, yaml_cache(Path(tmp) / 'yaml-cache'):
+        for test_name, test_func in tests:
+            print(f"\n--- {test_name} ---")
+            results.append((test_name, test_func(Path(tmp))))
+
+    return summarize(results, "vCenter reconciliation")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+testlib.py: Helpers shared by the scripts/admin/test_*.py scripts.
+Puts scripts/subscriber on sys.path, prints check results and the summary block,
+writes a throwaway key with secrets encrypted under it, builds export-config.py
+command lines for those inputs, and points the YAML parse cache at a temp directory.
+"""
+
+import base64
+import contextlib
+import os
+import sys
+from pathlib import Path
+
+SUBSCRIBER_DIR = Path(__file__).resolve().parent.parent / 'subscriber'
+sys.path.insert(0, str(SUBSCRIBER_DIR))
+
+EXPORT_SCRIPT = SUBSCRIBER_DIR / 'export-config.py'
+CONFIG_YAML = "lab_info:\n  name: Melbourne_SE_Lab\n  location: Melbourne\n  groups: [PureSEs, PureGuests]\n"
+SECRETS_YAML = "infrastructure:\n  vcenter:\n    password: lab-password\n"
+
+
+def report(checks):
+    """Print (passed, description) checks; True if all passed."""
+    ok = True
+    for passed, description in checks:
+        print(f"  {'✓' if passed else '✗'} {description}")
+        ok = ok and bool(passed)
+    return ok
+
+
+def summarize(results, noun):
+    """Print the summary block for (test name, success) results; returns the exit status."""
+    print(f"\n{'='*50}")
+    print("Test Results Summary:")
+    for test_name, success in results:
+        print(f"  {test_name}: {'✓ PASS' if success else '✗ FAIL'}")
+    if all(success for _, success in results):
+        print(f"\n🎉 All {noun} tests passed!")
+        return 0
+    print(f"\n❌ Some {noun} tests failed!")
+    return 1
+
+
+def write_secrets(root, text=SECRETS_YAML, key_name='test.key'):
+    """Write a new random key to root/key_name and text encrypted with it to root/secrets.yml.encrypted."""
+    import secrets_store  # needs cryptography; test_config_snapshot and test_vcenter_reconcile do without
+    key = os.urandom(32)
+    (root / key_name).write_text(base64.b64encode(key).decode())
+    (root / 'secrets.yml.encrypted').write_bytes(secrets_store.encrypt_bytes(text.encode(), key))
+    return key
+
+
+def make_inputs(root, config=CONFIG_YAML, secrets=SECRETS_YAML, key_name='test.key'):
+    """Write lab-config.yml and throwaway encrypted secrets into root."""
+    (root / 'lab-config.yml').write_text(config)
+    return write_secrets(root, secrets, key_name)
+
+
+def export_argv(root, *args, key_name='test.key', script=EXPORT_SCRIPT):
+    """Command line running script (export-config.py by default) on the inputs make_inputs wrote in root."""
+    return [sys.executable, str(script), *args, '--config', 'lab-config.yml',
+            '--secrets', 'secrets.yml.encrypted', '--key', str(root / key_name)]
+
+
+@contextlib.contextmanager
+def yaml_cache(directory):
+    """Point yaml_loader's parse cache at directory until the block exits."""
+    import yaml_loader
+    original = yaml_loader.CACHE_DIR
+    yaml_loader.CACHE_DIR = Path(directory)
+    try:
+        yield
+    finally:
+        yaml_loader.CACHE_DIR = original
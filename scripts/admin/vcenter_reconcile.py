@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+vcenter_reconcile.py: Reconciles the template pipeline statuses in lab-config.yml with vCenter.
+
+The `status` fields of vm_template_pipeline.candidate_vms, source_templates and
+content_library_ovas are kept by hand. This looks every item up in vCenter through
+its REST API (vSphere 7.0+ /api endpoints), using the server in
+infrastructure.vcenter and the credentials merged in from the secrets:
+
+    candidate  a VM named vm_name exists                        -> active
+    template   a VM named template_name is in the template folder -> ready
+    ova        the content library has an item named ova_name
+               (with or without .ova)                           -> exported
+
+An item found in vCenter that is not yet marked ready/active/exported/completed
+(e.g. planned, or building and now finished) is proposed for that status; an item
+marked as one of those that is missing is proposed back to planned. An item that
+is missing and not marked ready (planned, or still building) is left alone, and so
+is every item whose lookup failed. With --apply the proposed statuses are written into
+lab-config.yml in place (comments and layout untouched); review with git diff.
+
+All lookups run concurrently on asyncio over one pool of keep-alive HTTP/1.1
+connections: at most --concurrency requests are in flight (and that many
+connections open), and every request has a --timeout. Only the standard library
+is used for HTTP, so nothing is added to the venv. TLS is verified against the
+lab CA bundle (certificates.ca_bundle in the config) unless --ca-file says otherwise.
+
+    python3 vcenter_reconcile.py                           # propose updates
+    python3 vcenter_reconcile.py --apply                   # write them to lab-config.yml
+    python3 vcenter_reconcile.py --server http://127.0.0.1:8089 --username u --password p   # fake_vcenter.py
+"""
+import argparse
+import asyncio
+import base64
+import collections
+import importlib
+import json
+import os
+import ssl
+import stat
+import sys
+import time
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'subscriber'))
+import export_io
+import template_pipeline
+import yaml_loader
+
+KEY_FILE = Path.home() / '.purestorage/se-lab-melau.key'
+DEFAULT_CONCURRENCY = 8
+DEFAULT_TIMEOUT = 10.0
+KINDS = ('candidate', 'template', 'ova')
+# Status proposed for an item that exists in vCenter, per kind (see the legend in template_pipeline.py)
+FOUND_STATUS = {'candidate': 'active', 'template': 'ready', 'ova': 'exported'}
+MISSING_STATUS = 'planned'
+
+# found: True/False, or None when the lookup failed (error says why)
+Observation = collections.namedtuple('Observation', 'kind key name found detail error')
+Proposal = collections.namedtuple('Proposal', 'kind key name current proposed reason')
+
+
+class VCenterError(Exception):
+    pass
+
+
+class HTTPPool:
+    """Keep-alive HTTP/1.1 connections to one server; at most `size` requests in flight at once."""
+
+    def __init__(self, base_url, size=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT, ssl_context=None):
+        parts = urlsplit(base_url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f"Expected an http(s) URL, got {base_url!r}")
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.ssl = (ssl_context or ssl.create_default_context()) if parts.scheme == 'https' else None
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(size)
+        self._idle = []
+        self.opened = 0      # connections opened over the pool's lifetime
+        self.requests = 0
+        self.in_flight = 0
+        self.peak = 0
+
+    async def request(self, method, path, headers=None, body=None):
+        """(status, headers, payload bytes); connecting, sending and reading are bounded by the timeout."""
+        async with self._slots:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            try:
+                return await asyncio.wait_for(self._exchange(method, path, headers or {}, body), self.timeout)
+            except asyncio.TimeoutError:
+                raise VCenterError(f"{method} {path}: no response within {self.timeout:g}s") from None
+            except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                raise VCenterError(f"{method} {path}: {e}") from None
+            finally:
+                self.in_flight -= 1
+
+    async def _exchange(self, method, path, headers, body):
+        data = json.dumps(body).encode() if body is not None else b''
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}", "Accept: application/json",
+                 f"Content-Length: {len(data)}"]
+        if body is not None:
+            lines.append("Content-Type: application/json")
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        request = ('\r\n'.join(lines) + '\r\n\r\n').encode() + data
+        while self._idle:
+            connection = self._idle.pop()
+            try:
+                return await self._send(connection, request)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass  # the server closed the idle connection; try the next one or a new one
+        connection = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+        self.opened += 1
+        return await self._send(connection, request)
+
+    async def _send(self, connection, request):
+        reader, writer = connection
+        reusable = False
+        try:
+            writer.write(request)
+            await writer.drain()
+            status, headers, payload, reusable = await self._read_response(reader)
+            return status, headers, payload
+        finally:
+            if reusable:
+                self._idle.append(connection)
+            else:
+                writer.close()
+
+    async def _read_response(self, reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise asyncio.IncompleteReadError(b'', None)
+        parts = status_line.decode('latin-1').split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+            raise ValueError(f"malformed status line {status_line!r}")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        reusable = parts[0] == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            payload = b''
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                chunk = await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                payload += chunk[:-2]
+        elif 'content-length' in headers:
+            payload = await reader.readexactly(int(headers['content-length']))
+        else:
+            payload = await reader.read()
+            reusable = False
+        return int(parts[1]), headers, payload, reusable
+
+    async def close(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+
+class VCenterClient:
+    """vSphere Automation REST API session over an HTTPPool; use as an async context manager."""
+
+    def __init__(self, base_url, username, password, concurrency=DEFAULT_CONCURRENCY,
+                 timeout=DEFAULT_TIMEOUT, ssl_context=None):
+        self.pool = HTTPPool(base_url, concurrency, timeout, ssl_context)
+        self._credentials = base64.b64encode(f"{username}:{password}".encode()).decode()
+        self._session = None
+
+    async def __aenter__(self):
+        try:
+            status, _, payload = await self.pool.request(
+                'POST', '/api/session', {'Authorization': f"Basic {self._credentials}"})
+            if status not in (200, 201):
+                raise VCenterError(f"Login failed with HTTP {status}: {self._message(payload)}")
+            self._session = json.loads(payload)
+        except BaseException:
+            await self.pool.close()
+            raise
+        return self
+
+    async def __aexit__(self, *exc):
+        try:
+            await self.pool.request('DELETE', '/api/session', self._headers())
+        except VCenterError:
+            pass  # the session expires on its own
+        finally:
+            await self.pool.close()
+
+    def _headers(self):
+        return {'vmware-api-session-id': self._session} if self._session else {}
+
+    @staticmethod
+    def _message(payload):
+        try:
+            messages = json.loads(payload).get('messages') or []
+            return '; '.join(message.get('default_message', '') for message in messages) or payload.decode()
+        except (ValueError, AttributeError):
+            return payload.decode('utf-8', 'replace')[:200]
+
+    async def call(self, method, path, params=None, body=None):
+        """Decoded JSON response; raises VCenterError on HTTP errors."""
+        if params:
+            path = f"{path}?{urlencode(params, doseq=True)}"
+        status, _, payload = await self.pool.request(method, path, self._headers(), body)
+        if status >= 400:
+            raise VCenterError(f"{method} {path}: HTTP {status}: {self._message(payload)}")
+        return json.loads(payload) if payload else None
+
+    async def vms(self, name, folder=None):
+        params = {'names': name}
+        if folder:
+            params['folders'] = folder
+        return await self.call('GET', '/api/vcenter/vm', params)
+
+    async def folder(self, name):
+        """Id of the VM folder with this name; raises VCenterError if there is none."""
+        found = await self.call('GET', '/api/vcenter/folder', {'names': name, 'type': 'VIRTUAL_MACHINE'})
+        if not found:
+            raise VCenterError(f"vCenter has no VM folder named '{name}'")
+        return found[0]['folder']
+
+    async def library(self, name):
+        """Id of the content library with this name; raises VCenterError if there is none."""
+        found = await self.call('POST', '/api/content/library', {'action': 'find'}, {'name': name})
+        if not found:
+            raise VCenterError(f"vCenter has no content library named '{name}'")
+        return found[0]
+
+    async def library_items(self, library_id, name):
+        found = await self.call('POST', '/api/content/library/item', {'action': 'find'},
+                                {'library_id': library_id, 'name': name})
+        return await asyncio.gather(*(self.call('GET', f"/api/content/library/item/{item}") for item in found))
+
+
+class Reconciler:
+    """Looks up every pipeline item concurrently and compares what exists with the configured status."""
+
+    def __init__(self, client, index, folder, library, kinds=KINDS):
+        self.client = client
+        self.index = index
+        self.folder_name = folder
+        self.library_name = library
+        self.kinds = kinds
+        self._folder = None
+        self._library = None
+
+    async def _folder_id(self):
+        # One lookup shared by every template check
+        if not self.folder_name:
+            raise VCenterError("No template folder: set vm_template_pipeline.infrastructure.vcenter_folder")
+        if self._folder is None:
+            self._folder = asyncio.ensure_future(self.client.folder(self.folder_name))
+        return await self._folder
+
+    async def _library_id(self):
+        if not self.library_name:
+            raise VCenterError("No content library: set vm_template_pipeline.infrastructure.content_library")
+        if self._library is None:
+            self._library = asyncio.ensure_future(self.client.library(self.library_name))
+        return await self._library
+
+    async def _lookup(self, kind, name):
+        """(found, detail) for one item."""
+        if kind == 'candidate':
+            vms = await self.client.vms(name)
+            return bool(vms), (vms[0].get('power_state', '') if vms else '')
+        if kind == 'template':
+            vms = await self.client.vms(name, await self._folder_id())
+            return bool(vms), (f"folder {self.folder_name}" if vms else '')
+        library_id = await self._library_id()
+        names = {name, name[:-len('.ova')]} if name.endswith('.ova') else {name}
+        items = [item for found in await asyncio.gather(*(self.client.library_items(library_id, n) for n in names))
+                 for item in found]
+        return bool(items), (f"library {self.library_name}" if items else '')
+
+    async def _observe(self, kind, key):
+        name = self.index.name((kind, key))
+        try:
+            found, detail = await self._lookup(kind, name)
+        except VCenterError as e:
+            return Observation(kind, key, name, None, '', str(e))
+        return Observation(kind, key, name, found, detail, None)
+
+    async def observe(self):
+        """Observations for every item of the selected kinds, in config order."""
+        return await asyncio.gather(*(self._observe(kind, key)
+                                      for kind in self.kinds for key in self.index.items[kind]))
+
+
+def propose(index, observations):
+    """Status changes that would make the config match the observations."""
+    proposals = []
+    for observation in observations:
+        if observation.found is None:
+            continue
+        current = index.status((observation.kind, observation.key))
+        ready = current in template_pipeline.READY_STATUSES
+        # A building item that exists has finished; one that is missing may still be building
+        if observation.found and not ready:
+            proposed = FOUND_STATUS[observation.kind]
+            reason = f"found in vCenter{' (' + observation.detail + ')' if observation.detail else ''}"
+        elif not observation.found and ready:
+            proposed, reason = MISSING_STATUS, 'not found in vCenter'
+        else:
+            continue
+        proposals.append(Proposal(observation.kind, observation.key, observation.name, current, proposed, reason))
+    return proposals
+
+
+def apply_proposals(config_path, proposals):
+    """Rewrite the status scalars in the config file in place; returns the proposals that had no status field."""
+    text = Path(config_path).read_text()
+    root = yaml_loader.compose(text)
+    edits, skipped = [], []
+    for proposal in proposals:
+        node = _mapping_value(root, template_pipeline.STAGES[proposal.kind][0] + (proposal.key, 'status'))
+        if node is None:
+            skipped.append(proposal)
+            continue
+        edits.append((node.start_mark.index, node.end_mark.index, proposal.proposed))
+    for start, end, value in sorted(edits, reverse=True):
+        text = text[:start] + value + text[end:]
+    mode = stat.S_IMODE(os.stat(config_path).st_mode)
+    export_io.atomic_write(config_path, [text.encode()], mode=mode)
+    return skipped
+
+
+def _mapping_value(node, path):
+    for part in path:
+        if node is None or node.tag != 'tag:yaml.org,2002:map':
+            return None
+        node = next((value for key, value in node.value if key.value == part), None)
+    return node
+
+
+def ssl_context(config, config_path, ca_file=None, insecure=False):
+    """TLS context verifying against --ca-file, else the config's CA bundle, else the system store."""
+    if insecure:
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        return context
+    if ca_file is None:
+        bundle = ((config.get('certificates') or {}).get('ca_bundle') or {}).get('path')
+        if bundle and (Path(config_path).parent / bundle).is_file():
+            ca_file = Path(config_path).parent / bundle
+    return ssl.create_default_context(cafile=str(ca_file) if ca_file else None)
+
+
+async def reconcile(config, config_path, args):
+    """(observations, proposals, client pool) for the config, looked up in vCenter."""
+    vcenter = (config.get('infrastructure') or {}).get('vcenter') or {}
+    server = args.server or vcenter.get('server')
+    if not server:
+        raise VCenterError("No vCenter server: set infrastructure.vcenter.server or pass --server")
+    base_url = server if '://' in server else f"https://{server}"
+    username = args.username or vcenter.get('username')
+    password = args.password if args.password is not None else vcenter.get('password')
+    if not username or password is None:
+        raise VCenterError("No vCenter credentials: the secrets have no infrastructure.vcenter.username/password")
+    index = template_pipeline.PipelineIndex(config)
+    folder = index.infrastructure.get('vcenter_folder') or vcenter.get('template_folder')
+    library = index.infrastructure.get('content_library') or vcenter.get('content_library')
+    context = ssl_context(config, config_path, args.ca_file, args.insecure)
+    async with VCenterClient(base_url, username, password, args.concurrency, args.timeout, context) as client:
+        observations = await Reconciler(client, index, folder, library, args.kinds).observe()
+    return observations, propose(index, observations), client.pool
+
+
+def load_config_with_secrets(args):
+    """The config with the secrets merged in (for the credentials), via the export code."""
+    if args.password is not None:
+        return yaml_loader.load_cached(Path(args.config)) or {}
+    exporter = importlib.import_module('export-config')
+    return exporter.load_merged(args.config, args.secrets, args.key)
+
+
+def print_report(observations, proposals, pool, seconds):
+    print(f"🔎 {len(observations)} pipeline items looked up in {seconds:.2f}s "
+          f"({pool.requests} requests, {pool.opened} connections, at most {pool.peak} in flight)")
+    for observation in observations:
+        if observation.error:
+            print(f"⚠️  {observation.kind} '{observation.name}': {observation.error}")
+    if not proposals:
+        print("✅ Every status matches vCenter")
+        return
+    print("")
+    print("Proposed status updates:")
+    for proposal in proposals:
+        print(f"   {proposal.kind:<9} {proposal.name:<36} {proposal.current} → {proposal.proposed}  ({proposal.reason})")
+
+
+def parse_kinds(value):
+    kinds = [kind.strip() for kind in value.split(',') if kind.strip()]
+    unknown = [kind for kind in kinds if kind not in KINDS]
+    if not kinds or unknown:
+        raise argparse.ArgumentTypeError(f"choose from {', '.join(KINDS)}")
+    return kinds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Propose template pipeline status updates from what exists in vCenter.")
+    parser.add_argument('--config', default=str(template_pipeline.default_config_path()), help='Config YAML path')
+    parser.add_argument('--secrets', default='secrets.yml.encrypted', help='Encrypted secrets with the vCenter credentials')
+    parser.add_argument('--key', default=str(KEY_FILE), help='Key file for the secrets')
+    parser.add_argument('--server', help='vCenter URL or host (default: infrastructure.vcenter.server)')
+    parser.add_argument('--username', help='vCenter user (default: from the secrets)')
+    parser.add_argument('--password', help='vCenter password; skips decrypting the secrets (e.g. for fake_vcenter.py)')
+    parser.add_argument('--ca-file', help='CA certificates to verify vCenter with (default: the config ca_bundle)')
+    parser.add_argument('--insecure', action='store_true', help='Do not verify the TLS certificate')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='Requests (and connections) in flight at once')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='Seconds allowed per request')
+    parser.add_argument('--kinds', type=parse_kinds, default=list(KINDS), metavar='KIND[,KIND...]',
+                        help=f"Pipeline stages to check ({', '.join(KINDS)})")
+    parser.add_argument('--apply', action='store_true', help='Write the proposed statuses into the config file')
+    parser.add_argument('--json', action='store_true', help='Print observations and proposals as JSON')
+    args = parser.parse_args(argv)
+    if args.concurrency < 1 or args.timeout <= 0:
+        parser.error("--concurrency must be at least 1 and --timeout positive")
+
+    try:
+        config = load_config_with_secrets(args)
+        started = time.monotonic()
+        observations, proposals, pool = asyncio.run(reconcile(config, args.config, args))
+    except (VCenterError, OSError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+    if args.json:
+        print(json.dumps({'observations': [o._asdict() for o in observations],
+                          'proposals': [p._asdict() for p in proposals]}, indent=2))
+    else:
+        print_report(observations, proposals, pool, time.monotonic() - started)
+    if args.apply and proposals:
+        try:
+            skipped = apply_proposals(args.config, proposals)
+        except OSError as e:
+            print(f"❌ Could not update {args.config}: {e}", file=sys.stderr)
+            return 2
+        for proposal in skipped:
+            print(f"⚠️  {proposal.kind} '{proposal.key}' has no status field; add it by hand", file=sys.stderr)
+        print(f"✓ Updated {len(proposals) - len(skipped)} status(es) in {args.config}; review with git diff",
+              file=sys.stderr if args.json else sys.stdout)
+    return 1 if any(observation.error for observation in observations) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
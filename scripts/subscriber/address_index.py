@@ -0,0 +1,419 @@
+"""
+address_index.py: Index of the IP addresses and subnets in lab-config.yml.
+
+One walk over the config collects:
+  - subnets:    every `subnet: <cidr>` (infrastructure.network.*, ...)
+  - claims:     addresses that belong to exactly one owner: `ip_address`, `*_ip`,
+                `*_vip` (VM interfaces, service IPs, array VIPs) and `*_range`
+                values written as "first-last"
+  - references: addresses that many entries may point at: `gateway`, `dns`,
+                `dns_servers`, `ntp_server(s)`
+
+Each subnet keeps its claims as sorted, disjoint [first, last] intervals, so a new
+claim is checked against its neighbours with a binary search instead of against
+every address in the config. Two claims on the same address are a conflict
+unless they have the same owner (e.g. services.web_console.admin_vm_ip and the
+pstg-mgmt-webconsole deployment both name hostname pstg-mgmt-webconsole). A claim
+on a gateway or DNS address, on a network or broadcast address, or outside every
+declared subnet is reported too, as is a gateway outside its interface's netmask.
+
+    python3 address_index.py check                      # exit 1 on conflicts
+    python3 address_index.py list                       # subnets, usage and claims
+    python3 address_index.py lookup 10.112.0.10
+    python3 address_index.py next-free 10.211.0.0/24 -n 3
+
+export-config.py runs the same checks with `--validate addresses`.
+"""
+import argparse
+import bisect
+import ipaddress
+import json
+import sys
+from pathlib import Path
+
+import yaml_loader
+
+REFERENCE_KEYS = {'gateway', 'dns', 'dns_servers', 'ntp_server', 'ntp_servers'}
+CLAIM_KEYS = {'ip', 'ip_address', 'vip'}
+CLAIM_SUFFIXES = ('_ip', '_vip', '_ip_address')
+RANGE_SUFFIX = '_range'
+
+
+class Assignment:
+    """An address or address range named at `path` in the config."""
+
+    def __init__(self, first, last, owner, path, key):
+        self.first = first
+        self.last = last
+        self.owner = owner
+        self.path = path
+        self.key = key
+        self.aliases = []  # further paths that claim the same addresses for the same owner
+
+    def describe(self):
+        first = ipaddress.ip_address(self.first)
+        span = str(first) if self.first == self.last else f"{first}-{ipaddress.ip_address(self.last)}"
+        return f"{span} ({self.owner} at {self.path})"
+
+    def as_dict(self):
+        return {'first': str(ipaddress.ip_address(self.first)), 'last': str(ipaddress.ip_address(self.last)),
+                'owner': self.owner, 'path': self.path, 'aliases': list(self.aliases)}
+
+
+class SubnetIndex:
+    """Claims in one subnet as sorted, disjoint intervals, plus the referenced addresses."""
+
+    def __init__(self, network):
+        self.network = network
+        self.paths = []
+        self._starts = []      # first address of each claim, sorted
+        self._claims = []      # Assignment per entry of _starts
+        self._referenced = []  # sorted addresses of gateways, DNS servers, ...
+        self.references = {}   # address -> [Assignment]
+
+    @property
+    def claims(self):
+        return list(self._claims)
+
+    def add_reference(self, assignment):
+        if assignment.first not in self.references:
+            bisect.insort(self._referenced, assignment.first)
+        self.references.setdefault(assignment.first, []).append(assignment)
+
+    def overlapping(self, first, last):
+        """Claims that share at least one address with [first, last]."""
+        found = []
+        i = bisect.bisect_right(self._starts, last) - 1
+        # Claims are disjoint, so their ends are sorted too: walk left until one ends before first
+        while i >= 0 and self._claims[i].last >= first:
+            found.append(self._claims[i])
+            i -= 1
+        return found[::-1]
+
+    def referenced_in(self, first, last):
+        i = bisect.bisect_left(self._referenced, first)
+        j = bisect.bisect_right(self._referenced, last)
+        return self._referenced[i:j]
+
+    def claim(self, assignment):
+        """Insert a claim; returns the claims it conflicts with (and is then not inserted)."""
+        overlaps = self.overlapping(assignment.first, assignment.last)
+        for other in overlaps:
+            if (other.owner == assignment.owner and other.first == assignment.first
+                    and other.last == assignment.last):
+                other.aliases.append(assignment.path)
+                return []
+        if overlaps:
+            return overlaps
+        i = bisect.bisect_left(self._starts, assignment.first)
+        self._starts.insert(i, assignment.first)
+        self._claims.insert(i, assignment)
+        return []
+
+    def host_bounds(self):
+        network = self.network
+        if network.num_addresses <= 2:
+            return int(network.network_address), int(network.broadcast_address)
+        return int(network.network_address) + 1, int(network.broadcast_address) - 1
+
+    def next_free(self, count=1, after=None):
+        """Up to `count` host addresses that are neither claimed nor referenced, lowest first."""
+        low, high = self.host_bounds()
+        candidate = low if after is None else max(low, int(after) + 1)
+        i = bisect.bisect_right(self._starts, candidate) - 1
+        if i >= 0 and self._claims[i].last >= candidate:
+            candidate = self._claims[i].last + 1
+        i += 1
+        referenced = set(self.referenced_in(candidate, high))
+        free = []
+        while len(free) < count and candidate <= high:
+            if i < len(self._starts) and self._starts[i] <= candidate:
+                candidate = max(candidate, self._claims[i].last + 1)
+                i += 1
+                continue
+            if candidate not in referenced:
+                free.append(ipaddress.ip_address(candidate))
+            candidate += 1
+        return free
+
+    def used(self):
+        """Number of host addresses claimed or referenced."""
+        claimed = sum(claim.last - claim.first + 1 for claim in self._claims)
+        return claimed + sum(1 for address in self._referenced if not self.overlapping(address, address))
+
+
+def _is_claim_key(key):
+    return key in CLAIM_KEYS or key.endswith(CLAIM_SUFFIXES)
+
+
+def _addresses(value):
+    """IP addresses in a scalar, list or comma-separated string; hostnames are skipped."""
+    items = value if isinstance(value, list) else str(value).split(',')
+    for item in items:
+        try:
+            yield ipaddress.ip_address(str(item).strip())
+        except ValueError:
+            continue
+
+
+def _range(value):
+    first, _, last = str(value).partition('-')
+    first, last = ipaddress.ip_address(first.strip()), ipaddress.ip_address(last.strip())
+    if first.version != last.version or last < first:
+        raise ValueError(f"'{value}' is not a first-last address range")
+    return first, last
+
+
+class AddressIndex:
+    def __init__(self, config):
+        self.subnets = {}          # ip_network -> SubnetIndex
+        self.unmanaged = SubnetIndex(None)  # claims outside every declared subnet
+        self.issues = []           # (severity, message); severity is 'error' or 'warning'
+        self._subnet_starts = []   # network address of each entry of _subnet_order, sorted
+        self._subnet_order = []
+        subnets, claims, references, interfaces = [], [], [], []
+        self._collect(config, (), [], subnets, claims, references, interfaces)
+        for network, path in subnets:
+            self._add_subnet(network, path)
+        for assignment in references:
+            subnet = self.subnet_for(assignment.first)
+            if subnet:
+                subnet.add_reference(assignment)
+        # In address order (stable, so config order decides who keeps a contested address),
+        # which makes every insert an append
+        for assignment in sorted(claims, key=lambda assignment: assignment.first):
+            self._add_claim(assignment)
+        for interface, gateway, path in interfaces:
+            self._check_interface(interface, gateway, path)
+
+    def _collect(self, node, path, owners, subnets, claims, references, interfaces):
+        if isinstance(node, list):
+            for i, item in enumerate(node):
+                self._collect(item, path + (str(i),), owners, subnets, claims, references, interfaces)
+            return
+        if not isinstance(node, dict):
+            return
+        if isinstance(node.get('hostname'), str):
+            owners = owners + [node['hostname']]
+        where = '.'.join(path)
+        for key, value in node.items():
+            key = str(key)
+            key_path = f"{where}.{key}" if where else key
+            if isinstance(value, (dict, list)) and key not in REFERENCE_KEYS:
+                self._collect(value, path + (key,), owners, subnets, claims, references, interfaces)
+            elif value in (None, ''):
+                continue
+            elif key == 'subnet':
+                try:
+                    subnets.append((ipaddress.ip_network(str(value)), key_path))
+                except ValueError:
+                    self.issues.append(('error', f"{key_path}: '{value}' is not a network in CIDR form"))
+            elif key in REFERENCE_KEYS:
+                for address in _addresses(value):
+                    references.append(Assignment(int(address), int(address), key, key_path, key))
+            elif key.endswith(RANGE_SUFFIX):
+                try:
+                    first, last = _range(value)
+                except ValueError as e:
+                    self.issues.append(('error', f"{key_path}: {e}"))
+                    continue
+                claims.append(Assignment(int(first), int(last), self._owner(node, key, owners, where), key_path, key))
+            elif _is_claim_key(key):
+                try:
+                    address = ipaddress.ip_address(str(value))
+                except ValueError:
+                    self.issues.append(('warning', f"{key_path}: '{value}' is not an IP address"))
+                    continue
+                claims.append(Assignment(int(address), int(address), self._owner(node, key, owners, where), key_path, key))
+                if key == 'ip_address' and node.get('netmask'):
+                    interfaces.append((f"{address}/{node['netmask']}", node.get('gateway'), key_path))
+
+    @staticmethod
+    def _owner(node, key, owners, where):
+        # admin_vm_ip -> admin_vm_hostname, else the nearest enclosing hostname, else the entry itself
+        for suffix in CLAIM_SUFFIXES:
+            sibling = node.get(key[:-len(suffix)] + '_hostname') if key.endswith(suffix) else None
+            if isinstance(sibling, str):
+                return sibling
+        return owners[-1] if owners else where
+
+    def _add_subnet(self, network, path):
+        if network in self.subnets:
+            self.subnets[network].paths.append(path)
+            return
+        start = int(network.network_address)
+        i = bisect.bisect_right(self._subnet_starts, start)
+        for neighbour in self._subnet_order[max(i - 1, 0):i + 1]:
+            if neighbour.network.overlaps(network):
+                self.issues.append(('error', f"Subnet {network} at {path} overlaps {neighbour.network} "
+                                             f"at {neighbour.paths[0]}"))
+        subnet = SubnetIndex(network)
+        subnet.paths.append(path)
+        self.subnets[network] = subnet
+        self._subnet_starts.insert(i, start)
+        self._subnet_order.insert(i, subnet)
+
+    def subnet_for(self, address):
+        """The declared subnet holding address (int or ip_address), or None."""
+        # Declared subnets must not overlap (reported as an error), so only the nearest one can match
+        address = int(address)
+        i = bisect.bisect_right(self._subnet_starts, address) - 1
+        if i >= 0 and address <= int(self._subnet_order[i].network.broadcast_address):
+            return self._subnet_order[i]
+        return None
+
+    def _add_claim(self, assignment):
+        subnet = self.subnet_for(assignment.first)
+        if subnet is None or assignment.last > int(subnet.network.broadcast_address):
+            conflicts = self.unmanaged.claim(assignment)
+            for other in conflicts:
+                self.issues.append(('error', f"Address conflict: {assignment.describe()} overlaps {other.describe()}"))
+            if not conflicts:
+                self.issues.append(('warning', f"{assignment.describe()} is outside every declared subnet"))
+            return
+        for other in subnet.claim(assignment):
+            self.issues.append(('error', f"Address conflict in {subnet.network}: {assignment.describe()} "
+                                         f"overlaps {other.describe()}"))
+        for address in subnet.referenced_in(assignment.first, assignment.last):
+            users = ', '.join(f"{ref.key} at {ref.path}" for ref in subnet.references[address])
+            self.issues.append(('error', f"{assignment.describe()} uses {ipaddress.ip_address(address)}, "
+                                         f"which is referenced as {users}"))
+        network = subnet.network
+        if network.num_addresses > 2:
+            for reserved, what in ((network.network_address, 'network'), (network.broadcast_address, 'broadcast')):
+                if assignment.first <= int(reserved) <= assignment.last:
+                    self.issues.append(('error', f"{assignment.describe()} includes the {what} address of {network}"))
+
+    def _check_interface(self, interface, gateway, path):
+        try:
+            network = ipaddress.ip_interface(interface).network
+        except ValueError:
+            self.issues.append(('error', f"{path}: '{interface}' has an invalid netmask"))
+            return
+        if network not in self.subnets:
+            self.issues.append(('warning', f"{path}: interface network {network} is not a declared subnet"))
+        for address in _addresses(gateway) if gateway else ():
+            if address not in network:
+                self.issues.append(('error', f"{path}: gateway {address} is outside interface network {network}"))
+
+    def errors(self):
+        return [message for severity, message in self.issues if severity == 'error']
+
+    def lookup(self, address):
+        """(subnet or None, claims, references) for one address."""
+        address = ipaddress.ip_address(address)
+        subnet = self.subnet_for(address)
+        if subnet is None:
+            return None, self.unmanaged.overlapping(int(address), int(address)), []
+        return subnet, subnet.overlapping(int(address), int(address)), subnet.references.get(int(address), [])
+
+    def next_free(self, network, count=1, after=None):
+        network = ipaddress.ip_network(network)
+        if network not in self.subnets:
+            raise ValueError(f"{network} is not a declared subnet; declared: "
+                             f"{', '.join(str(n) for n in self.subnets) or 'none'}")
+        return self.subnets[network].next_free(count, ipaddress.ip_address(after) if after else None)
+
+    def as_dict(self):
+        return {
+            'subnets': [{
+                'network': str(subnet.network),
+                'paths': subnet.paths,
+                'used': subnet.used(),
+                'hosts': subnet.host_bounds()[1] - subnet.host_bounds()[0] + 1,
+                'claims': [claim.as_dict() for claim in subnet.claims],
+                'references': {str(ipaddress.ip_address(address)): [ref.path for ref in refs]
+                               for address, refs in sorted(subnet.references.items())},
+            } for subnet in self._subnet_order],
+            'unmanaged': [claim.as_dict() for claim in self.unmanaged.claims],
+            'issues': [{'severity': severity, 'message': message} for severity, message in self.issues],
+        }
+
+
+def load_index(config_path):
+    return AddressIndex(yaml_loader.load_cached(config_path) or {})
+
+
+def default_config_path():
+    for candidate in (Path.cwd() / 'lab-config.yml', Path(__file__).resolve().parent.parent.parent / 'lab-config.yml'):
+        if candidate.exists():
+            return candidate
+    return Path('lab-config.yml')
+
+
+def print_issues(index):
+    if not index.issues:
+        print(f"✅ No address conflicts in {len(index.subnets)} subnets")
+        return
+    for severity, message in index.issues:
+        print(f"{'❌' if severity == 'error' else '⚠️ '} {message}")
+
+
+def print_list(index):
+    for subnet in index._subnet_order:
+        low, high = subnet.host_bounds()
+        print(f"🌐 {subnet.network}  ({subnet.used()}/{high - low + 1} used; {', '.join(subnet.paths)})")
+        entries = [(claim.first, claim.describe()) for claim in subnet.claims]
+        entries += [(address, f"{ipaddress.ip_address(address)} ({', '.join(sorted({ref.key for ref in refs}))})")
+                    for address, refs in subnet.references.items()]
+        for _, text in sorted(entries):
+            print(f"   {text}")
+    if index.unmanaged.claims:
+        print("❔ Outside every declared subnet")
+        for claim in index.unmanaged.claims:
+            print(f"   {claim.describe()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and query the IP addresses in lab-config.yml.")
+    parser.add_argument('--config', default=None, help='Config YAML path (default: ./lab-config.yml or the repo copy)')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    sub = parser.add_subparsers(dest='command')
+    sub.add_parser('check', help='Report conflicts and warnings; exit 1 on conflicts (default)')
+    sub.add_parser('list', help='Show each subnet with its claimed and referenced addresses')
+    lookup = sub.add_parser('lookup', help='Show who uses an address')
+    lookup.add_argument('address')
+    free = sub.add_parser('next-free', help='Show the lowest unused addresses of a subnet')
+    free.add_argument('subnet', help='A declared subnet, e.g. 10.211.0.0/24')
+    free.add_argument('-n', '--count', type=int, default=1, help='How many addresses to return')
+    free.add_argument('--after', help='Only return addresses above this one')
+    args = parser.parse_args()
+
+    index = load_index(args.config or default_config_path())
+    try:
+        if args.command == 'list':
+            print(json.dumps(index.as_dict(), indent=2)) if args.json else print_list(index)
+        elif args.command == 'lookup':
+            subnet, claims, references = index.lookup(args.address)
+            if args.json:
+                print(json.dumps({'subnet': str(subnet.network) if subnet else None,
+                                  'claims': [claim.as_dict() for claim in claims],
+                                  'references': [ref.path for ref in references]}, indent=2))
+            else:
+                print(f"{args.address}: {'in ' + str(subnet.network) if subnet else 'outside every declared subnet'}")
+                for claim in claims:
+                    print(f"   claimed by {claim.describe()}")
+                    for alias in claim.aliases:
+                        print(f"   also claimed for {claim.owner} at {alias}")
+                for ref in references:
+                    print(f"   referenced as {ref.key} at {ref.path}")
+                if not claims and not references:
+                    print("   unused")
+        elif args.command == 'next-free':
+            free = index.next_free(args.subnet, args.count, args.after)
+            print(json.dumps([str(address) for address in free]) if args.json
+                  else '\n'.join(str(address) for address in free))
+            if len(free) < args.count:
+                print(f"⚠️  Only {len(free)} free addresses left in {args.subnet}", file=sys.stderr)
+                return 1
+        else:
+            print(json.dumps(index.as_dict()['issues'], indent=2)) if args.json else print_issues(index)
+            return 1 if index.errors() else 0
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,267 @@
+"""
+batch_export.py: Exports many lab sites in parallel from one sites manifest.
+
+Each site has its own config, secrets and key (plus optional overlays) and a set
+of export targets. Sites whose targets are all up to date according to the export
+cache are skipped without starting a worker; the rest are exported concurrently
+in a process pool, each by export-config.py's main() in a worker process, so a
+site that fails (bad key, validation errors, a crash in the exporter) is reported
+and the others carry on. A worker keeps parsed configs and merged overlay chains
+between the sites it exports, so sites sharing a base config and site overlay
+merge them once per worker (see config_merge.LayerCache). Output of each site is
+collected and printed as a block when it finishes, with one progress line per site.
+
+Sites manifest (paths relative to the directory the export is run from; "{site}"
+in any string is replaced by the site name):
+
+    defaults:
+      key: ~/.purestorage/{site}.key
+      formats: [env, json, ps1]
+      output_dir: export/{site}
+    sites:
+      melbourne:
+        config: sites/melbourne/lab-config.yml
+        secrets: sites/melbourne/secrets.yml.encrypted
+      sydney:
+        config: lab-config.yml
+        overlays: [sites/sydney.yml]
+        secrets: sites/sydney/secrets.yml.encrypted
+        validate: [addresses]
+        feed: export/sydney/feed           # versioned deltas, see delta_feed.py
+        targets:                       # instead of formats/output_dir
+          - {type: env, output: export/sydney/lab.env}
+
+    python3 batch_export.py sites.yml --jobs 4 --sites melbourne,sydney
+"""
+import argparse
+import importlib
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+import export_cache
+import export_io
+
+EXPORT_TYPES = ['env', 'json', 'ps1', 'snap']
+SITE_KEYS = {'config', 'secrets', 'key', 'overlays', 'merge_policy', 'list_merge', 'list_format',
+             'only', 'validate', 'schema', 'formats', 'output_dir', 'targets', 'feed'}
+DEFAULT_KEY = '~/.purestorage/se-lab-melau.key'
+
+
+class Site:
+    """One site's inputs and export targets, as passed to a worker process."""
+
+    def __init__(self, name, settings):
+        unknown = sorted(set(settings) - SITE_KEYS)
+        if unknown:
+            raise ValueError(f"site '{name}': unknown setting(s) {', '.join(unknown)}")
+        settings = {key: _expand(value, name) for key, value in settings.items()}
+        for key in ('config', 'secrets'):
+            if not settings.get(key):
+                raise ValueError(f"site '{name}': '{key}' is required")
+        self.name = name
+        # Inputs are made absolute here; export-config.py would look for a relative key next to itself
+        self.config = _absolute(settings['config'])
+        self.secrets = _absolute(settings['secrets'])
+        self.key = _absolute(settings.get('key') or os.path.expanduser(DEFAULT_KEY))
+        self.overlays = [_absolute(overlay) for overlay in settings.get('overlays') or []]
+        self.merge_policy = settings.get('merge_policy')
+        self.list_merge = settings.get('list_merge')
+        self.list_format = settings.get('list_format')
+        self.only = _names(settings.get('only'))
+        self.validate = _names(settings.get('validate'))
+        self.schema = settings.get('schema') and _absolute(settings['schema'])
+        self.feed = settings.get('feed')
+        self.targets = self._targets(settings)
+
+    def _targets(self, settings):
+        if settings.get('targets'):
+            targets = [(target['type'], target['output']) for target in settings['targets']]
+        else:
+            formats = settings.get('formats') or ['env', 'json', 'ps1']
+            output_dir = settings.get('output_dir') or f"export/{self.name}"
+            targets = [(export_type, f"{output_dir}/lab-config.{export_type}") for export_type in formats]
+        for export_type, output in targets:
+            if export_type not in EXPORT_TYPES:
+                raise ValueError(f"site '{self.name}': unknown export type '{export_type}' for {output}")
+            if export_io.stream_output(output):
+                raise ValueError(f"site '{self.name}': {output} is a stream; sites export to files")
+        return targets
+
+    def argv(self, force=False, no_cache=False):
+        """export-config.py arguments for this site."""
+        argv = []
+        for export_type, output in self.targets:
+            argv += ['--type', export_type, '--output', output]
+        argv += ['--config', self.config, '--secrets', self.secrets, '--key', self.key]
+        for overlay in self.overlays:
+            argv += ['--overlay', overlay]
+        for flag, value in (('--merge-policy', self.merge_policy), ('--list-merge', self.list_merge),
+                            ('--list-format', self.list_format), ('--schema', self.schema), ('--feed', self.feed)):
+            if value:
+                argv += [flag, value]
+        if self.only:
+            argv += ['--only', ','.join(self.only)]
+        if self.validate:
+            argv += ['--validate', ','.join(self.validate)]
+        if force:
+            argv.append('--force')
+        if no_cache:
+            argv.append('--no-cache')
+        return argv
+
+    def is_fresh(self):
+        """True when the export cache shows every target is current; never raises."""
+        try:
+            fingerprint = export_cache.input_fingerprint(
+                self.config, self.secrets, self.key,
+                export_cache.cache_options(self.list_format, self.only, self.validate, self.config, self.schema,
+                                           self.overlays, self.merge_policy, self.list_merge))
+            if self.feed:
+                import delta_feed
+                if not delta_feed.Feed(export_cache.resolve_path(self.feed)).is_fresh(fingerprint):
+                    return False
+            return all(export_cache.is_fresh(export_type, output, fingerprint)
+                       for export_type, output in self.targets)
+        except OSError:
+            return False
+
+
+class SiteResult:
+    def __init__(self, name, ok, seconds, log):
+        self.name = name
+        self.ok = ok
+        self.seconds = seconds
+        self.log = log
+
+
+def _expand(value, site):
+    if isinstance(value, str):
+        return os.path.expanduser(value.replace('{site}', site))
+    if isinstance(value, list):
+        return [_expand(item, site) for item in value]
+    if isinstance(value, dict):
+        return {key: _expand(item, site) for key, item in value.items()}
+    return value
+
+
+def _absolute(path):
+    return str(export_cache.resolve_path(path))
+
+
+def _names(value):
+    if isinstance(value, str):
+        value = [name.strip() for name in value.split(',')]
+    return [name for name in value if name] if value else None
+
+
+def load_sites(manifest_path, only_sites=None):
+    """Sites from a sites manifest, in manifest order; raises ValueError on a bad manifest."""
+    import yaml_loader
+    manifest = yaml_loader.load_cached(export_cache.resolve_path(manifest_path)) or {}
+    if not isinstance(manifest, dict) or not isinstance(manifest.get('sites'), dict):
+        raise ValueError(f"{manifest_path}: expected a 'sites' mapping")
+    defaults = manifest.get('defaults') or {}
+    names = list(manifest['sites'])
+    if only_sites:
+        unknown = [name for name in only_sites if name not in manifest['sites']]
+        if unknown:
+            raise ValueError(f"Unknown site(s) {', '.join(unknown)}; {manifest_path} has {', '.join(names)}")
+        names = [name for name in names if name in only_sites]
+    sites = [Site(name, {**defaults, **(manifest['sites'][name] or {})}) for name in names]
+    owners = {}
+    for site in sites:
+        for output in [output for _, output in site.targets] + ([site.feed] if site.feed else []):
+            path = export_cache.resolve_path(output)
+            if path in owners:
+                raise ValueError(f"{output} is written by both '{owners[path]}' and '{site.name}'")
+            owners[path] = site.name
+    return sites
+
+
+def export_site(site, force=False, no_cache=False):
+    """Export one site in this (worker) process; failures are returned, never raised."""
+    log = io.StringIO()
+    start = time.perf_counter()
+    try:
+        with redirect_stdout(log), redirect_stderr(log):
+            importlib.import_module('export-config').main(site.argv(force, no_cache))
+        ok = True
+    except SystemExit as e:
+        ok = not e.code
+    except Exception as e:
+        log.write(f"❌ {type(e).__name__}: {e}\n")
+        ok = False
+    return SiteResult(site.name, ok, time.perf_counter() - start, log.getvalue())
+
+
+def print_result(result, done, total, verbose=False):
+    mark = '✓' if result.ok else '✗'
+    print(f"[{done}/{total}] {mark} {result.name} ({result.seconds:.1f}s)", flush=True)
+    if verbose or not result.ok:
+        for line in result.log.splitlines():
+            print(f"    {line}")
+
+
+def run_batch(sites, jobs=None, force=False, no_cache=False, verbose=False):
+    """Export the stale sites concurrently; returns one SiteResult per exported site."""
+    stale = [site for site in sites if force or no_cache or not site.is_fresh()]
+    for site in sites:
+        if site not in stale:
+            print(f"✓ {site.name} is up to date")
+    if not stale:
+        return []
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(stale)))
+    print(f"🚀 Exporting {len(stale)} site(s) with {jobs} worker(s)", flush=True)
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(export_site, site, force, no_cache): site for site in stale}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker itself died (e.g. killed by the OS); the pool reports it per site
+                result = SiteResult(futures[future].name, False, 0.0, f"❌ worker failed: {e!r}")
+            results.append(result)
+            print_result(result, len(results), len(stale), verbose)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export several lab sites in parallel from a sites manifest.")
+    parser.add_argument('manifest', help='YAML file with defaults and a sites mapping')
+    parser.add_argument('--sites', type=_names, metavar='NAME[,NAME...]', help='Export only these sites')
+    parser.add_argument('--jobs', '-j', type=int, help='Worker processes (default: one per CPU, at most one per site)')
+    parser.add_argument('--force', action='store_true', help='Regenerate targets even if they are up to date')
+    parser.add_argument('--no-cache', action='store_true', help='Neither consult nor update the export cache manifests')
+    parser.add_argument('--verbose', '-v', action='store_true', help="Show each site's exporter output, not only for failures")
+    args = parser.parse_args(argv)
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
+    try:
+        sites = load_sites(args.manifest, args.sites)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(2)
+
+    start = time.perf_counter()
+    results = run_batch(sites, args.jobs, args.force, args.no_cache, args.verbose)
+    failed = [result.name for result in results if not result.ok]
+    print(f"\n{len(sites)} site(s): {len(results) - len(failed)} exported, "
+          f"{len(sites) - len(results)} up to date, {len(failed)} failed "
+          f"in {time.perf_counter() - start:.1f}s")
+    if failed:
+        print(f"❌ Failed: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,396 @@
+"""
+cert_index.py: Index and verification of the lab CA certificates.
+
+Loads every certificate in the certificates directory and every file named in the
+`certificates` section of lab-config.yml, including each member of multi-certificate
+files such as ca_bundle.cer, in one process with cryptography.x509, and indexes
+them by fingerprint with subject, issuer, serial and validity. One pass reports:
+
+  - files that hold no readable certificate
+  - certificates that have expired, or expire within --warn-days (default 90)
+  - drift between the config and the files: a missing file, or an `issuer` or
+    `valid_until` that does not match the file's first certificate
+  - CA certificates from the individual files that are missing from the bundle,
+    and bundle members that are not in any individual file
+  - certificates whose issuer is not in any file, or whose signature does not
+    verify against that issuer
+
+Parsed files are cached under ~/.cache/se-lab-melau-config/certs/ by SHA-256 of
+their content, and signature checks by the fingerprints of the two certificates,
+so a run where no certificate file changed does not import cryptography at all.
+
+    python3 cert_index.py check              # exit 1 on errors (the default)
+    python3 cert_index.py list               # the index: subject, issuer, expiry, files
+    python3 cert_index.py expiring --days 365
+"""
+import argparse
+import base64
+import datetime
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+import yaml_loader
+
+CACHE_DIR = yaml_loader.CACHE_DIR.parent / 'certs'
+CACHE_FORMAT = 1
+CERT_SUFFIXES = ('.cer', '.crt', '.pem')
+BUNDLE_ENTRY = 'ca_bundle'
+WARN_DAYS = 90
+
+
+def _common_name(name):
+    from cryptography.x509.oid import NameOID
+    values = name.get_attributes_for_oid(NameOID.COMMON_NAME)
+    return values[0].value if values else name.rfc4514_string()
+
+
+def _extension(cert, extension_class, attribute):
+    from cryptography import x509
+    try:
+        value = getattr(cert.extensions.get_extension_for_class(extension_class).value, attribute)
+    except x509.ExtensionNotFound:
+        return None
+    return value.hex() if isinstance(value, bytes) else value
+
+
+def parse_certificates(data):
+    """Records of the certificates in PEM (one or more) or DER data; raises ValueError if there are none."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.serialization import Encoding
+    if b'-----BEGIN' in data:
+        certs = x509.load_pem_x509_certificates(data)
+    else:
+        certs = [x509.load_der_x509_certificate(data)]
+    records = []
+    for cert in certs:
+        records.append({
+            'subject': cert.subject.rfc4514_string(),
+            'subject_cn': _common_name(cert.subject),
+            'issuer': cert.issuer.rfc4514_string(),
+            'issuer_cn': _common_name(cert.issuer),
+            'fingerprint': cert.fingerprint(hashes.SHA256()).hex(),
+            'serial': format(cert.serial_number, 'x'),
+            'not_before': cert.not_valid_before_utc.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'not_after': cert.not_valid_after_utc.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'is_ca': bool(_extension(cert, x509.BasicConstraints, 'ca')),
+            'subject_key_id': _extension(cert, x509.SubjectKeyIdentifier, 'digest'),
+            'authority_key_id': _extension(cert, x509.AuthorityKeyIdentifier, 'key_identifier'),
+            'der': base64.b64encode(cert.public_bytes(Encoding.DER)).decode(),
+        })
+    return records
+
+
+def signed_by(child, issuer):
+    """True when the issuer record's key verifies the child record's signature."""
+    from cryptography import x509
+    from cryptography.exceptions import InvalidSignature
+    child_cert = x509.load_der_x509_certificate(base64.b64decode(child['der']))
+    issuer_cert = x509.load_der_x509_certificate(base64.b64decode(issuer['der']))
+    try:
+        child_cert.verify_directly_issued_by(issuer_cert)
+    except (InvalidSignature, ValueError, TypeError):
+        return False
+    return True
+
+
+class ParseCache:
+    """Parsed certificate files by content hash, and signature results by fingerprint pair."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.path = CACHE_DIR / 'index.json'
+        self.files, self.signatures = {}, {}
+        self.changed = False
+        self.parsed = 0
+        if enabled:
+            try:
+                with open(self.path, 'r') as f:
+                    cached = json.load(f)
+                if cached.get('format') == CACHE_FORMAT:
+                    self.files, self.signatures = cached['files'], cached['signatures']
+            except (OSError, ValueError, KeyError):
+                pass
+
+    def records(self, data):
+        """Records for file content (parsed on a miss); an error string for content with no certificate."""
+        digest = hashlib.sha256(data).hexdigest()
+        if digest not in self.files:
+            self.parsed += 1
+            try:
+                self.files[digest] = parse_certificates(data)
+            except ValueError as e:
+                self.files[digest] = f"no readable certificate ({e})"
+            self.changed = True
+        return self.files[digest]
+
+    def signed_by(self, child, issuer):
+        pair = f"{child['fingerprint']}:{issuer['fingerprint']}"
+        if pair not in self.signatures:
+            self.signatures[pair] = signed_by(child, issuer)
+            self.changed = True
+        return self.signatures[pair]
+
+    def save(self, used_files):
+        """Write the cache, keeping only files seen in this run (signatures are tiny and kept)."""
+        if not (self.enabled and self.changed):
+            return
+        files = {digest: self.files[digest] for digest in used_files if digest in self.files}
+        CACHE_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'format': CACHE_FORMAT, 'files': files, 'signatures': self.signatures}, f)
+        os.replace(tmp_path, self.path)
+
+
+class CertIndex:
+    """All certificates of the config and the certificates directory, checked in one pass."""
+
+    def __init__(self, config, base_dir, cert_dir=None, warn_days=WARN_DAYS, now=None, use_cache=True):
+        self.base_dir = Path(base_dir)
+        self.cert_dir = Path(cert_dir) if cert_dir else self.base_dir / 'certificates'
+        self.warn_days = warn_days
+        self.now = now or datetime.datetime.now(datetime.timezone.utc)
+        self.cache = ParseCache(use_cache)
+        self.entries = {name: entry for name, entry in ((config or {}).get('certificates') or {}).items()
+                        if isinstance(entry, dict) and 'path' in entry}
+        self.certs = {}      # fingerprint -> record
+        self.sources = {}    # fingerprint -> [file names]
+        self.files = {}      # file name -> [fingerprints], or an error string
+        self.issues = []
+        self._load()
+        self._check_expiry()
+        self._check_config()
+        self._check_bundle()
+        self._check_chains()
+
+    def _relative(self, path):
+        try:
+            return str(path.resolve().relative_to(self.base_dir.resolve()))
+        except ValueError:
+            return str(path)
+
+    def _load(self):
+        paths = {}
+        if self.cert_dir.is_dir():
+            for path in sorted(self.cert_dir.iterdir()):
+                if path.suffix.lower() in CERT_SUFFIXES:
+                    paths[self._relative(path)] = path
+        for entry in self.entries.values():
+            path = self.base_dir / entry['path']
+            if path.is_file():
+                paths.setdefault(self._relative(path), path)
+        used = []
+        for name, path in paths.items():
+            data = path.read_bytes()
+            used.append(hashlib.sha256(data).hexdigest())
+            records = self.cache.records(data)
+            if isinstance(records, str):
+                self.files[name] = records
+                self.issues.append(('error', f"{name}: {records}"))
+                continue
+            self.files[name] = []
+            for record in records:
+                self.certs.setdefault(record['fingerprint'], record)
+                self.sources.setdefault(record['fingerprint'], []).append(name)
+                self.files[name].append(record['fingerprint'])
+        self._used = used
+
+    def save_cache(self):
+        self.cache.save(self._used)
+
+    def days_left(self, record):
+        not_after = datetime.datetime.strptime(record['not_after'], '%Y-%m-%dT%H:%M:%SZ')
+        return (not_after.replace(tzinfo=datetime.timezone.utc) - self.now).days
+
+    def describe(self, fingerprint):
+        return f"{self.certs[fingerprint]['subject_cn']} ({', '.join(self.sources[fingerprint])})"
+
+    def _check_expiry(self):
+        for fingerprint, record in self.certs.items():
+            days = self.days_left(record)
+            if days < 0:
+                self.issues.append(('error', f"{self.describe(fingerprint)} expired on {record['not_after'][:10]}"))
+            elif days <= self.warn_days:
+                self.issues.append(('warning', f"{self.describe(fingerprint)} expires in {days} days "
+                                               f"({record['not_after'][:10]})"))
+
+    def _check_config(self):
+        for name, entry in self.entries.items():
+            path = self._relative(self.base_dir / entry['path'])
+            fingerprints = self.files.get(path)
+            if fingerprints is None:
+                self.issues.append(('error', f"certificates.{name}: {entry['path']} does not exist"))
+                continue
+            if isinstance(fingerprints, str) or not fingerprints:
+                continue  # already reported by _load
+            first = self.certs[fingerprints[0]]
+            issuer = entry.get('issuer')
+            if issuer and str(issuer) not in (first['issuer_cn'], first['issuer']):
+                self.issues.append(('error', f"certificates.{name}.issuer is '{issuer}' but {path} "
+                                             f"is issued by '{first['issuer_cn']}'"))
+            valid_until = entry.get('valid_until')
+            if valid_until and str(valid_until) != first['not_after'][:10]:
+                self.issues.append(('error', f"certificates.{name}.valid_until is {valid_until} but {path} "
+                                             f"expires on {first['not_after'][:10]}"))
+        listed = {self._relative(self.base_dir / entry['path']) for entry in self.entries.values()}
+        for path in self.files:
+            if path not in listed:
+                self.issues.append(('warning', f"{path} is not listed in the certificates section of the config"))
+
+    def bundle_file(self):
+        if BUNDLE_ENTRY in self.entries:
+            return self._relative(self.base_dir / self.entries[BUNDLE_ENTRY]['path'])
+        return next((path for path in self.files if Path(path).stem == BUNDLE_ENTRY), None)
+
+    def _check_bundle(self):
+        bundle = self.bundle_file()
+        members = self.files.get(bundle)
+        if not isinstance(members, list):
+            return
+        elsewhere = set()
+        for path, fingerprints in self.files.items():
+            if path == bundle or not isinstance(fingerprints, list):
+                continue
+            for fingerprint in fingerprints:
+                elsewhere.add(fingerprint)
+                if self.certs[fingerprint]['is_ca'] and fingerprint not in members:
+                    self.issues.append(('error', f"{bundle} is missing {self.certs[fingerprint]['subject_cn']} "
+                                                 f"from {path}"))
+        for fingerprint in members:
+            if fingerprint not in elsewhere:
+                self.issues.append(('warning', f"{bundle} holds {self.certs[fingerprint]['subject_cn']}, "
+                                               f"which is in no individual certificate file"))
+
+    def issuers_of(self, record):
+        """Candidate issuer records: same subject as the issuer name, matching key id when both have one."""
+        candidates = []
+        for other in self.certs.values():
+            if other['subject'] != record['issuer']:
+                continue
+            if record['authority_key_id'] and other['subject_key_id'] \
+                    and record['authority_key_id'] != other['subject_key_id']:
+                continue
+            candidates.append(other)
+        return candidates
+
+    def _check_chains(self):
+        for fingerprint, record in self.certs.items():
+            candidates = self.issuers_of(record)
+            if not candidates:
+                self.issues.append(('warning', f"{self.describe(fingerprint)}: issuer '{record['issuer_cn']}' "
+                                               f"is not in any certificate file"))
+            elif not any(self.cache.signed_by(record, issuer) for issuer in candidates):
+                self.issues.append(('error', f"{self.describe(fingerprint)}: signature does not verify "
+                                             f"against issuer '{record['issuer_cn']}'"))
+
+    def errors(self):
+        return [message for severity, message in self.issues if severity == 'error']
+
+    def expiring(self, days):
+        """Records expiring within `days` (or already expired), soonest first."""
+        return sorted((record for record in self.certs.values() if self.days_left(record) <= days),
+                      key=lambda record: record['not_after'])
+
+    def as_dict(self):
+        return {
+            'certificates': [
+                {key: value for key, value in record.items() if key != 'der'}
+                | {'files': self.sources[fingerprint], 'days_left': self.days_left(record)}
+                for fingerprint, record in sorted(self.certs.items(), key=lambda item: item[1]['not_after'])
+            ],
+            'issues': [{'severity': severity, 'message': message} for severity, message in self.issues],
+        }
+
+
+def load_index(config_path, cert_dir=None, warn_days=WARN_DAYS, use_cache=True):
+    config_path = Path(config_path)
+    index = CertIndex(yaml_loader.load_cached(config_path) or {}, config_path.resolve().parent,
+                      cert_dir, warn_days, use_cache=use_cache)
+    try:
+        index.save_cache()
+    except OSError:
+        pass
+    return index
+
+
+def default_config_path():
+    for candidate in (Path.cwd() / 'lab-config.yml', Path(__file__).resolve().parent.parent.parent / 'lab-config.yml'):
+        if candidate.exists():
+            return candidate
+    return Path('lab-config.yml')
+
+
+def print_list(index, records=None):
+    records = index.expiring(float('inf')) if records is None else records
+    rows = [(record['subject_cn'], record['issuer_cn'], record['not_after'][:10], str(index.days_left(record)),
+             ', '.join(index.sources[record['fingerprint']]), record['fingerprint'][:16])
+            for record in records]
+    headers = ('Subject', 'Issuer', 'Expires', 'Days', 'Files', 'SHA-256')
+    widths = [max(len(row[i]) for row in rows + [headers]) for i in range(len(headers))]
+    print('   ' + '  '.join(header.ljust(width) for header, width in zip(headers, widths)))
+    for row in rows:
+        print('   ' + '  '.join(value.ljust(width) for value, width in zip(row, widths)))
+
+
+def print_issues(index):
+    print(f"📁 {len(index.files)} certificate files, {len(index.certs)} unique certificates")
+    print_list(index)
+    print("")
+    if not index.issues:
+        print("✅ Certificates match the config, the bundle is complete and every chain verifies")
+    for severity, message in index.issues:
+        print(f"{'❌' if severity == 'error' else '⚠️ '} {message}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify the lab certificates against each other and lab-config.yml.")
+    parser.add_argument('--config', default=None, help='Config YAML path (default: ./lab-config.yml or the repo copy)')
+    parser.add_argument('--cert-dir', help='Certificates directory (default: certificates/ next to the config)')
+    parser.add_argument('--warn-days', type=int, default=WARN_DAYS, help='Warn about certificates expiring within this many days')
+    parser.add_argument('--no-cache', action='store_true', help='Parse every file and verify every signature again')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    sub = parser.add_subparsers(dest='command')
+    sub.add_parser('check', help='Report expiry, drift, bundle and chain problems; exit 1 on errors (default)')
+    sub.add_parser('list', help='Show the certificate index')
+    expiring = sub.add_parser('expiring', help='Show certificates expiring within a number of days')
+    expiring.add_argument('--days', type=int, help='Days ahead (default: --warn-days)')
+    args = parser.parse_args()
+
+    try:
+        index = load_index(args.config or default_config_path(), args.cert_dir, args.warn_days, not args.no_cache)
+    except ImportError:
+        print("❌ cryptography is not installed; run install.py or use the config repo's .venv/bin/python",
+              file=sys.stderr)
+        return 2
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+    if args.command == 'list':
+        if args.json:
+            print(json.dumps(index.as_dict()['certificates'], indent=2))
+        else:
+            print_list(index)
+    elif args.command == 'expiring':
+        records = index.expiring(args.days if args.days is not None else args.warn_days)
+        if args.json:
+            print(json.dumps([record['fingerprint'] for record in records], indent=2))
+        elif records:
+            print_list(index, records)
+        else:
+            print("✅ No certificates expire in that time")
+    else:
+        if args.json:
+            print(json.dumps(index.as_dict(), indent=2))
+        else:
+            print_issues(index)
+        return 1 if index.errors() else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""
+config_daemon.py: Resident lab config server answering lookups over a Unix domain socket.
+
+Loads lab-config.yml and the encrypted secrets once with export-config.py's
+load_config/decrypt_secrets/flatten_dict, keeps the merged and flattened result
+in memory, and reloads it when any source file changes. Clients (see
+config_query.py) send newline-delimited JSON requests:
+
+    {"op": "get", "keys": ["VCENTER_USERNAME", ...]}   -> {"ok": true, "values": {...}, "missing": [...]}
+    {"op": "prefix", "prefix": "INFRASTRUCTURE_VCENTER_"} -> {"ok": true, "values": {...}}
+    {"op": "subtree", "path": "infrastructure.vcenter"}  -> {"ok": true, "value": {...}}
+    {"op": "ping"} / {"op": "reload"}
+
+Keys are matched case-insensitively against the flattened names used in lab-config.env.
+"values" only holds keys that exist, so a null value is told apart from an unknown
+key; the unknown ones are listed in "missing" as they were asked for.
+The socket is created with mode 0600 because responses contain decrypted secrets.
+"""
+import argparse
+import bisect
+import importlib.util
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+from pathlib import Path
+
+from config_query import default_socket_path
+
+EXPORT_SCRIPT = Path(__file__).resolve().parent / 'export-config.py'
+
+
+def load_export_config():
+    """Dynamically load export-config.py module"""
+    spec = importlib.util.spec_from_file_location("export_config", EXPORT_SCRIPT)
+    export_config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(export_config)
+    return export_config
+
+
+class Snapshot:
+    """One immutable loaded view of the config; replaced wholesale on reload."""
+
+    def __init__(self, merged, flat, version):
+        self.merged = merged
+        self.values = {key.upper(): value for key, value in flat.items()}
+        self.keys = sorted(self.values)
+        self.version = version
+        self.loaded_at = time.time()
+
+    def get(self, keys):
+        """Values of the keys that exist; keys not in the config are left out."""
+        return {key: self.values[key.upper()] for key in keys if key.upper() in self.values}
+
+    def prefix(self, prefix):
+        prefix = prefix.upper()
+        start = bisect.bisect_left(self.keys, prefix)
+        result = {}
+        for key in self.keys[start:]:
+            if not key.startswith(prefix):
+                break
+            result[key] = self.values[key]
+        return result
+
+    def subtree(self, path):
+        node = self.merged
+        for part in filter(None, path.split('.')):
+            if not isinstance(node, dict) or part not in node:
+                raise KeyError(f"No subtree at '{path}'")
+            node = node[part]
+        return node
+
+
+class ConfigStore:
+    def __init__(self, exporter, config_path, secrets_path, key_path):
+        self.exporter = exporter
+        self.config_path = config_path
+        self.secrets_path = secrets_path
+        self.key_path = key_path
+        self.sources = [Path(config_path), Path(secrets_path), Path(key_path)]
+        self.snapshot = None
+        self.stamps = None
+        self.reload_lock = threading.Lock()
+
+    def _stamps(self):
+        stamps = []
+        for path in self.sources:
+            try:
+                st = path.stat()
+                stamps.append((st.st_ino, st.st_size, st.st_mtime_ns))
+            except OSError:
+                stamps.append(None)
+        return stamps
+
+    def reload(self, force=False):
+        """Reload when a source changed; keep serving the old snapshot if loading fails."""
+        with self.reload_lock:
+            stamps = self._stamps()
+            if not force and stamps == self.stamps:
+                return False
+            try:
+                config = self.exporter.load_config(self.config_path)
+                secrets = self.exporter.decrypt_secrets(self.secrets_path, self.key_path)
+            except Exception as e:
+                print(f"⚠️  Reload failed, keeping previous config: {e}", file=sys.stderr)
+                return False
+            merged = self.exporter.merge_config(config, secrets)
+            version = self.snapshot.version + 1 if self.snapshot else 1
+            self.snapshot = Snapshot(merged, self.exporter.flatten_dict(merged), version)
+            self.stamps = stamps
+            print(f"✓ Loaded config version {version} ({len(self.snapshot.keys)} keys)", file=sys.stderr)
+            return True
+
+    def watch(self, interval, stop_event):
+        while not stop_event.wait(interval):
+            self.reload()
+
+    def handle(self, message):
+        snapshot = self.snapshot
+        op = message.get('op')
+        if op == 'get':
+            keys = message.get('keys', [])
+            values = snapshot.get(keys)
+            return {'values': values, 'missing': [key for key in keys if key not in values]}
+        if op == 'prefix':
+            return {'values': snapshot.prefix(message.get('prefix', ''))}
+        if op == 'subtree':
+            return {'value': snapshot.subtree(message.get('path', ''))}
+        if op == 'reload':
+            self.reload(force=True)
+            snapshot = self.snapshot
+        if op in ('ping', 'reload'):
+            return {'version': snapshot.version, 'keys': len(snapshot.keys), 'loaded_at': snapshot.loaded_at}
+        raise ValueError(f"Unknown op '{op}'")
+
+
+class QueryHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.store.handle(json.loads(line))
+                response['ok'] = True
+            except (KeyError, ValueError, TypeError) as e:
+                response = {'ok': False, 'error': str(e.args[0] if e.args else e)}
+            self.wfile.write(json.dumps(response, default=str).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class ConfigServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, store):
+        self.store = store
+        socket_path = Path(socket_path)
+        socket_path.parent.mkdir(parents=True, exist_ok=True)
+        if socket_path.exists():
+            socket_path.unlink()
+        old_umask = os.umask(0o077)
+        try:
+            super().__init__(str(socket_path), QueryHandler)
+        finally:
+            os.umask(old_umask)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the merged lab config over a Unix domain socket.")
+    parser.add_argument('--config', default='lab-config.yml', help='Config YAML path')
+    parser.add_argument('--secrets', default='secrets.yml.encrypted', help='Encrypted secrets file path')
+    parser.add_argument('--key', default=str(Path.home() / '.purestorage/se-lab-melau.key'), help='Key file path')
+    parser.add_argument('--socket', default=str(default_socket_path()), help='Socket path (default: %(default)s)')
+    parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between source change checks')
+    args = parser.parse_args()
+
+    # Resolve once so reloads keep working if the working directory changes
+    config_path = Path(args.config).resolve()
+    secrets_path = Path(args.secrets).resolve()
+    key_path = Path(args.key)
+    if not key_path.is_absolute():
+        key_path = EXPORT_SCRIPT.parent / key_path
+    store = ConfigStore(load_export_config(), config_path, secrets_path, key_path)
+    if not store.reload(force=True):
+        sys.exit(1)
+
+    server = ConfigServer(args.socket, store)
+    stop_event = threading.Event()
+    watcher = threading.Thread(target=store.watch, args=(args.poll_interval, stop_event), daemon=True)
+    watcher.start()
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    print(f"✓ Serving lab config on {args.socket}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        server.server_close()
+        Path(args.socket).unlink(missing_ok=True)
+
+
+if __name__ == '__main__':
+    main()
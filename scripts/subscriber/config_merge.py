@@ -0,0 +1,130 @@
+"""
+config_merge.py: Deep merge of configuration layers with structural sharing.
+
+A merged config is built from a chain of layers, e.g.
+
+    lab-config.yml -> site overlay -> environment overlay -> secrets
+
+Each layer is merged key by key into the result of the layers before it. Mappings
+are merged recursively. For any other value that both sides set, the layer's
+policy decides:
+    override  the layer wins (the default, and how secrets apply)
+    keep      the earlier value wins; the layer can only add keys
+    error     differing values raise MergeConflict, naming the key path
+Lists are replaced by default, or concatenated with lists='append'.
+
+Merging never copies what a layer does not touch. A mapping the layer leaves
+alone is shared by reference with the earlier result, so the cost of a merge
+grows with the size of the layer, not of the base config. Merged results must
+therefore be treated as read-only. LayerCache also remembers the result of each
+chain prefix, so variants that share a base and a site overlay merge them once;
+export-config.py keeps one per process for --watch and for batch_export workers.
+"""
+import collections
+
+POLICIES = ['override', 'keep', 'error']
+LIST_MODES = ['replace', 'append']
+
+
+class MergeConflict(ValueError):
+    pass
+
+
+def _describe(value):
+    if isinstance(value, dict):
+        return 'a mapping'
+    if isinstance(value, list):
+        return 'a list'
+    return repr(value)
+
+
+def deep_merge(base, layer, policy='override', lists='replace', path=''):
+    """base with layer merged into it; untouched subtrees of base (and all of layer) are shared."""
+    if isinstance(base, dict) and isinstance(layer, dict):
+        merged = None
+        for key, value in layer.items():
+            if key in base:
+                child = f"{path}.{key}" if path else str(key)
+                value = deep_merge(base[key], value, policy, lists, child)
+                if value is base[key]:
+                    continue
+            if merged is None:
+                merged = dict(base)  # copy this level only; children are shared
+            merged[key] = value
+        return base if merged is None else merged
+    if isinstance(base, list) and isinstance(layer, list) and lists == 'append':
+        return base + layer if layer else base
+    if type(base) is type(layer) and base == layer:
+        return base
+    if policy == 'keep':
+        return base
+    if policy == 'error':
+        raise MergeConflict(f"{path or '<root>'}: {_describe(layer)} would replace {_describe(base)}")
+    return layer
+
+
+class Layer:
+    """One step of a merge chain: data plus how it is merged into the layers before it."""
+
+    def __init__(self, name, data, policy='override', lists='replace'):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown merge policy '{policy}'; choose from {', '.join(POLICIES)}")
+        if lists not in LIST_MODES:
+            raise ValueError(f"Unknown list merge '{lists}'; choose from {', '.join(LIST_MODES)}")
+        self.name = name
+        self.data = data if data is not None else {}
+        self.policy = policy
+        self.lists = lists
+
+    @property
+    def key(self):
+        return (self.name, id(self.data), self.policy, self.lists)
+
+
+def merge_layers(layers):
+    """Merge a chain of Layers, first to last."""
+    merged = {}
+    for layer in layers:
+        try:
+            merged = deep_merge(merged, layer.data, layer.policy, layer.lists)
+        except MergeConflict as e:
+            raise MergeConflict(f"{layer.name}: {e}") from None
+    return merged
+
+
+class LayerCache:
+    """Merged results of chain prefixes, shared between chains that start with the same layers.
+
+    With max_entries, the least recently used prefixes are dropped beyond that many,
+    so a long-running process that keeps loading new data does not grow without bound.
+    """
+
+    def __init__(self, max_entries=None):
+        # tuple of layer keys -> (layers, merged); layers pin the ids in the keys
+        self._results = collections.OrderedDict()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def merge(self, layers):
+        merged, prefix = {}, ()
+        for i, layer in enumerate(layers):
+            prefix += (layer.key,)
+            cached = self._results.get(prefix)
+            if cached is not None:
+                self._results.move_to_end(prefix)
+                self.hits += 1
+                merged = cached[1]
+                continue
+            try:
+                merged = deep_merge(merged, layer.data, layer.policy, layer.lists)
+            except MergeConflict as e:
+                raise MergeConflict(f"{layer.name}: {e}") from None
+            self.misses += 1
+            self._results[prefix] = (tuple(layers[:i + 1]), merged)
+            if self.max_entries is not None and len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+        return merged
+
+    def __len__(self):
+        return len(self._results)
@@ -0,0 +1,105 @@
+"""
+config_query.py: Query the resident config daemon (config_daemon.py) over its Unix socket.
+
+Fetches any number of keys in one round trip, so shell scripts can replace a
+grep|cut pipeline per value with a single call:
+
+    eval "$(python3 config_query.py --format shell get VCENTER_USERNAME INFRASTRUCTURE_VCENTER_SERVER)"
+
+Only the standard library is used, so any python3 can run it.
+"""
+import argparse
+import json
+import os
+import shlex
+import socket
+import sys
+from pathlib import Path
+
+
+def default_socket_path():
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return Path(runtime_dir) / 'se-lab-melau-config.sock'
+    return Path.home() / '.purestorage' / 'se-lab-melau-config.sock'
+
+
+def request(message, socket_path=None, timeout=5.0):
+    """Send one request to the daemon and return its decoded response."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(str(socket_path or default_socket_path()))
+        sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as reader:
+            line = reader.readline()
+    if not line:
+        raise ConnectionError('Config daemon closed the connection without replying')
+    response = json.loads(line)
+    if not response.get('ok'):
+        raise RuntimeError(response.get('error', 'Config daemon request failed'))
+    return response
+
+
+def format_value(value):
+    if isinstance(value, list):
+        return ','.join(str(item) for item in value)
+    return str(value)
+
+
+def print_values(values, output_format):
+    if output_format == 'json':
+        print(json.dumps(values, indent=2))
+        return
+    for key, value in values.items():
+        if output_format == 'shell':
+            print(f"{key.upper()}={shlex.quote(format_value(value))}")
+        elif output_format == 'env':
+            print(f"{key.upper()}={format_value(value)}")
+        else:
+            print(format_value(value))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the resident lab config daemon.")
+    parser.add_argument('--socket', help='Daemon socket path (default: %(default)s)', default=str(default_socket_path()))
+    parser.add_argument('--format', choices=['value', 'env', 'shell', 'json'], default='value',
+                        help='value: one value per line; env: KEY=value; shell: KEY=quoted value for eval; json')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    get_parser = subparsers.add_parser('get', help='Look up one or more flattened keys')
+    get_parser.add_argument('keys', nargs='+')
+    prefix_parser = subparsers.add_parser('prefix', help='All keys starting with a prefix')
+    prefix_parser.add_argument('prefix')
+    subtree_parser = subparsers.add_parser('subtree', help='A nested subtree by dotted path, as JSON')
+    subtree_parser.add_argument('path')
+    subparsers.add_parser('ping', help='Show daemon status')
+    subparsers.add_parser('reload', help='Ask the daemon to reload its sources now')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'get':
+            response = request({'op': 'get', 'keys': args.keys}, args.socket)
+            print_values(response['values'], args.format)
+            if response['missing']:
+                print(f"Unknown keys: {', '.join(response['missing'])}", file=sys.stderr)
+                return 1
+        elif args.command == 'prefix':
+            response = request({'op': 'prefix', 'prefix': args.prefix}, args.socket)
+            # Bare values are ambiguous for a key range, so show KEY=value by default
+            print_values(response['values'], 'env' if args.format == 'value' else args.format)
+        elif args.command == 'subtree':
+            response = request({'op': 'subtree', 'path': args.path}, args.socket)
+            print(json.dumps(response['value'], indent=2))
+        else:
+            response = request({'op': args.command}, args.socket)
+            print(json.dumps({k: v for k, v in response.items() if k != 'ok'}, indent=2))
+    except (OSError, ConnectionError) as e:
+        print(f"Cannot reach config daemon at {args.socket}: {e}", file=sys.stderr)
+        return 2
+    except RuntimeError as e:
+        print(f"Config daemon error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
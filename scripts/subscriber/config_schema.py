@@ -0,0 +1,462 @@
+"""
+config_schema.py: Schema validation of lab-config.yml and the decrypted secrets.
+
+The schema (lab-config.schema.yml next to the config, a subset of JSON Schema)
+is compiled into Python source, one function per schema node, and the compiled
+code object is marshalled to ~/.cache/se-lab-melau-config/schema/, keyed by the
+SHA-256 of the schema file and this compiler. Later runs load the cached code
+instead of interpreting the schema. Every problem is reported in a single pass,
+with its key path.
+
+Config validation is incremental. After a run, a snapshot records the config
+file's size, mtime and hash, plus a digest of each top-level subtree that passed
+(and its warnings). On the next run:
+  - an unchanged file is not even read;
+  - an edited file is re-checked only in the subtrees whose digest changed;
+  - top-level structure (required and unknown sections) is always checked.
+Duplicate keys (which YAML silently collapses to the last one) are found in the
+composed node tree of a changed file. A config with overlays merged in (export
+--overlay) has no file of its own and is checked in full. Secrets are validated in
+memory on every run; nothing derived from them is written to disk.
+
+    python3 config_schema.py lab-config.yml          # exit 1 on errors
+"""
+import argparse
+import datetime
+import hashlib
+import ipaddress
+import json
+import marshal
+import os
+import re
+import sys
+from pathlib import Path
+
+import yaml_loader
+
+SCHEMA_NAME = 'lab-config.schema.yml'
+COMPILER_VERSION = 1
+CACHE_DIR = yaml_loader.CACHE_DIR.parent / 'schema'
+
+# schema type -> (isinstance check in generated code, description in messages)
+TYPES = {
+    'object': ('dict', 'a mapping'),
+    'array': ('list', 'a list'),
+    'string': ('str', 'a string'),
+    'integer': ('int', 'an integer'),
+    'number': ('(int, float)', 'a number'),
+    'boolean': ('bool', 'true or false'),
+    'null': ('type(None)', 'null'),
+}
+DESCRIPTIONS = [(bool, 'true or false'), (dict, 'a mapping'), (list, 'a list'), (str, 'a string'),
+                (int, 'an integer'), (float, 'a number'), (type(None), 'null')]
+HOSTNAME = re.compile(r'^(?=.{1,253}$)[A-Za-z0-9]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?(\.[A-Za-z0-9]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?)*$')
+VERSION = re.compile(r'^\d+\.\d+\.\d+([-+][\w.-]+)?$')
+URL = re.compile(r'^https?://[^\s/]+(/\S*)?$')
+
+
+def _is_ipv4(value):
+    try:
+        ipaddress.IPv4Address(value)
+        return True
+    except ValueError:
+        return False
+
+
+def _is_cidr(value):
+    try:
+        ipaddress.ip_network(value)
+        return '/' in value
+    except ValueError:
+        return False
+
+
+def _is_date(value):
+    if isinstance(value, datetime.date):
+        return True
+    try:
+        datetime.date.fromisoformat(value)
+        return True
+    except ValueError:
+        return False
+
+
+FORMATS = {
+    'ipv4': _is_ipv4,
+    'cidr': _is_cidr,
+    'hostname': lambda value: bool(HOSTNAME.match(value)),
+    'date': _is_date,
+    'url': lambda value: bool(URL.match(value)),
+    'version': lambda value: bool(VERSION.match(value)),
+}
+
+
+def type_name(value):
+    for cls, description in DESCRIPTIONS:
+        if isinstance(value, cls):
+            return description
+    return type(value).__name__
+
+
+class SchemaError(ValueError):
+    pass
+
+
+class _Compiler:
+    """Turns schema nodes into `def _vN(value, path, issues, only=None)` functions."""
+
+    def __init__(self, schema):
+        self.defs = schema.get('$defs', {})
+        self.functions = []   # source of each generated function
+        self.constants = []   # source of module-level constants
+        self.refs = {}        # '$defs' name -> function name (allows recursive schemas)
+
+    def constant(self, source):
+        name = f"_c{len(self.constants)}"
+        self.constants.append(f"{name} = {source}")
+        return name
+
+    def function(self, node, where):
+        if not isinstance(node, dict):
+            raise SchemaError(f"{where}: schema must be a mapping, got {node!r}")
+        if '$ref' in node:
+            return self.ref(node['$ref'], where)
+        name = f"_v{len(self.functions)}"
+        self.functions.append(None)  # reserve the slot; children are numbered after it
+        body = self.body(node, where)
+        self.functions[int(name[2:])] = f"def {name}(value, path, issues, only=None):\n" + ''.join(
+            f"    {line}\n" for line in body or ['pass'])
+        return name
+
+    def ref(self, ref, where):
+        prefix = '#/$defs/'
+        if not isinstance(ref, str) or not ref.startswith(prefix) or ref[len(prefix):] not in self.defs:
+            raise SchemaError(f"{where}: unknown $ref {ref!r}")
+        target = ref[len(prefix):]
+        if target not in self.refs:
+            self.refs[target] = f"_v{len(self.functions)}"
+            self.function(self.defs[target], f"$defs.{target}")
+        return self.refs[target]
+
+    def body(self, node, where):
+        lines = []
+        if 'deprecated' in node:
+            lines.append(f"issues.append(('warning', path, {str(node['deprecated'])!r}))")
+        types = node.get('type')
+        if types is not None:
+            types = [types] if isinstance(types, str) else list(types)
+            unknown = [name for name in types if name not in TYPES]
+            if unknown:
+                raise SchemaError(f"{where}: unknown type(s) {unknown}")
+            check = ' or '.join(f"isinstance(value, {TYPES[name][0]})" for name in types)
+            if {'integer', 'number'} & set(types) and 'boolean' not in types:
+                # bool is a subclass of int, but `true` is not a valid port number
+                check = f"({check}) and not isinstance(value, bool)"
+            expected = 'expected ' + ' or '.join(TYPES[name][1] for name in types) + ', got '
+            lines += [f"if not ({check}):",
+                      f"    issues.append(('error', path, {expected!r} + _type_name(value)))",
+                      "    return"]
+        if 'enum' in node:
+            allowed = self.constant(repr(frozenset(node['enum'])))
+            listed = ' is not one of: ' + ', '.join(str(item) for item in node['enum'])
+            lines += [f"if not isinstance(value, (list, dict)) and value not in {allowed}:",
+                      f"    issues.append(('error', path, repr(value) + {listed!r}))"]
+        strings = []
+        if 'pattern' in node:
+            pattern = self.constant(f"re.compile({str(node['pattern'])!r})")
+            strings += [f"if not {pattern}.search(value):",
+                        f"    issues.append(('error', path, repr(value) + ' does not match ' + {pattern}.pattern))"]
+        if 'format' in node:
+            if node['format'] not in FORMATS:
+                raise SchemaError(f"{where}: unknown format {node['format']!r}")
+            message = f" is not a valid {node['format']}"
+            strings += [f"if not _formats[{node['format']!r}](value):",
+                        f"    issues.append(('error', path, repr(value) + {message!r}))"]
+        if 'minLength' in node:
+            message = f"must be at least {int(node['minLength'])} character(s)"
+            strings += [f"if len(value) < {int(node['minLength'])}:",
+                        f"    issues.append(('error', path, {message!r}))"]
+        if strings:
+            lines.append("if isinstance(value, str):")
+            lines += [f"    {line}" for line in strings]
+        for keyword, op, message in (('minimum', '<', ' is below the minimum '), ('maximum', '>', ' is above the maximum ')):
+            if keyword in node:
+                limit = node[keyword]
+                if not isinstance(limit, (int, float)) or isinstance(limit, bool):
+                    raise SchemaError(f"{where}: {keyword} must be a number")
+                lines += [f"if isinstance(value, (int, float)) and not isinstance(value, bool) and value {op} {limit!r}:",
+                          f"    issues.append(('error', path, str(value) + {message + str(limit)!r}))"]
+        if 'items' in node:
+            items = self.function(node['items'], f"{where}[]")
+            lines += ["if isinstance(value, list):",
+                      "    for i, item in enumerate(value):",
+                      f"        {items}(item, f'{{path}}[{{i}}]', issues)"]
+        if any(key in node for key in ('properties', 'required', 'additionalProperties', 'patternProperties')):
+            lines += self.object_body(node, where)
+        if 'anyOf' in node:
+            branches = [self.function(branch, f"{where}.anyOf[{i}]") for i, branch in enumerate(node['anyOf'])]
+            options = self.constant(f"({', '.join(branches)},)")
+            lines += ["best = None",
+                      f"for check in {options}:",
+                      "    trial = []",
+                      "    check(value, path, trial)",
+                      "    if not any(issue[0] == 'error' for issue in trial):",
+                      "        issues.extend(trial)",
+                      "        break",
+                      "    if best is None or len(trial) < len(best):",
+                      "        best = trial",
+                      "else:",
+                      "    issues.extend(best)"]
+        return lines
+
+    def object_body(self, node, where):
+        lines = [] if node.get('type') == 'object' else ["if not isinstance(value, dict):", "    return"]
+        required = node.get('required', [])
+        if required:
+            lines += [f"for key in {tuple(required)!r}:",
+                      "    if key not in value:",
+                      "        issues.append(('error', path, f\"missing required key '{key}'\"))"]
+        properties = {key: self.function(child, f"{where}.{key}")
+                      for key, child in (node.get('properties') or {}).items()}
+        dispatch = self.constant('{' + ', '.join(f"{key!r}: {fn}" for key, fn in properties.items()) + '}')
+        patterns = [(self.constant(f"re.compile({str(pattern)!r})"), self.function(child, f"{where}.<{pattern}>"))
+                    for pattern, child in (node.get('patternProperties') or {}).items()]
+        additional = node.get('additionalProperties', True)
+        lines += ["for key, item in value.items():",
+                  "    if only is not None and key not in only:",
+                  "        continue",
+                  "    child = f'{path}.{key}' if path else str(key)",
+                  f"    check = {dispatch}.get(key)",
+                  "    if check is not None:",
+                  "        check(item, child, issues)",
+                  "        continue"]
+        for pattern, fn in patterns:
+            lines += [f"    if {pattern}.search(str(key)):",
+                      f"        {fn}(item, child, issues)",
+                      "        continue"]
+        if additional is False:
+            lines.append("    issues.append(('error', child, 'unknown key'))")
+        elif isinstance(additional, dict):
+            lines.append(f"    {self.function(additional, f'{where}.*')}(item, child, issues)")
+        return lines
+
+    def module(self, roots):
+        entries = ', '.join(f"{name!r}: {fn}" for name, fn in roots.items())
+        # Constants come after the functions: dispatch tables refer to functions defined later
+        return '\n'.join(["import re", ""] + self.functions + self.constants + [f"ROOTS = {{{entries}}}", ""])
+
+
+def compile_schema(schema):
+    """Python source of a module whose ROOTS maps each top-level schema name to its validator."""
+    if not isinstance(schema, dict):
+        raise SchemaError("schema must be a mapping of names to schemas")
+    compiler = _Compiler(schema)
+    roots = {name: compiler.function(node, name) for name, node in schema.items() if name != '$defs'}
+    return compiler.module(roots)
+
+
+def _atomic_write(path, data):
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class Validators:
+    """Compiled validators of one schema file, loaded on first use.
+
+    .schema_hash identifies the schema file and compiler; .roots maps each top-level
+    schema name ('config', 'secrets') to its validator function.
+    """
+
+    def __init__(self, schema_path):
+        self.schema_path = Path(schema_path)
+        self._raw = self.schema_path.read_bytes()
+        digest = hashlib.sha256(self._raw)
+        digest.update(f"\0{COMPILER_VERSION}\0{sys.implementation.cache_tag}".encode())
+        self.schema_hash = digest.hexdigest()
+        self.from_cache = None
+        self._roots = None
+
+    @property
+    def roots(self):
+        if self._roots is None:
+            cache_path = CACHE_DIR / f"{self.schema_hash}.marshal"
+            try:
+                with open(cache_path, 'rb') as f:
+                    code = marshal.load(f)
+                self.from_cache = True
+            except (OSError, EOFError, ValueError, TypeError):
+                source = compile_schema(yaml_loader.safe_load(self._raw))
+                code = compile(source, f"<schema {self.schema_path}>", 'exec')
+                self.from_cache = False
+                try:
+                    _atomic_write(cache_path, marshal.dumps(code))
+                except OSError:
+                    pass
+            namespace = {'_formats': FORMATS, '_type_name': type_name}
+            exec(code, namespace)
+            self._roots = namespace['ROOTS']
+        return self._roots
+
+    def check(self, root, data, only=None):
+        """[(severity, path, message)] for data against schema `root` (only: top-level keys to descend into)."""
+        issues = []
+        if root in self.roots:
+            self.roots[root](data, '', issues, only)
+        return issues
+
+
+def duplicate_keys(text):
+    """[(severity, path, message)] for every mapping key that appears more than once."""
+    issues = []
+    root = yaml_loader.compose(text)
+    stack = [(root, '')] if root is not None else []
+    while stack:
+        node, path = stack.pop()
+        if node.id == 'sequence':
+            stack.extend((item, f"{path}[{i}]") for i, item in enumerate(node.value))
+        elif node.id == 'mapping':
+            seen = {}
+            for key, value in node.value:
+                child = f"{path}.{key.value}" if path else str(key.value)
+                line = key.start_mark.line + 1
+                if key.value in seen:
+                    issues.append(('error', child, f"duplicate key (lines {seen[key.value]} and {line}); "
+                                                   "YAML keeps only the last one"))
+                seen.setdefault(key.value, line)
+                stack.append((value, child))
+    return issues
+
+
+def subtree_digests(data):
+    if not isinstance(data, dict):
+        return {}
+    return {str(key): hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+            for key, value in data.items()}
+
+
+def _snapshot_path(config_path):
+    return CACHE_DIR / f"validated-{hashlib.sha256(str(config_path).encode()).hexdigest()}.json"
+
+
+def _read_snapshot(config_path, schema_hash):
+    try:
+        with open(_snapshot_path(config_path), 'r') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return snapshot if snapshot.get('schema') == schema_hash else None
+
+
+def default_schema_path(config_path):
+    return Path(config_path).resolve().parent / SCHEMA_NAME
+
+
+def check_config(config_path, config=None, schema_path=None, use_snapshot=True):
+    """Issues of the config file, re-checking only what changed since the last validated snapshot."""
+    config_path = Path(config_path).resolve()
+    validators = Validators(schema_path or default_schema_path(config_path))
+    st = config_path.stat()
+    stamp = [st.st_size, st.st_mtime_ns]
+    snapshot = _read_snapshot(config_path, validators.schema_hash) if use_snapshot else None
+    if snapshot and snapshot.get('stamp') == stamp:
+        return [tuple(issue) for issue in snapshot.get('warnings', [])]
+
+    raw = config_path.read_bytes()
+    file_hash = hashlib.sha256(raw).hexdigest()
+    if snapshot and snapshot.get('sha256') == file_hash:
+        _write_snapshot(config_path, dict(snapshot, stamp=stamp))
+        return [tuple(issue) for issue in snapshot.get('warnings', [])]
+
+    if config is None:
+        config = yaml_loader.load_cached(config_path)
+    digests = subtree_digests(config)
+    previous = (snapshot or {}).get('subtrees', {})
+    changed = {key for key, digest in digests.items() if previous.get(key, {}).get('digest') != digest}
+    # Descend only into changed subtrees; top-level required/unknown checks always run
+    issues = validators.check('config', config, only=changed)
+    issues += duplicate_keys(raw)
+    subtrees = {}
+    for key, digest in digests.items():
+        mine = [issue for issue in issues if issue[1] == key or issue[1].startswith((f"{key}.", f"{key}["))]
+        if key not in changed:
+            issues += [tuple(issue) for issue in previous[key]['warnings']]
+            subtrees[key] = previous[key]
+        elif not any(severity == 'error' for severity, _, _ in mine):
+            subtrees[key] = {'digest': digest, 'warnings': mine}
+    clean = not any(severity == 'error' for severity, _, _ in issues)
+    _write_snapshot(config_path, {
+        'schema': validators.schema_hash,
+        'stamp': stamp if clean else None,
+        'sha256': file_hash if clean else None,
+        'subtrees': subtrees,
+        'warnings': [issue for issue in issues if issue[0] == 'warning'],
+    })
+    return issues
+
+
+def _write_snapshot(config_path, snapshot):
+    try:
+        _atomic_write(_snapshot_path(config_path), json.dumps(snapshot).encode())
+    except OSError:
+        pass
+
+
+def check_secrets(secrets, schema_path):
+    """Issues of the decrypted secrets (validated in memory, never recorded on disk)."""
+    return Validators(schema_path).check('secrets', secrets)
+
+
+def check_overlaid(config_path, overlaid, schema_path=None):
+    """Issues of the config with overlays merged in; checked in full, as no file holds it to snapshot."""
+    config_path = Path(config_path).resolve()
+    validators = Validators(schema_path or default_schema_path(config_path))
+    return validators.check('config', overlaid) + duplicate_keys(config_path.read_bytes())
+
+
+def validate(config_path, config=None, secrets=None, schema_path=None, overlaid=None):
+    """(severity, message) pairs for the config, or the overlaid config if given, and the secrets if given."""
+    schema_path = schema_path or default_schema_path(config_path)
+    if not Path(schema_path).exists():
+        return [('error', f"No schema at {schema_path}")]
+    if overlaid is None:
+        label, config_issues = Path(config_path).name, check_config(config_path, config, schema_path)
+    else:
+        label, config_issues = f"{Path(config_path).name} + overlays", check_overlaid(config_path, overlaid, schema_path)
+    issues = [(severity, f"{label}: {path or '<root>'}: {message}") for severity, path, message in config_issues]
+    if secrets is not None:
+        issues += [(severity, f"secrets: {path or '<root>'}: {message}")
+                   for severity, path, message in check_secrets(secrets, schema_path)]
+    return issues
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate lab-config.yml against its schema.")
+    parser.add_argument('config', nargs='?', default='lab-config.yml', help='Config YAML path')
+    parser.add_argument('--schema', help=f"Schema path (default: {SCHEMA_NAME} next to the config)")
+    parser.add_argument('--no-snapshot', action='store_true', help='Re-check everything, ignoring the last validated snapshot')
+    parser.add_argument('--show-source', action='store_true', help='Print the Python code generated from the schema')
+    args = parser.parse_args()
+
+    schema_path = args.schema or default_schema_path(args.config)
+    if args.show_source:
+        print(compile_schema(yaml_loader.safe_load(Path(schema_path).read_bytes())))
+        return 0
+    try:
+        issues = check_config(args.config, schema_path=schema_path, use_snapshot=not args.no_snapshot)
+    except (OSError, SchemaError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+    for severity, path, message in issues:
+        print(f"{'❌' if severity == 'error' else '⚠️ '} {path or '<root>'}: {message}")
+    errors = sum(1 for severity, _, _ in issues if severity == 'error')
+    if not errors:
+        print(f"✅ {args.config} matches {Path(schema_path).name}")
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+config_snapshot.py: Compact binary key/value snapshot of the flattened config.
+
+The 'snap' export type writes every flattened key (upper-cased, as in lab-config.env)
+and its value into one sorted file with a fixed-width offset index:
+
+    header  8s magic 'SLMSNAP1', uint32 entry count, uint32 reserved
+    index   count x (uint32 key offset, uint32 key length, uint32 value offset, uint32 value length)
+    data    UTF-8 keys and values
+
+All integers are little-endian and offsets are from the start of the file. Readers
+mmap the file and binary-search the index, so a lookup touches a few pages instead
+of parsing the whole export, and concurrent readers share the page cache.
+
+    python3 config_snapshot.py export/lab-config.snap VCENTER_USERNAME SERVICES_RDS_SERVER_IP
+    python3 config_snapshot.py export/lab-config.snap --prefix SERVICES_RDS_
+
+Only the standard library is used.
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b'SLMSNAP1'
+HEADER = struct.Struct('<8sII')
+ENTRY = struct.Struct('<IIII')
+
+
+def render_snapshot(pairs):
+    """Yield the snapshot file contents for (key, value) pairs."""
+    entries = {}
+    for key, value in pairs:
+        entries[str(key).upper().encode('utf-8')] = str(value).encode('utf-8')
+    keys = sorted(entries)
+    offset = HEADER.size + ENTRY.size * len(keys)
+    index = bytearray()
+    for key in keys:
+        value = entries[key]
+        index += ENTRY.pack(offset, len(key), offset + len(key), len(value))
+        offset += len(key) + len(value)
+    yield HEADER.pack(MAGIC, len(keys), 0)
+    yield bytes(index)
+    for key in keys:
+        yield key
+        yield entries[key]
+
+
+class SnapshotReader:
+    """Read-only mmap view of a snapshot file with O(log n) key lookups."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise ValueError(f"{path} is not a config snapshot")
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._check(path)
+        except ValueError:
+            self._mm.close()
+            raise
+
+    def _check(self, path):
+        """Reject a file that is not a snapshot, or whose index or data does not fit it."""
+        magic, self._count, _ = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a config snapshot")
+        size = len(self._mm)
+        data_start = HEADER.size + self._count * ENTRY.size
+        end = data_start
+        if self._count and data_start <= size:
+            # Entries are written back to back, so the last value ends exactly at the end of the file
+            _, _, value_offset, value_len = self._entry(self._count - 1)
+            end = value_offset + value_len
+        if data_start > size or end != size:
+            raise ValueError(f"{path} is truncated or corrupt ({size} bytes, index of {self._count} entries)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        self._mm.close()
+
+    def _entry(self, i):
+        return ENTRY.unpack_from(self._mm, HEADER.size + i * ENTRY.size)
+
+    def _key(self, i):
+        key_offset, key_len, _, _ = self._entry(i)
+        return self._mm[key_offset:key_offset + key_len]
+
+    def _value(self, i):
+        _, _, value_offset, value_len = self._entry(i)
+        return self._mm[value_offset:value_offset + value_len].decode('utf-8')
+
+    def _lower_bound(self, key):
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def get(self, key, default=None):
+        key = key.upper().encode('utf-8')
+        i = self._lower_bound(key)
+        if i < self._count and self._key(i) == key:
+            return self._value(i)
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def prefix(self, prefix):
+        """Yield (key, value) pairs whose key starts with prefix, in key order."""
+        prefix = prefix.upper().encode('utf-8')
+        for i in range(self._lower_bound(prefix), self._count):
+            key = self._key(i)
+            if not key.startswith(prefix):
+                break
+            yield key.decode('utf-8'), self._value(i)
+
+    def items(self):
+        return self.prefix('')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Look up values in a binary config snapshot.")
+    parser.add_argument('snapshot', help='Snapshot file, e.g. export/lab-config.snap')
+    parser.add_argument('keys', nargs='*', help='Keys to print, one value per line')
+    parser.add_argument('--prefix', help='Print KEY=value for every key with this prefix')
+    args = parser.parse_args()
+
+    missing = []
+    try:
+        reader = SnapshotReader(args.snapshot)
+    except (OSError, ValueError) as e:
+        print(f"Cannot read snapshot: {e}", file=sys.stderr)
+        return 2
+    with reader:
+        for key in args.keys:
+            value = reader.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                print(value)
+        if args.prefix is not None:
+            for key, value in reader.prefix(args.prefix):
+                print(f"{key}={value}")
+    if missing:
+        print(f"Unknown keys: {', '.join(missing)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
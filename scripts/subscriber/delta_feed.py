@@ -0,0 +1,227 @@
+"""
+delta_feed.py: Versioned feed of export snapshots and the deltas between them.
+
+With --feed DIR, export-config.py publishes the flattened config (the same keys
+and values as lab-config.json) to a feed directory after each export. Whenever the
+content changed, the version goes up by one and a delta from the previous version
+is stored, so consumers that remember a version can fetch only what changed:
+
+    DIR/feed.json              feed id, current version, oldest version deltas reach back to
+    DIR/snapshot.json          the full flattened config at the current version
+    DIR/deltas/00000042.json   the operations that turn version 41 into version 42
+
+Deltas are lists of JSON Patch operations on the flattened keys, e.g.
+{"op": "replace", "path": "/vcenter_server", "value": "vcsa2"}; keys are JSON
+Pointer escaped ('~' -> '~0', '/' -> '~1'). since(N) squashes the deltas after N
+into one patch with at most one operation per key. A consumer that is too far
+behind (older deltas are pruned), ahead of the feed, or following a feed that was
+recreated (different feed id) gets a reset with the full snapshot instead.
+
+Files are written atomically and read-only for the owner, like the exports, since
+they hold decrypted secrets. Only the standard library is used, so update.py can
+check the feed from any python3.
+
+    python3 delta_feed.py export/feed status
+    python3 delta_feed.py export/feed since 41 [--feed-id ID]
+    python3 delta_feed.py export/feed snapshot
+"""
+import argparse
+import hashlib
+import json
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import export_io
+
+INDEX_NAME = 'feed.json'
+SNAPSHOT_NAME = 'snapshot.json'
+DELTA_DIR = 'deltas'
+DEFAULT_KEEP = 500
+
+
+def pointer(key):
+    """JSON Pointer for a flattened key."""
+    return '/' + str(key).replace('~', '~0').replace('/', '~1')
+
+
+def key_for(path):
+    if not path.startswith('/'):
+        raise ValueError(f"Invalid JSON Pointer {path!r}")
+    return path[1:].replace('~1', '/').replace('~0', '~')
+
+
+def digest(flat):
+    canonical = json.dumps(flat, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def diff_ops(old, new):
+    """JSON Patch operations turning flat dict old into flat dict new, ordered by key."""
+    ops = []
+    for key in sorted(old.keys() | new.keys(), key=str):
+        if key not in new:
+            ops.append({'op': 'remove', 'path': pointer(key)})
+        elif key not in old:
+            ops.append({'op': 'add', 'path': pointer(key), 'value': new[key]})
+        elif old[key] != new[key]:
+            ops.append({'op': 'replace', 'path': pointer(key), 'value': new[key]})
+    return ops
+
+
+def apply_ops(flat, ops):
+    """A copy of flat dict with the operations applied; raises ValueError if they do not fit."""
+    result = dict(flat)
+    for op in ops:
+        key = key_for(op['path'])
+        if op['op'] == 'remove' or op['op'] == 'replace':
+            if key not in result:
+                raise ValueError(f"Cannot {op['op']} {op['path']}: not present")
+        if op['op'] == 'remove':
+            del result[key]
+        elif op['op'] in ('add', 'replace'):
+            result[key] = op['value']
+        else:
+            raise ValueError(f"Unsupported operation {op['op']!r}")
+    return result
+
+
+def squash(deltas):
+    """One patch with the combined effect of consecutive deltas, at most one operation per key."""
+    changes = {}  # path -> (present before the first delta, last operation)
+    for ops in deltas:
+        for op in ops:
+            existed = changes[op['path']][0] if op['path'] in changes else op['op'] != 'add'
+            changes[op['path']] = (existed, op)
+    squashed = []
+    for path in sorted(changes):
+        existed, op = changes[path]
+        if op['op'] == 'remove':
+            if existed:
+                squashed.append({'op': 'remove', 'path': path})
+        else:
+            squashed.append({'op': 'replace' if existed else 'add', 'path': path, 'value': op['value']})
+    return squashed
+
+
+class Feed:
+    """The feed in one directory; publish() writes it, since() and snapshot() read it."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    @property
+    def index_path(self):
+        return self.directory / INDEX_NAME
+
+    def _read(self, path):
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def _write(self, path, data):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        export_io.atomic_write(path, [json.dumps(data, indent=1, default=str).encode()], mode=0o400)
+
+    def _delta_path(self, version):
+        return self.directory / DELTA_DIR / f"{version:08d}.json"
+
+    def index(self):
+        """The feed index, or None when there is no (readable) feed yet."""
+        try:
+            return self._read(self.index_path)
+        except (OSError, ValueError):
+            return None
+
+    def snapshot(self):
+        return self._read(self.directory / SNAPSHOT_NAME)
+
+    def is_fresh(self, inputs):
+        """True when the feed was last published from exactly these export inputs."""
+        index = self.index()
+        return index is not None and index.get('inputs') == inputs
+
+    def publish(self, flat, inputs=None, keep=DEFAULT_KEEP):
+        """Add a version if flat differs from the current snapshot; returns the new version or None.
+
+        Callers serialize publishing (export-config.py holds the export lock on the feed directory).
+        """
+        # Digest and diff what the snapshot will hold, so a date read back as a string is not a change
+        flat = json.loads(json.dumps(flat, default=str))
+        index = self.index()
+        new_digest = digest(flat)
+        if index is not None and index['digest'] == new_digest:
+            if index.get('inputs') != inputs:
+                self._write(self.index_path, {**index, 'inputs': inputs})
+            return None
+        if index is None:
+            index = {'feed_id': uuid.uuid4().hex, 'version': 0, 'oldest': 1}
+            ops = diff_ops({}, flat)
+        else:
+            ops = diff_ops(self.snapshot()['data'], flat)
+        version = index['version'] + 1
+        now = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        # Delta, then snapshot, then index: a reader that sees the new index finds everything it names
+        self._write(self._delta_path(version), {'feed_id': index['feed_id'], 'version': version,
+                                                'previous': version - 1, 'created': now, 'ops': ops})
+        self._write(self.directory / SNAPSHOT_NAME, {'feed_id': index['feed_id'], 'version': version,
+                                                     'digest': new_digest, 'data': flat})
+        oldest = max(index['oldest'], version - keep + 1)
+        self._write(self.index_path, {'feed_id': index['feed_id'], 'version': version, 'oldest': oldest,
+                                      'digest': new_digest, 'updated': now, 'inputs': inputs})
+        for pruned in range(index['oldest'], oldest):
+            self._delta_path(pruned).unlink(missing_ok=True)
+        return version
+
+    def _reset(self, since):
+        snapshot = self.snapshot()
+        return {'feed_id': snapshot['feed_id'], 'from': since, 'to': snapshot['version'],
+                'reset': True, 'snapshot': snapshot['data']}
+
+    def since(self, version, feed_id=None):
+        """Changes from `version` to the current version, or a reset with the full snapshot."""
+        index = self.index()
+        if index is None:
+            raise FileNotFoundError(f"No feed in {self.directory}")
+        if (feed_id and feed_id != index['feed_id']) or not index['oldest'] - 1 <= version <= index['version']:
+            return self._reset(version)
+        deltas = []
+        for delta_version in range(version + 1, index['version'] + 1):
+            try:
+                deltas.append(self._read(self._delta_path(delta_version))['ops'])
+            except (OSError, ValueError):
+                # Pruned by a concurrent publish since the index was read
+                return self._reset(version)
+        return {'feed_id': index['feed_id'], 'from': version, 'to': index['version'], 'ops': squash(deltas)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read a versioned export feed written by export-config.py --feed.")
+    parser.add_argument('feed', help='Feed directory')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('status', help='Current version, oldest version with deltas, feed id')
+    since = commands.add_parser('since', help='JSON Patch of the changes after a version')
+    since.add_argument('version', type=int)
+    since.add_argument('--feed-id', help='Feed id the version belongs to; a different feed gives a reset')
+    commands.add_parser('snapshot', help='The full flattened config at the current version')
+    args = parser.parse_args()
+
+    feed = Feed(args.feed)
+    try:
+        if args.command == 'status':
+            index = feed.index()
+            if index is None:
+                raise FileNotFoundError(f"No feed in {args.feed}")
+            print(f"Feed {index['feed_id']}: version {index['version']} (deltas from {index['oldest']}), "
+                  f"updated {index['updated']}")
+        elif args.command == 'since':
+            print(json.dumps(feed.since(args.version, args.feed_id), indent=2, default=str))
+        else:
+            print(json.dumps(feed.snapshot(), indent=2, default=str))
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,137 +1,558 @@
 """
-export-config.py: Decrypts secrets, merges with config, and exports to env/json/ps1 formats.
+export-config.py: Decrypts secrets, merges with config, and exports to env/json/ps1/snap formats.
+
+Several targets can be produced from a single load/decrypt/flatten, either by
+repeating --type/--output pairs or by listing them in a --manifest file.
+Targets whose inputs are unchanged since the last export are skipped (see export_cache.py).
+Files are replaced atomically, and concurrent exports into the same directory
+are serialized so only one of them does the work (see export_io.py).
+With --watch it keeps running and rewrites only the files whose content changed.
+With --validate, checks from VALIDATORS run on the merged config before anything
+is written; an export that fails them leaves the existing files alone.
+With --feed DIR, every export that changes the config also adds a version to a
+feed of snapshots and deltas (see delta_feed.py).
+An --output of '-', 'fd:N' or a named pipe ('fifo:PATH') is streamed instead of written
+to disk (see export_io.py): env and ps1 are then rendered as `export KEY='value'`
+and `$KEY = 'value'` lines, quoted so they are safe to eval/source/dot-source,
+and status messages go to stderr when the export goes to stdout.
 """
 import argparse
-import base64
+import collections
+import contextlib
+import json
 import os
+import re
+import shlex
 import sys
-import yaml
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.backends import default_backend
+
+# Sibling helper modules, also when this file is loaded by path from another directory
+SCRIPT_DIR = Path(__file__).resolve().parent
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+import config_merge
+import config_snapshot
+import delta_feed
+import export_cache
+import export_io
+import secrets_store
+import stage_profile
+import yaml_loader
+from stage_profile import profiler
 
 def load_key(key_path):
     key_path = Path(key_path)
     if not key_path.is_absolute():
         key_path = Path(__file__).parent / key_path
-    with open(key_path, 'r') as f:
-        key_b64 = f.read().strip()
-    return base64.b64decode(key_b64)
+    return secrets_store.load_key(key_path)
 
-def decrypt_secrets(enc_path, key_path):
+def decrypt_secrets(enc_path, key_path, only=None):
     enc_path = Path(enc_path)
     if not enc_path.is_absolute():
         # For relative paths, resolve from the working directory where make was called
         # This handles both standalone and submodule scenarios correctly
         enc_path = Path.cwd() / enc_path
-    with open(enc_path, 'rb') as f:
-        iv = f.read(16)
-        ciphertext = f.read()
-    key = load_key(key_path)
-    cipher = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend())
-    decryptor = cipher.decryptor()
-    padded_plaintext = decryptor.update(ciphertext) + decryptor.finalize()
-    # Remove PKCS7 padding
-    padding_length = padded_plaintext[-1]
-    plaintext = padded_plaintext[:-padding_length]
-    return yaml.safe_load(plaintext.decode('utf-8'))
-
-def load_config(config_path):
+    key_path = Path(key_path)
+    if not key_path.is_absolute():
+        key_path = Path(__file__).parent / key_path
+    # Decrypted and parsed at most once per process for the same ciphertext and key;
+    # with `only`, just those top-level subtrees are decrypted
+    return secrets_store.load_secrets(enc_path, key_path, only)
+
+# Parsed config/overlay files and merged overlay chains, reused within this process:
+# by --watch between changes and by batch_export workers between sites that share a
+# base config or site overlay, so each shared chain prefix is merged once
+_parsed = {}  # path -> ((size, mtime_ns), data)
+MERGE_CACHE = config_merge.LayerCache(max_entries=64)
+
+def load_config(config_path, use_cache=True):
     config_path = Path(config_path)
     if not config_path.is_absolute():
         # For relative paths, resolve from the working directory where make was called
         # This handles both standalone and submodule scenarios correctly
         config_path = Path.cwd() / config_path
-    with open(config_path, 'r') as f:
-        return yaml.safe_load(f)
-
-def flatten_dict(d, parent_key='', sep='_'):
-    items = []
-    for k, v in d.items():
-        new_key = f"{parent_key}{sep}{k}" if parent_key else k
-        if isinstance(v, dict):
-            items.extend(flatten_dict(v, new_key, sep=sep).items())
+    with profiler.stage('yaml parse config'):
+        if use_cache:
+            st = config_path.stat()
+            stamp = (st.st_size, st.st_mtime_ns)
+            parsed = _parsed.get(config_path)
+            if parsed and parsed[0] == stamp:
+                # Same object as last time, so merged chains built on it are found in MERGE_CACHE
+                return parsed[1]
+            data = yaml_loader.load_cached(config_path)
+            _parsed[config_path] = (stamp, data)
+            return data
+        with open(config_path, 'r') as f:
+            return yaml_loader.safe_load(f)
+
+# How list values are flattened:
+#   native - keep the list as a value (JSON arrays)
+#   join   - comma-separated string: ALLOWED_GROUPS=PureSEs,PureGuests
+#   index  - one key per item: ALLOWED_GROUPS_0=PureSEs, ALLOWED_GROUPS_1=PureGuests
+#   json   - JSON-encoded string: ALLOWED_GROUPS=["PureSEs", "PureGuests"]
+LIST_FORMATS = ['native', 'join', 'index', 'json']
+DEFAULT_LIST_FORMATS = {
+    'env': 'join',
+    'json': 'native',
+    'ps1': 'join',
+    'snap': 'join',
+}
+
+def _join_item(item):
+    return json.dumps(item) if isinstance(item, (dict, list)) else str(item)
+
+def iter_flatten(d, parent_key='', sep='_', list_format='native'):
+    """Yield (key, value) pairs depth-first, without building intermediate dicts.
+
+    Uses an explicit stack of item iterators, so cost is linear in the number of
+    values regardless of nesting depth.
+    """
+    stack = [(parent_key, iter(d.items()))]
+    while stack:
+        prefix, items = stack[-1]
+        for k, v in items:
+            key = f"{prefix}{sep}{k}" if prefix else k
+            if isinstance(v, dict):
+                stack.append((key, iter(v.items())))
+                break
+            if isinstance(v, list) and list_format != 'native':
+                if list_format == 'index':
+                    stack.append((key, enumerate(v)))
+                    break
+                if list_format == 'join':
+                    yield key, ','.join(_join_item(item) for item in v)
+                else:
+                    yield key, json.dumps(v)
+            else:
+                yield key, v
         else:
-            items.append((new_key, v))
-    return dict(items)
+            stack.pop()
 
-def export_env(data, output):
+def flatten_dict(d, parent_key='', sep='_', list_format='native'):
+    return dict(iter_flatten(d, parent_key, sep=sep, list_format=list_format))
+
+def iter_pairs(data):
+    """Writers accept either a flattened dict or an iterable of (key, value) pairs."""
+    return data.items() if isinstance(data, dict) else data
+
+def render_env(data):
+    for key, value in iter_pairs(data):
+        yield f"{key.upper()}={value}\n"
+
+def render_json(data):
+    yield from json.JSONEncoder(indent=2).iterencode(dict(iter_pairs(data)))
+
+def render_ps1(data):
+    for key, value in iter_pairs(data):
+        yield f"${key.upper()} = \"{value}\"\n"
+
+def variable_name(key):
+    """Upper-cased key as a valid shell/PowerShell variable name."""
+    name = re.sub(r'[^A-Z0-9_]', '_', str(key).upper())
+    return name if not name[:1].isdigit() else f"_{name}"
+
+def render_env_export(data):
+    """Shell lines safe to eval or source: export KEY='value' (values single-quoted as needed)."""
+    for key, value in iter_pairs(data):
+        yield f"export {variable_name(key)}={shlex.quote(str(value))}\n"
+
+# PowerShell ends a single-quoted string at any of these, and reads each doubled as one literal quote
+PS1_SINGLE_QUOTES = str.maketrans({quote: quote * 2 for quote in "'\u2018\u2019\u201a\u201b"})
+
+def render_ps1_quoted(data):
+    """PowerShell lines with verbatim single-quoted values, so $ and ` in values are not expanded."""
+    for key, value in iter_pairs(data):
+        quoted = str(value).translate(PS1_SINGLE_QUOTES)
+        yield f"${variable_name(key)} = '{quoted}'\n"
+
+RENDERERS = {
+    'env': render_env,
+    'json': render_json,
+    'ps1': render_ps1,
+    'snap': config_snapshot.render_snapshot,
+}
+
+# Renderers for stream outputs, whose consumers eval/source the text directly;
+# snap is read with mmap and cannot be streamed
+STREAM_RENDERERS = {
+    'env': render_env_export,
+    'json': render_json,
+    'ps1': render_ps1_quoted,
+}
+
+def renderer(export_type, output):
+    return STREAM_RENDERERS[export_type] if export_io.is_stream(output) else RENDERERS[export_type]
+
+def resolve_output(output):
     output = Path(output)
     if not output.is_absolute():
         # For relative output paths, resolve from the working directory where make was called
         output = Path.cwd() / output
+    return output
+
+def as_bytes(chunk):
+    """Renderers yield text, except binary formats such as snap which yield bytes."""
+    return chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+
+def write_export(output, chunks):
+    if export_io.is_stream(output):
+        with profiler.stage(f"stream {output}"):
+            export_io.stream_write(output, (as_bytes(chunk) for chunk in chunks))
+        print(f"✓ Config streamed to {output}")
+        return
+    output = resolve_output(output)
     output.parent.mkdir(parents=True, exist_ok=True)
-    
-    # If file exists with restrictive permissions, temporarily make it writable
-    if output.exists():
-        os.chmod(output, 0o600)
-    
-    with open(output, 'w') as f:
-        for key, value in data.items():
-            f.write(f"{key.upper()}={value}\n")
-    # Set secure permissions (read-only for owner)
-    os.chmod(output, 0o400)
+    # Temp file + fsync + rename, read-only for owner (0400) before it is visible
+    with profiler.stage(f"write {output.name}"):
+        export_io.atomic_write(output, (as_bytes(chunk) for chunk in chunks), mode=0o400)
     print(f"✓ Config exported to {output}")
 
+def export_env(data, output):
+    write_export(output, renderer('env', output)(data))
+
 def export_json(data, output):
-    import json
-    output = Path(output)
-    if not output.is_absolute():
-        # For relative output paths, resolve from the working directory where make was called
-        output = Path.cwd() / output
-    output.parent.mkdir(parents=True, exist_ok=True)
-    
-    # If file exists with restrictive permissions, temporarily make it writable
-    if output.exists():
-        os.chmod(output, 0o600)
-    
-    with open(output, 'w') as f:
-        json.dump(data, f, indent=2)
-    # Set secure permissions (read-only for owner)
-    os.chmod(output, 0o400)
-    print(f"✓ Config exported to {output}")
+    write_export(output, render_json(data))
 
 def export_ps1(data, output):
-    output = Path(output)
-    if not output.is_absolute():
-        # For relative output paths, resolve from the working directory where make was called
-        output = Path.cwd() / output
-    output.parent.mkdir(parents=True, exist_ok=True)
-    
-    # If file exists with restrictive permissions, temporarily make it writable
-    if output.exists():
-        os.chmod(output, 0o600)
-    
-    with open(output, 'w') as f:
-        for key, value in data.items():
-            f.write(f"${key.upper()} = \"{value}\"\n")
-    # Set secure permissions (read-only for owner)
-    os.chmod(output, 0o400)
-    print(f"✓ Config exported to {output}")
+    write_export(output, renderer('ps1', output)(data))
+
+def export_snap(data, output):
+    write_export(output, config_snapshot.render_snapshot(iter_pairs(data)))
+
+EXPORTERS = {
+    'env': export_env,
+    'json': export_json,
+    'ps1': export_ps1,
+    'snap': export_snap,
+}
+
+def load_manifest(manifest_path):
+    """Read export targets from a YAML manifest as (type, output) pairs."""
+    manifest_path = Path(manifest_path)
+    if not manifest_path.is_absolute():
+        manifest_path = Path.cwd() / manifest_path
+    manifest = yaml_loader.load_cached(manifest_path) or {}
+    targets = manifest.get('targets', []) if isinstance(manifest, dict) else manifest
+    return [(target['type'], target['output']) for target in targets]
+
+def resolve_targets(types, outputs, manifest=None):
+    """Combine manifest targets with repeated --type/--output pairs."""
+    types = types or []
+    outputs = outputs or []
+    if len(types) != len(outputs):
+        raise ValueError(f"Got {len(types)} --type and {len(outputs)} --output arguments; they must be given in pairs")
+    targets = load_manifest(manifest) if manifest else []
+    targets.extend(zip(types, outputs))
+    if not targets:
+        raise ValueError("No export targets given; use --type/--output or --manifest")
+    # Streams are told apart from files once, here; later steps only look at the name
+    targets = [(export_type, export_io.stream_output(output) or output) for export_type, output in targets]
+    seen = {}  # what each output writes to -> the output that named it first
+    for export_type, output in targets:
+        if export_type not in EXPORTERS:
+            raise ValueError(f"Unknown export type '{export_type}' for {output}")
+        identity = export_io.stream_identity(output) or Path(output).resolve()
+        if identity in seen:
+            if seen[identity] == output:
+                raise ValueError(f"Output {output} is listed more than once")
+            raise ValueError(f"Output {output} writes to the same place as {seen[identity]}")
+        seen[identity] = output
+        if export_io.is_stream(output) and export_type not in STREAM_RENDERERS:
+            raise ValueError(f"Export type '{export_type}' cannot be streamed to {output}; write it to a file")
+    return targets
+
+def file_targets(targets):
+    """The targets that are files: only these are locked, cached and compared with what is on disk."""
+    return [(export_type, output) for export_type, output in targets if not export_io.is_stream(output)]
+
+def status_to_stderr(targets):
+    """Context in which status messages go to stderr, when a target streams to stdout."""
+    if any(output == export_io.STDOUT for _, output in targets):
+        return contextlib.redirect_stdout(sys.stderr)
+    return contextlib.nullcontext()
+
+def target_pairs(merged, export_type, list_format=None):
+    """Flattened (key, value) pairs for one target, produced lazily as the writer consumes them."""
+    return iter_flatten(merged, list_format=list_format or DEFAULT_LIST_FORMATS[export_type])
+
+def export_targets(merged, targets, list_format=None):
+    """Write every target from the same merged data, one writer thread per target."""
+    if profiler.enabled:
+        # Flatten up front so flatten and write times are reported separately
+        target_data = []
+        for export_type, output in targets:
+            with profiler.stage(f"flatten for {Path(output).name}"):
+                target_data.append(list(target_pairs(merged, export_type, list_format)))
+    else:
+        target_data = [target_pairs(merged, export_type, list_format) for export_type, _ in targets]
+    # Peak memory of the parallel writers is measured here, once, for all of them
+    with profiler.stage('write targets'), ThreadPoolExecutor(max_workers=len(targets)) as pool:
+        futures = [
+            pool.submit(EXPORTERS[export_type], data, output)
+            for (export_type, output), data in zip(targets, target_data)
+        ]
+        for future in futures:
+            future.result()
+
+def validate_addresses(loaded, args):
+    import address_index
+    return address_index.AddressIndex(loaded.merged).issues
+
+def validate_schema(loaded, args):
+    # Checks the config (with any overlays) and the secrets separately, before the secrets are merged in
+    import config_schema
+    config_path = export_cache.resolve_path(args.config)
+    return config_schema.validate(config_path, config=loaded.config, secrets=loaded.secrets, schema_path=args.schema,
+                                  overlaid=loaded.overlaid if args.overlay else None)
+
+# Checks run by --validate, given what the export was loaded from (a Loaded) and the
+# command-line arguments; each returns (severity, message) pairs, and any 'error'
+# stops the export. Add new checks here and to export_cache.VALIDATOR_NAMES, which
+# update.py parses --validate with.
+VALIDATORS = {
+    'addresses': validate_addresses,
+    'schema': validate_schema,
+}
+
+class ValidationError(ValueError):
+    pass
+
+def run_validators(loaded, args):
+    """Run the named validators, print their findings, and raise ValidationError on errors."""
+    errors = 0
+    for name in args.validate or []:
+        with profiler.stage(f"validate {name}"):
+            issues = VALIDATORS[name](loaded, args)
+        for severity, message in issues:
+            print(f"{'❌' if severity == 'error' else '⚠️ '} [{name}] {message}", file=sys.stderr)
+        errors += sum(1 for severity, _ in issues if severity == 'error')
+    if errors:
+        raise ValidationError(f"{errors} validation error(s); no files were written")
+
+def merge_overlays(config, overlays=(), policy='override', lists='replace', cache=None):
+    """Deep-merge each (name, data) overlay into the config with the given policy (through a LayerCache if given)."""
+    layers = [config_merge.Layer('config', config)]
+    layers += [config_merge.Layer(name, data, policy, lists) for name, data in overlays]
+    return cache.merge(layers) if cache is not None else config_merge.merge_layers(layers)
 
-def main():
-    parser = argparse.ArgumentParser(description="Export config and secrets to specified format.")
-    parser.add_argument('--type', choices=['env', 'json', 'ps1'], required=True)
-    parser.add_argument('--output', required=True)
+def merge_config(config, secrets, overlays=(), policy='override', lists='replace'):
+    """Deep-merge the config, then each (name, data) overlay with the given policy, then the secrets."""
+    overlaid = merge_overlays(config, overlays, policy, lists)
+    return config_merge.merge_layers([config_merge.Layer('config', overlaid), config_merge.Layer('secrets', secrets)])
+
+# What one export is built from, each loaded or decrypted once: the config file, the
+# config with its overlays merged in, the decrypted secrets, and the final merge
+Loaded = collections.namedtuple('Loaded', 'config overlaid secrets merged')
+
+def load_inputs(config_path, secrets_path, key_path, use_yaml_cache=True, only=None,
+                overlays=None, merge_policy='override', list_merge='replace'):
+    config = load_config(config_path, use_cache=use_yaml_cache)
+    overlay_data = [(str(path), load_config(path, use_cache=use_yaml_cache)) for path in overlays or []]
+    secrets = decrypt_secrets(secrets_path, key_path, only)
+    with profiler.stage('merge'):
+        overlaid = merge_overlays(config, overlay_data, merge_policy, list_merge,
+                                  MERGE_CACHE if use_yaml_cache else None)
+        merged = merge_config(overlaid, secrets)
+    return Loaded(config, overlaid, secrets, merged)
+
+def load_merged(config_path, secrets_path, key_path, use_yaml_cache=True, only=None,
+                overlays=None, merge_policy='override', list_merge='replace'):
+    return load_inputs(config_path, secrets_path, key_path, use_yaml_cache, only,
+                       overlays, merge_policy, list_merge).merged
+
+def load_inputs_args(args):
+    return load_inputs(args.config, args.secrets, args.key, not args.no_yaml_cache, args.only,
+                       args.overlay, args.merge_policy, args.list_merge)
+
+def diff_flat(old, new):
+    """Keys added, removed and changed between two flattened snapshots."""
+    added = sorted(new.keys() - old.keys())
+    removed = sorted(old.keys() - new.keys())
+    changed = sorted(key for key in new.keys() & old.keys() if new[key] != old[key])
+    return added, removed, changed
+
+def refresh_targets(merged, targets, list_format=None):
+    """Rewrite only the targets whose rendered content differs from the file on disk; streams always get it."""
+    written = []
+    for export_type, output in targets:
+        if export_io.is_stream(output):
+            EXPORTERS[export_type](target_pairs(merged, export_type, list_format), output)
+            written.append((export_type, output))
+            continue
+        content = b''.join(as_bytes(chunk) for chunk in RENDERERS[export_type](target_pairs(merged, export_type, list_format)))
+        try:
+            with open(resolve_output(output), 'rb') as f:
+                current = f.read()
+        except OSError:
+            current = None
+        if content != current:
+            write_export(output, [content])
+            written.append((export_type, output))
+    return written
+
+def publish_feed(args, merged, fingerprint=None):
+    with profiler.stage('publish feed'):
+        version = delta_feed.Feed(resolve_output(args.feed)).publish(flatten_dict(merged), fingerprint, args.feed_keep)
+    if version is not None:
+        print(f"✓ Feed {args.feed} at version {version}")
+
+def lock_paths(args, targets):
+    """Files whose directories an export locks: the targets, plus the feed index with --feed."""
+    paths = [resolve_output(output) for _, output in file_targets(targets)]
+    if args.feed:
+        paths.append(resolve_output(args.feed) / delta_feed.INDEX_NAME)
+    return paths
+
+def watch_exports(args, targets):
+    """Regenerate targets whenever the config, secrets or key change, until interrupted."""
+    import file_watch
+    sources = [
+        export_cache.resolve_path(args.config),
+        export_cache.resolve_path(args.secrets),
+        export_cache.resolve_path(args.key, SCRIPT_DIR),
+    ] + [export_cache.resolve_path(overlay) for overlay in args.overlay or []]
+    watcher = file_watch.FileWatcher(sources, debounce=args.debounce)
+    print(f"👀 Watching {', '.join(str(path) for path in sources)} ({watcher.backend})")
+    previous = None
+    while True:
+        try:
+            fingerprint = None if args.no_cache else export_cache.input_fingerprint(
+                args.config, args.secrets, args.key,
+                export_cache.options_from_args(args))
+            loaded = load_inputs_args(args)
+            run_validators(loaded, args)
+            merged = loaded.merged
+            flat = flatten_dict(merged)
+        except Exception as e:
+            print(f"⚠️  Could not load config, keeping current exports: {e}", file=sys.stderr)
+        else:
+            if previous is not None:
+                added, removed, changed = diff_flat(previous, flat)
+                if added or removed or changed:
+                    print(f"🔄 {len(added)} added, {len(removed)} removed, {len(changed)} changed keys")
+                else:
+                    print("✓ No effective config changes")
+            with export_io.export_lock(lock_paths(args, targets)):
+                if previous is None or flat != previous:
+                    written = refresh_targets(merged, targets, args.list_format)
+                    if not written:
+                        print("✓ All exports already match")
+                    if args.feed:
+                        publish_feed(args, merged, fingerprint)
+                if fingerprint is not None:
+                    export_cache.record_outputs(file_targets(targets), fingerprint)
+            previous = flat
+        watcher.wait()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export config and secrets to one or more formats.")
+    parser.add_argument('--type', action='append', choices=sorted(EXPORTERS), help='Output file type (repeat with --output for several targets)')
+    parser.add_argument('--output', action='append',
+                        help="Output file path (paired with the --type in the same position); '-', 'fd:N' or 'fifo:PATH' streams it instead")
+    parser.add_argument('--manifest', help='YAML file listing export targets')
     parser.add_argument('--config', required=True)
+    parser.add_argument('--overlay', action='append',
+                        help='YAML file deep-merged over the config before the secrets (repeat for a chain, e.g. site then environment)')
+    parser.add_argument('--merge-policy', choices=config_merge.POLICIES, default='override',
+                        help='When an overlay sets a value the config already has: override it, keep the old one, or error')
+    parser.add_argument('--list-merge', choices=config_merge.LIST_MODES, default='replace',
+                        help='Whether overlay lists replace or are appended to the lists they merge into')
     parser.add_argument('--secrets', required=True)
     parser.add_argument('--key', required=True)
-    args = parser.parse_args()
-
-    config = load_config(args.config)
-    secrets = decrypt_secrets(args.secrets, args.key)
-    merged = {**config, **secrets}
-    flat = flatten_dict(merged)
-
-    if args.type == 'env':
-        export_env(flat, args.output)
-    elif args.type == 'json':
-        export_json(flat, args.output)
-    elif args.type == 'ps1':
-        export_ps1(flat, args.output)
-    else:
-        print('Unknown export type')
-        sys.exit(1)
+    parser.add_argument('--force', action='store_true', help='Regenerate targets even if the export cache says they are up to date')
+    parser.add_argument('--no-cache', action='store_true', help='Neither consult nor update the export cache manifest')
+    parser.add_argument('--list-format', choices=LIST_FORMATS,
+                        help='How to flatten list values (default: join for env/ps1, native for json)')
+    parser.add_argument('--only', type=export_cache.parse_only, metavar='NAME[,NAME...]',
+                        help='Decrypt and export only these top-level secrets subtrees (e.g. vcenter,pure_storage)')
+    parser.add_argument('--validate', type=export_cache.parse_validate, metavar='NAME[,NAME...]',
+                        help=f"Check the merged config before writing ({', '.join(VALIDATORS)}); errors stop the export")
+    parser.add_argument('--schema', help='Schema for --validate schema (default: lab-config.schema.yml next to the config)')
+    parser.add_argument('--feed', metavar='DIR',
+                        help='Also publish each changed export as a new version with a delta to this feed directory')
+    parser.add_argument('--feed-keep', type=int, default=delta_feed.DEFAULT_KEEP, metavar='N',
+                        help='Deltas to keep in the feed; consumers further behind get a full snapshot')
+    parser.add_argument('--no-yaml-cache', action='store_true', help='Always parse lab-config.yml instead of reusing the cached parse')
+    parser.add_argument('--profile', nargs='?', const='table', choices=stage_profile.FORMATS,
+                        help=f"Report wall time and peak memory per stage on stderr (or set {stage_profile.ENV_VAR})")
+    parser.add_argument('--watch', action='store_true', help='Keep running and regenerate targets when the config, secrets or key change')
+    parser.add_argument('--debounce', type=float, default=0.5, help='Seconds of quiet to wait for after a change in --watch mode')
+    args = parser.parse_args(argv)
+
+    try:
+        targets = resolve_targets(args.type, args.output, args.manifest)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.feed_keep < 1:
+        parser.error("--feed-keep must be at least 1")
+    missing = [overlay for overlay in args.overlay or [] if not export_cache.resolve_path(overlay).is_file()]
+    if missing:
+        parser.error(f"Overlay file(s) not found: {', '.join(missing)}")
+
+    with status_to_stderr(targets):
+        if args.watch:
+            try:
+                watch_exports(args, targets)
+            except KeyboardInterrupt:
+                print("\nStopped watching")
+            return
+
+        if args.profile:
+            profiler.enable(args.profile)
+        spawn_t0 = os.environ.pop(stage_profile.SPAWN_ENV_VAR, None)
+        if spawn_t0:
+            profiler.record_since('interpreter start + imports', float(spawn_t0))
+        try:
+            run_export(args, targets)
+        except (ValidationError, config_merge.MergeConflict) as e:
+            print(f"❌ {e}", file=sys.stderr)
+            sys.exit(1)
+        except BrokenPipeError:
+            print("❌ The reader closed the output stream before the export was complete", file=sys.stderr)
+            sys.exit(1)
+        finally:
+            profiler.report()
+
+def run_export(args, targets):
+    if not args.no_cache and args.manifest:
+        export_cache.remember_targets(args.manifest, targets)
+    lock = export_io.export_lock(lock_paths(args, targets))
+    with profiler.stage('wait for export lock'):
+        lock.acquire()
+    fingerprint = None
+    try:
+        if args.no_cache:
+            stale = targets
+        else:
+            # Checked under the lock: a concurrent export may have just produced these files
+            with profiler.stage('cache check'):
+                fingerprint = export_cache.input_fingerprint(
+                    args.config, args.secrets, args.key,
+                    export_cache.options_from_args(args))
+                # Streams leave nothing behind to be fresh, so they are always written
+                stale = [target for target in targets if target not in file_targets(targets)]
+                for export_type, output in file_targets(targets):
+                    if (not args.force or lock.waited) and export_cache.is_fresh(export_type, output, fingerprint):
+                        print(f"✓ {output} is up to date")
+                    else:
+                        stale.append((export_type, output))
+                feed_fresh = not args.feed or delta_feed.Feed(resolve_output(args.feed)).is_fresh(fingerprint)
+            if not stale and feed_fresh:
+                return
+
+        loaded = load_inputs_args(args)
+        run_validators(loaded, args)
+        merged = loaded.merged
+        if stale:
+            export_targets(merged, stale, args.list_format)
+        if args.feed:
+            publish_feed(args, merged, fingerprint)
+        if not args.no_cache:
+            with profiler.stage('record cache'):
+                export_cache.record_outputs(file_targets(stale), fingerprint)
+    finally:
+        lock.release()
 
 if __name__ == '__main__':
     main()
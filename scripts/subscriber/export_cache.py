@@ -0,0 +1,209 @@
+"""
+export_cache.py: Content-addressed cache manifest for exported config files.
+
+Each export directory holds a .export-cache.json recording, for every output file,
+hashes of the config, the ciphertext, the key fingerprint, the export options and
+the exporter version that produced it (a hash of export-config.py and the sibling
+modules it imports, so editing e.g. cert_index.py keeps the cache). update.py
+checks it before starting the venv interpreter, so a run where nothing changed
+returns without decrypting anything.
+
+Only the standard library is used here so the check can run from any python3.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+MANIFEST_NAME = '.export-cache.json'
+SUBSCRIBER_DIR = Path(__file__).resolve().parent
+CACHE_DIR = Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'se-lab-melau-config'
+EXPORTER = 'export-config.py'
+# Imported by the exporter without changing what it writes: the --watch loop and --profile timing
+NOT_OUTPUT_MODULES = {'file_watch', 'stage_profile'}
+# Keys of export-config.py's VALIDATORS, for parsing --validate without importing the exporter
+VALIDATOR_NAMES = ('addresses', 'schema')
+# `import a, b` or `from a import ...` at the start of a line; a regex keeps the up-to-date check fast
+IMPORT_LINE = re.compile(r'^[ \t]*(?:import[ \t]+([\w.]+(?:[ \t]*,[ \t]*[\w.]+)*)|from[ \t]+([\w.]+)[ \t]+import\b)', re.M)
+
+
+def resolve_path(path, base=None):
+    """Resolve relative paths the same way export-config.py does."""
+    path = Path(path)
+    if not path.is_absolute():
+        path = (base or Path.cwd()) / path
+    return path
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def key_fingerprint(key_path):
+    """Fingerprint of the key file; the key itself never reaches the manifest."""
+    with open(resolve_path(key_path, SUBSCRIBER_DIR), 'rb') as f:
+        key_b64 = f.read().strip()
+    return hashlib.sha256(b'se-lab-melau-key:' + key_b64).hexdigest()[:32]
+
+
+def exporter_sources(entry=EXPORTER):
+    """The exporter and the sibling modules it imports, directly or not, minus NOT_OUTPUT_MODULES."""
+    sources, pending = set(), [SUBSCRIBER_DIR / entry]
+    while pending:
+        path = pending.pop()
+        if path in sources:
+            continue
+        sources.add(path)
+        # Indented imports count too: validators and the secrets envelope are imported lazily
+        for names, module in IMPORT_LINE.findall(path.read_text(encoding='utf-8')):
+            for name in (names.split(',') if names else [module]):
+                sibling = SUBSCRIBER_DIR / f"{name.strip().partition('.')[0]}.py"
+                if sibling.stem not in NOT_OUTPUT_MODULES and sibling.is_file():
+                    pending.append(sibling)
+    return sorted(sources)
+
+
+def exporter_version():
+    """Hash of the exporter's sources, so a change to code that can change an export invalidates the cache."""
+    if SUBSCRIBER_DIR.is_file():
+        # Running from the zipapp build: the archive holds all the sources
+        return file_sha256(SUBSCRIBER_DIR)
+    digest = hashlib.sha256()
+    for source in exporter_sources():
+        digest.update(source.name.encode())
+        digest.update(source.read_bytes())
+    return digest.hexdigest()
+
+
+def parse_only(value):
+    """--only value: comma-separated top-level secrets names."""
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    if not names:
+        raise argparse.ArgumentTypeError("expected one or more comma-separated names")
+    return names
+
+
+def parse_validate(value):
+    """--validate value: comma-separated names from VALIDATOR_NAMES."""
+    names = parse_only(value)
+    unknown = [name for name in names if name not in VALIDATOR_NAMES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown validator(s) {', '.join(unknown)}; choose from {', '.join(VALIDATOR_NAMES)}")
+    return names
+
+
+def cache_options(list_format=None, only=None, validate=None, config_path=None, schema_path=None,
+                  overlays=None, merge_policy=None, list_merge=None):
+    """Export options that change the output and therefore belong in the fingerprint.
+
+    Validators are included so that a file exported without --validate is not
+    taken as having passed validation; with schema validation, so is the schema.
+    Overlay files are inputs like the config, so their hashes are included too.
+    """
+    options = {'list_format': list_format} if list_format else {}
+    if overlays:
+        options['overlays'] = [[str(overlay), file_sha256(resolve_path(overlay))] for overlay in overlays]
+        options['merge'] = [merge_policy or 'override', list_merge or 'replace']
+    if only is not None:
+        options['only'] = sorted(only)
+    if validate:
+        options['validate'] = sorted(validate)
+        if 'schema' in validate:
+            import config_schema
+            schema_path = schema_path or config_schema.default_schema_path(resolve_path(config_path))
+            try:
+                options['schema'] = file_sha256(resolve_path(schema_path))
+            except OSError:
+                options['schema'] = None
+    return options
+
+
+def options_from_args(args):
+    """cache_options() for the parsed arguments of update.py or export-config.py."""
+    return cache_options(args.list_format, args.only, args.validate, args.config, args.schema,
+                         args.overlay, args.merge_policy, args.list_merge)
+
+
+def input_fingerprint(config_path, secrets_path, key_path, options=None):
+    return {
+        'config': file_sha256(resolve_path(config_path)),
+        'secrets': file_sha256(resolve_path(secrets_path)),
+        'key': key_fingerprint(key_path),
+        'exporter': exporter_version(),
+        'options': options or {},
+    }
+
+
+def load_manifest(directory):
+    try:
+        with open(Path(directory) / MANIFEST_NAME, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_json(path, data):
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def is_fresh(export_type, output, fingerprint):
+    """True when output exists unchanged and was produced from the same inputs."""
+    output = resolve_path(output)
+    entry = load_manifest(output.parent).get(output.name)
+    if not entry or entry.get('type') != export_type or entry.get('inputs') != fingerprint:
+        return False
+    try:
+        return file_sha256(output) == entry.get('output')
+    except OSError:
+        return False
+
+
+def record_outputs(targets, fingerprint):
+    """Record freshly written (type, output) targets, one manifest per export directory."""
+    by_dir = {}
+    for export_type, output in targets:
+        output = resolve_path(output)
+        by_dir.setdefault(output.parent, []).append((export_type, output))
+    for directory, outputs in by_dir.items():
+        manifest = load_manifest(directory)
+        for export_type, output in outputs:
+            manifest[output.name] = {
+                'type': export_type,
+                'inputs': fingerprint,
+                'output': file_sha256(output),
+            }
+        _write_json(directory / MANIFEST_NAME, manifest)
+
+
+def _targets_cache_path(manifest_path):
+    manifest_path = resolve_path(manifest_path)
+    digest = hashlib.sha256()
+    digest.update(str(Path.cwd()).encode() + b'\0')
+    digest.update(manifest_path.read_bytes())
+    return CACHE_DIR / 'targets' / f"{digest.hexdigest()}.json"
+
+
+def remember_targets(manifest_path, targets):
+    """Store the targets parsed from a YAML manifest so python3 without PyYAML can reuse them."""
+    path = _targets_cache_path(manifest_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _write_json(path, [list(target) for target in targets])
+
+
+def recall_targets(manifest_path):
+    """Targets previously parsed from this exact manifest content, or None."""
+    try:
+        with open(_targets_cache_path(manifest_path), 'r') as f:
+            return [tuple(target) for target in json.load(f)]
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,186 @@
+"""
+export_io.py: Atomic export writes and single-flight locking of export directories.
+
+atomic_write() writes to a temp file in the target directory, sets the final mode
+on the open file, fsyncs it and renames it over the target, then fsyncs the
+directory. Readers see either the old or the new file, never a partial one.
+
+export_lock() takes an exclusive flock on <dir>/.export.lock for every export
+directory involved (in sorted order, so callers cannot deadlock). When several
+processes export at once, one holds the lock and does the work; the others block,
+then re-check the export cache and reuse its output. The lock is advisory and is
+released by the kernel if the holder dies.
+
+Outputs can also be streams instead of files: '-' (stdout), 'fd:N' (a descriptor
+inherited from the parent, e.g. `3>&1` or a pipe set up by CI) or a named pipe
+('fifo:PATH', or the path of an existing one). stream_output() settles once which
+outputs are streams; stream_write() writes the chunks as they are produced.
+Nothing is created, renamed or chmodded on disk, and streams take no lock.
+"""
+import contextlib
+import fcntl
+import os
+import stat
+import threading
+from pathlib import Path
+
+LOCK_NAME = '.export.lock'
+STDOUT = '-'
+FD_PREFIX = 'fd:'
+FIFO_PREFIX = 'fifo:'
+
+
+def fsync_directory(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, chunks, mode=0o400):
+    """Write byte chunks to path via temp file + fsync + rename; the file has `mode` before it appears."""
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fchmod(f.fileno(), mode)
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
+    fsync_directory(path.parent)
+
+
+def stream_fd(output):
+    """Descriptor number for '-' and 'fd:N' outputs, None for paths; raises ValueError for a bad fd:N."""
+    output = str(output)
+    if output == STDOUT:
+        return 1
+    if not output.startswith(FD_PREFIX):
+        return None
+    try:
+        fd = int(output[len(FD_PREFIX):])
+    except ValueError:
+        raise ValueError(f"{output}: expected fd:N with N a file descriptor number") from None
+    if fd < 0:
+        raise ValueError(f"{output}: expected fd:N with N a file descriptor number")
+    return fd
+
+
+def is_fifo(path):
+    try:
+        return stat.S_ISFIFO(os.stat(path).st_mode)
+    except (OSError, ValueError):
+        return False
+
+
+def stream_output(output):
+    """The output as '-', 'fd:N' or 'fifo:PATH' if it is a stream, None if it is a file.
+
+    An existing named pipe given as a plain path becomes 'fifo:PATH', so the answer
+    does not change if the pipe is removed during the export. Raises ValueError for
+    a malformed or closed descriptor and for a 'fifo:' path that is not a named pipe.
+    """
+    output = str(output)
+    fd = stream_fd(output)
+    if fd is not None:
+        try:
+            os.fstat(fd)
+        except OSError:
+            raise ValueError(f"{output}: file descriptor {fd} is not open") from None
+        return output
+    if output.startswith(FIFO_PREFIX):
+        if not is_fifo(output[len(FIFO_PREFIX):]):
+            raise ValueError(f"{output}: not a named pipe (create it with mkfifo)")
+        return output
+    return FIFO_PREFIX + output if is_fifo(output) else None
+
+
+def is_stream(output):
+    """True for outputs already normalized by stream_output() to a stream."""
+    return str(output) == STDOUT or str(output).startswith((FD_PREFIX, FIFO_PREFIX))
+
+
+def stream_identity(output):
+    """(st_dev, st_ino) of what a normalized stream output writes to, None for a file.
+
+    '-', 'fd:1' and 'fd:3' after 3>&1 all name one pipe or terminal; so do a named
+    pipe's path and a descriptor open on it.
+    """
+    fd = stream_fd(output)
+    try:
+        if fd is not None:
+            st = os.fstat(fd)
+        elif str(output).startswith(FIFO_PREFIX):
+            st = os.stat(str(output)[len(FIFO_PREFIX):])
+        else:
+            return None
+    except OSError:
+        # Closed or removed since stream_output() checked it; stream_write() reports that
+        return (FD_PREFIX, fd) if fd is not None else str(output)
+    return (st.st_dev, st.st_ino)
+
+
+def stream_write(output, chunks):
+    """Write byte chunks to a stream output as they are produced; the descriptor is left open."""
+    fd = stream_fd(output)
+    if fd is None:
+        # Named pipe: opening blocks until a reader opens the other end
+        f = open(str(output)[len(FIFO_PREFIX):], 'wb')
+    else:
+        try:
+            os.fstat(fd)
+        except OSError:
+            raise OSError(f"{output}: file descriptor {fd} is not open") from None
+        f = os.fdopen(fd, 'wb', closefd=False)
+    with f:
+        for chunk in chunks:
+            f.write(chunk)
+
+
+class ExportLock:
+    """Exclusive flock on the lock file of each directory; .waited tells if another process held one."""
+
+    def __init__(self, directories):
+        self.directories = sorted({Path(directory) for directory in directories})
+        self.waited = False
+        self._fds = []
+
+    def acquire(self):
+        try:
+            for directory in self.directories:
+                directory.mkdir(parents=True, exist_ok=True)
+                fd = os.open(directory / LOCK_NAME, os.O_RDWR | os.O_CREAT, 0o600)
+                self._fds.append(fd)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    print(f"⏳ Another export is running in {directory}; waiting for it")
+                    self.waited = True
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+        except BaseException:
+            self.release()
+            raise
+        return self
+
+    def release(self):
+        while self._fds:
+            os.close(self._fds.pop())  # closing the descriptor drops the flock
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def export_lock(outputs):
+    """Lock the directories of the given output paths for the duration of a with block."""
+    return ExportLock(Path(output).parent for output in outputs)
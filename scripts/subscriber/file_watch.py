@@ -0,0 +1,133 @@
+"""
+file_watch.py: Debounced change notification for a handful of files.
+
+Uses Linux inotify (through ctypes, no extra packages) on the parent directories,
+so editors that save by writing a temp file and renaming it over the original are
+seen too. Falls back to polling stat() where inotify is not available (e.g. macOS).
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from pathlib import Path
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def _load_inotify():
+    if not hasattr(os, 'uname') or os.uname().sysname != 'Linux':
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class FileWatcher:
+    """Block until one or more of the given files change, then report which ones."""
+
+    def __init__(self, paths, debounce=0.5, poll_interval=1.0):
+        self.paths = {Path(path).resolve() for path in paths}
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.fd = None
+        self.dirs = {}
+        libc = _load_inotify()
+        if libc is not None:
+            fd = libc.inotify_init1(IN_CLOEXEC)
+            if fd >= 0:
+                self.fd = fd
+                for directory in {path.parent for path in self.paths}:
+                    wd = libc.inotify_add_watch(fd, str(directory).encode(), WATCH_MASK)
+                    if wd < 0:
+                        self.close()
+                        break
+                    self.dirs[wd] = directory
+        if self.fd is None:
+            self.stamps = self._stamps()
+
+    @property
+    def backend(self):
+        return 'inotify' if self.fd is not None else 'polling'
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+            self.stamps = self._stamps()
+
+    def _stamps(self):
+        stamps = {}
+        for path in self.paths:
+            try:
+                st = path.stat()
+                stamps[path] = (st.st_ino, st.st_size, st.st_mtime_ns)
+            except OSError:
+                stamps[path] = None
+        return stamps
+
+    def _read_events(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return None
+        changed = set()
+        buf = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset < len(buf):
+            wd, mask, cookie, name_len = EVENT_HEADER.unpack_from(buf, offset)
+            offset += EVENT_HEADER.size
+            name = buf[offset:offset + name_len].rstrip(b'\0').decode(errors='replace')
+            offset += name_len
+            path = self.dirs.get(wd, Path('/')) / name
+            if path in self.paths:
+                changed.add(path)
+        return changed
+
+    def _poll_changes(self):
+        stamps = self._stamps()
+        changed = {path for path in self.paths if stamps[path] != self.stamps.get(path)}
+        self.stamps = stamps
+        return changed
+
+    def wait(self, timeout=None):
+        """Return the set of changed paths once a burst of changes has settled.
+
+        Returns an empty set if timeout (seconds) passes with no change.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        changed = set()
+        while True:
+            if changed:
+                wait_for = self.debounce
+            elif deadline is None:
+                wait_for = None if self.fd is not None else self.poll_interval
+            else:
+                wait_for = max(0.0, deadline - time.monotonic())
+                if self.fd is None:
+                    wait_for = min(wait_for, self.poll_interval)
+            if self.fd is not None:
+                events = self._read_events(wait_for)
+            else:
+                time.sleep(wait_for)
+                events = self._poll_changes() or None
+            if events is None:
+                if changed:
+                    return changed
+                if deadline is not None and time.monotonic() >= deadline:
+                    return changed
+                continue
+            changed |= events
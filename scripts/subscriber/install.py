@@ -1,33 +1,28 @@
 """
 install.py: Sets up Python virtual environment and installs dependencies.
+
+Dependencies come from the hash-locked requirements.lock (see venv_bootstrap.py);
+an existing .venv built from the same lockfile and Python is reused as is.
 """
-import subprocess
-import sys
+import argparse
+import os
 from pathlib import Path
 
-VENV_DIR = Path('.venv')
-REQUIREMENTS = ['cryptography', 'pyyaml']
-
-def run(cmd, check=True):
-    print(f"Running: {' '.join(cmd)}")
-    subprocess.run(cmd, check=check)
+import venv_bootstrap
 
-def create_venv():
-    if VENV_DIR.exists():
-        print(f"Virtualenv already exists at {VENV_DIR}")
-        return
-    run([sys.executable, '-m', 'venv', str(VENV_DIR)])
-    print(f"Created virtualenv at {VENV_DIR}")
-
-def install_requirements():
-    pip_path = VENV_DIR / 'bin' / 'pip'
-    for pkg in REQUIREMENTS:
-        run([str(pip_path), 'install', pkg])
-    print("Dependencies installed.")
+VENV_DIR = Path('.venv')
 
 def main():
-    create_venv()
-    install_requirements()
+    parser = argparse.ArgumentParser(description="Create or reuse .venv from requirements.lock.")
+    parser.add_argument('--wheelhouse', default=os.environ.get(venv_bootstrap.WHEELHOUSE_ENV),
+                        help=f"Install offline from this directory of wheels (or set {venv_bootstrap.WHEELHOUSE_ENV})")
+    parser.add_argument('--download-wheelhouse', metavar='DIR', help='Also download the locked wheels into DIR for offline installs')
+    parser.add_argument('--force', action='store_true', help='Rebuild the virtualenv even if it is up to date')
+    args = parser.parse_args()
+
+    venv_bootstrap.ensure_venv(VENV_DIR, wheelhouse=args.wheelhouse, force=args.force)
+    if args.download_wheelhouse:
+        venv_bootstrap.download_wheelhouse(VENV_DIR, args.download_wheelhouse)
     print("Setup complete. Activate with 'source .venv/bin/activate'")
 
 if __name__ == '__main__':
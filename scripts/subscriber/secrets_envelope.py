@@ -0,0 +1,240 @@
+"""
+secrets_envelope.py: Per-subtree envelope encryption of secrets.yml.
+
+The container encrypts every top-level key of secrets.yml (a "subtree") on its
+own, so a consumer that needs `vcenter` decrypts and parses only `vcenter`:
+
+    b'SLMENV01' | index length (uint32 LE) | index (JSON) | subtree bodies
+
+The index is plaintext and lists, per subtree, its name, the offset and length of
+its body, its data key wrapped with AES key wrap (RFC 3394) and an HMAC of its
+plaintext. Each body is the subtree's YAML text, encrypted with its own random
+data key in the streaming v2 format of secrets_store. Key-encryption and MAC keys
+are derived from the master key with HKDF. The whole index carries an HMAC too,
+so renaming, reordering or swapping entries is detected before anything is
+decrypted, and a decrypted body must contain exactly the subtree it is listed as.
+
+Bodies hold the original text of each subtree (comments included), so decrypting
+every subtree gives back secrets.yml byte for byte. The plaintext HMACs let
+write_subtrees() keep the existing body of every unchanged subtree. Bodies are
+decrypted, authenticated and parsed a chunk at a time, and written the same way.
+"""
+import base64
+import hashlib
+import hmac
+import io
+import json
+import os
+import shutil
+import struct
+
+import secrets_store
+import yaml_loader
+
+MAGIC = b'SLMENV01'
+INDEX_LENGTH = struct.Struct('<I')
+KEK_INFO = b'se-lab-melau envelope kek'
+MAC_INFO = b'se-lab-melau envelope mac'
+
+
+def is_envelope(data_or_prefix):
+    return bytes(data_or_prefix[:len(MAGIC)]) == MAGIC
+
+
+def _derive(key, info):
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+    return HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=info).derive(bytes(key))
+
+
+def _mac(mac_key, data):
+    return hmac.new(mac_key, data, hashlib.sha256).hexdigest()
+
+
+def _index_mac(mac_key, entries):
+    return _mac(mac_key, json.dumps(entries, sort_keys=True, separators=(',', ':')).encode())
+
+
+def split_subtrees(text):
+    """Split secrets YAML text into (name, text) per top-level key, keeping comments and blank lines."""
+    root = yaml_loader.compose(text)
+    if root is None:
+        return []
+    if root.id != 'mapping' or root.flow_style:
+        raise ValueError("secrets.yml must be a block mapping of top-level keys")
+    lines = text.splitlines(keepends=True)
+    starts = [key.start_mark.line for key, _ in root.value]
+    names = [key.value for key, _ in root.value]
+    if len(set(names)) != len(names):
+        raise ValueError("secrets.yml has duplicate top-level keys")
+    if len(set(starts)) != len(starts) or any(key.start_mark.column for key, _ in root.value):
+        raise ValueError("Each top-level key of secrets.yml must start its own line")
+    subtrees = []
+    for i, name in enumerate(names):
+        # Text before the first key (e.g. a header comment) belongs to the first subtree
+        begin = 0 if i == 0 else starts[i]
+        end = starts[i + 1] if i + 1 < len(starts) else len(lines)
+        subtrees.append((name, ''.join(lines[begin:end])))
+    return subtrees
+
+
+class _Body:
+    """The bytes of one body inside the container file, read on demand."""
+
+    def __init__(self, f, start, length):
+        self._f = f
+        self._pos = start
+        self._left = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self._left:
+            size = self._left
+        # Seek every time: several bodies of the same file may be read in turn
+        self._f.seek(self._pos)
+        data = self._f.read(size)
+        self._pos += len(data)
+        self._left -= len(data)
+        return data
+
+
+class _ChunkStream(io.RawIOBase):
+    """File object over an iterator of plaintext chunks, so YAML parses a subtree as it is decrypted."""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._pending = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk)
+        n = min(len(buf), len(self._pending))
+        buf[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+
+class Envelope:
+    """A parsed container: the verified index plus lazy, streamed access to the encrypted bodies."""
+
+    def __init__(self, f, master_key):
+        self._f = f
+        self._key = master_key
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("Not a secrets envelope")
+        (length,) = INDEX_LENGTH.unpack(f.read(INDEX_LENGTH.size))
+        try:
+            index = json.loads(f.read(length))
+        except ValueError:
+            raise ValueError(f"{secrets_store.DECRYPT_ERROR} (unreadable index)") from None
+        self._body_start = len(MAGIC) + INDEX_LENGTH.size + length
+        self._mac_key = _derive(master_key, MAC_INFO)
+        entries = index.get('subtrees', [])
+        if not hmac.compare_digest(index.get('mac', ''), _index_mac(self._mac_key, entries)):
+            raise ValueError(f"{secrets_store.DECRYPT_ERROR} (index failed authentication)")
+        self.entries = {entry['name']: entry for entry in entries}
+        self.names = [entry['name'] for entry in entries]
+
+    def close(self):
+        self._f.close()
+
+    def body(self, name):
+        """File object reading the encrypted body of one subtree."""
+        entry = self.entries[name]
+        return _Body(self._f, self._body_start + entry['offset'], entry['length'])
+
+    def iter_decrypt(self, name):
+        """Yield the plaintext of one subtree chunk by chunk.
+
+        The subtree's HMAC is computed as the chunks go by; a body that does not
+        match the index raises ValueError after the last chunk.
+        """
+        from cryptography.hazmat.primitives.keywrap import InvalidUnwrap, aes_key_unwrap
+        entry = self.entries[name]
+        try:
+            data_key = aes_key_unwrap(_derive(self._key, KEK_INFO), base64.b64decode(entry['wrapped_key']))
+        except InvalidUnwrap:
+            raise ValueError(f"{secrets_store.DECRYPT_ERROR} (key for '{name}' failed to unwrap)") from None
+        mac = hmac.new(self._mac_key, digestmod=hashlib.sha256)
+        for chunk in secrets_store.iter_decrypt_stream(self.body(name), data_key):
+            mac.update(chunk)
+            yield chunk
+        if not hmac.compare_digest(entry['digest'], mac.hexdigest()):
+            raise ValueError(f"{secrets_store.DECRYPT_ERROR} (subtree '{name}' does not match the index)")
+
+    def load(self, name):
+        """Parsed value of one subtree, which must hold exactly the key `name`; parsed while it decrypts."""
+        stream = _ChunkStream(self.iter_decrypt(name))
+        parsed = yaml_loader.safe_load(stream) or {}
+        # The parser reads to the end, but make sure the HMAC check after the last chunk has run
+        if stream.read():
+            raise ValueError(f"{secrets_store.DECRYPT_ERROR} (subtree '{name}' was not read to the end)")
+        if not isinstance(parsed, dict) or list(parsed) != [name]:
+            raise ValueError(f"{secrets_store.DECRYPT_ERROR} (subtree '{name}' holds other keys)")
+        return parsed[name]
+
+
+def select(names, only):
+    """Names that were asked for, in container order; unknown names are an error."""
+    if only is None:
+        return list(names)
+    missing = [name for name in only if name not in names]
+    if missing:
+        raise ValueError(f"Secrets have no subtree(s) {', '.join(missing)}; available: {', '.join(names)}")
+    return [name for name in names if name in only]
+
+
+def _digest_and_size(mac_key, text):
+    """HMAC and UTF-8 length of a subtree's text, without keeping the encoded copy."""
+    plaintext = text.encode('utf-8')
+    return _mac(mac_key, plaintext), len(plaintext)
+
+
+def write_subtrees(subtrees, master_key, dst, previous=None, keep=()):
+    """Write a container for [(name, text)] to the binary file object dst; returns the reused names.
+
+    Unchanged bodies are copied from previous. keep names subtrees of previous to
+    carry over untouched although they are not in subtrees (e.g. after a partial
+    decrypt with --only). Body lengths follow from the plaintext lengths, so the
+    index is written first and every body is encrypted or copied straight into
+    dst, one chunk at a time.
+    """
+    from cryptography.hazmat.primitives.keywrap import aes_key_wrap
+    kek = _derive(master_key, KEK_INFO)
+    mac_key = _derive(master_key, MAC_INFO)
+    given = dict(subtrees)
+    if keep and previous:
+        # Partial update: keep the container's order, append subtrees it did not have
+        order = [name for name in previous.names if name in given or name in keep]
+        order += [name for name, _ in subtrees if name not in previous.entries]
+    else:
+        order = [name for name, _ in subtrees]
+    entries, writers, offset, reused = [], [], 0, []
+    for name in order:
+        old = previous.entries.get(name) if previous else None
+        digest, size = _digest_and_size(mac_key, given[name]) if name in given else (None, None)
+        if digest is None or (old and hmac.compare_digest(old['digest'], digest)):
+            entry = {k: old[k] for k in ('name', 'wrapped_key', 'length', 'digest')}
+            writers.append((name, None))
+            reused.append(name)
+        else:
+            data_key = os.urandom(32)
+            entry = {'name': name, 'wrapped_key': base64.b64encode(aes_key_wrap(kek, data_key)).decode(),
+                     'length': secrets_store.encrypted_size(size), 'digest': digest}
+            writers.append((name, data_key))
+        entries.append(dict(entry, offset=offset))
+        offset += entry['length']
+    index = json.dumps({'format': 1, 'subtrees': entries, 'mac': _index_mac(mac_key, entries)},
+                       sort_keys=True).encode()
+    dst.write(MAGIC + INDEX_LENGTH.pack(len(index)) + index)
+    for name, data_key in writers:
+        if data_key is None:
+            shutil.copyfileobj(previous.body(name), dst, secrets_store.CHUNK_SIZE)
+        else:
+            secrets_store.encrypt_stream(io.BytesIO(given[name].encode('utf-8')), dst, data_key)
+    return reused
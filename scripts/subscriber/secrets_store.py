@@ -0,0 +1,303 @@
+"""
+secrets_store.py: Shared key loading, AES decryption and a per-process secrets cache.
+
+Used by export-config.py and the admin encrypt/decrypt scripts. Within one process:
+
+- the key file is read and base64-decoded once per (path, inode, size, mtime);
+- decrypted secrets are parsed once per (ciphertext hash, key), and callers get a
+  deep copy so the cached tree cannot be modified;
+- invalidate() drops everything and overwrites cached key bytes, and runs at exit.
+
+Zeroizing is best effort: key material is kept in bytearrays that are overwritten,
+but Python may still hold transient copies (e.g. decoded str values in the parsed tree).
+
+Encrypted files use the streaming v2 format written by encrypt_stream():
+
+    header:  b'SLMSECv2' | chunk size (uint32 LE) | 16-byte random salt
+    chunks:  AES-256-GCM(chunk plaintext) + 16-byte tag, one per chunk
+
+The file key is HKDF-SHA256(key, salt), so every file has its own key. Chunk i
+uses the 12-byte nonce i (11 bytes, big-endian) + final flag (1 byte) and the
+header as associated data. Every chunk but the last holds exactly chunk-size
+bytes; the last holds fewer (possibly none) and is the only one with the final
+flag, so truncation, reordering and header tampering all fail authentication.
+Encrypting and decrypting stream in constant memory, and corruption is detected
+at the chunk where it occurs, before anything is parsed. Files without the
+header are the legacy IV + AES-CBC format, which is still read.
+
+secrets.yml.encrypted itself is normally an envelope of per-subtree v2 streams
+(see secrets_envelope.py); the functions below take `only` to decrypt just the
+named top-level subtrees.
+"""
+import atexit
+import base64
+import copy
+import hashlib
+import io
+import os
+import struct
+import threading
+from pathlib import Path
+
+import yaml_loader
+from stage_profile import profiler
+
+V2_MAGIC = b'SLMSECv2'
+V2_HEADER = struct.Struct('<8sI16s')
+V2_INFO = b'se-lab-melau secrets v2'
+CHUNK_SIZE = 64 * 1024
+TAG_SIZE = 16
+DECRYPT_ERROR = "Could not decrypt secrets: wrong key or corrupted file"
+
+_lock = threading.Lock()
+_keys = {}      # resolved key path -> (stat stamp, key bytearray, key id)
+_secrets = {}   # (ciphertext sha256, key id) -> parsed secrets
+
+
+def _zeroize(buf):
+    buf[:] = bytes(len(buf))
+
+
+def _stamp(path):
+    st = os.stat(path)
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _cached_key(key_path):
+    """Return (key bytearray, key id), re-reading the file only when it changed."""
+    key_path = Path(key_path).resolve()
+    stamp = _stamp(key_path)
+    with _lock:
+        cached = _keys.get(key_path)
+        if cached and cached[0] == stamp:
+            return cached[1], cached[2]
+    with profiler.stage('key load'):
+        with open(key_path, 'rb') as f:
+            key_b64 = bytearray(f.read().strip())
+        key = bytearray(base64.b64decode(key_b64))
+        _zeroize(key_b64)
+    key_id = hashlib.sha256(b'se-lab-melau-key:' + key).hexdigest()
+    with _lock:
+        old = _keys.get(key_path)
+        if old and old[1] is not key:
+            _zeroize(old[1])
+        _keys[key_path] = (stamp, key, key_id)
+    return key, key_id
+
+
+def load_key(key_path):
+    """Decoded key bytes for key_path (cached)."""
+    return bytes(_cached_key(key_path)[0])
+
+
+def _aes_cbc(key, iv):
+    # cryptography is imported here so cache hits and fast paths never load it
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    return Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend())
+
+
+def decrypt_legacy(data, key):
+    """Decrypt IV + AES-CBC ciphertext with PKCS7 padding; returns a bytearray."""
+    iv, ciphertext = data[:16], data[16:]
+    decryptor = _aes_cbc(key, iv).decryptor()
+    padded = bytearray(len(ciphertext) + 16)
+    n = decryptor.update_into(ciphertext, padded)
+    decryptor.finalize()  # CBC buffers nothing for whole blocks; raises on a partial block
+    pad_len = padded[n - 1] if n else 0
+    if not 1 <= pad_len <= 16 or padded[n - pad_len:n] != bytes([pad_len]) * pad_len:
+        _zeroize(padded)
+        raise ValueError(DECRYPT_ERROR)
+    plaintext = padded[:n - pad_len]
+    _zeroize(padded)
+    return plaintext
+
+
+def _chunk_cipher(key, salt):
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+    file_key = HKDF(algorithm=hashes.SHA256(), length=32, salt=salt, info=V2_INFO).derive(bytes(key))
+    return AESGCM(file_key)
+
+
+def _nonce(index, final):
+    return index.to_bytes(11, 'big') + (b'\x01' if final else b'\x00')
+
+
+def _read_full(src, size):
+    """Read exactly size bytes unless EOF comes first."""
+    buf = bytearray()
+    while len(buf) < size:
+        part = src.read(size - len(buf))
+        if not part:
+            break
+        buf += part
+    return buf
+
+
+def encrypt_stream(src, dst, key, chunk_size=CHUNK_SIZE):
+    """Encrypt binary file object src into dst in the v2 format, one chunk in memory at a time."""
+    header = V2_HEADER.pack(V2_MAGIC, chunk_size, os.urandom(16))
+    aead = _chunk_cipher(key, V2_HEADER.unpack(header)[2])
+    dst.write(header)
+    index = 0
+    chunk = _read_full(src, chunk_size)
+    while True:
+        # A full chunk is final only if nothing follows it; then an empty final chunk is written
+        final = len(chunk) < chunk_size
+        dst.write(aead.encrypt(_nonce(index, final), bytes(chunk), header))
+        _zeroize(chunk)
+        if final:
+            return
+        index += 1
+        chunk = _read_full(src, chunk_size)
+
+
+def encrypted_size(plaintext_length, chunk_size=CHUNK_SIZE):
+    """Length of the v2 ciphertext encrypt_stream() writes for plaintext_length bytes."""
+    return V2_HEADER.size + plaintext_length + TAG_SIZE * (plaintext_length // chunk_size + 1)
+
+
+def iter_decrypt_stream(src, key):
+    """Yield authenticated plaintext chunks of a v2 (or legacy) file object; raises ValueError on tampering."""
+    header = _read_full(src, V2_HEADER.size)
+    magic, chunk_size, salt = V2_HEADER.unpack(header) if len(header) == V2_HEADER.size else (None, 0, None)
+    if magic != V2_MAGIC:
+        # Legacy IV + CBC files have no header and are decrypted in memory
+        plaintext = decrypt_legacy(bytes(header) + src.read(), key)
+        try:
+            yield bytes(plaintext)
+        finally:
+            _zeroize(plaintext)
+        return
+    if not 0 < chunk_size <= 64 * 1024 * 1024:
+        raise ValueError(DECRYPT_ERROR)
+    from cryptography.exceptions import InvalidTag
+    aead = _chunk_cipher(key, salt)
+    header = bytes(header)
+    index = 0
+    while True:
+        sealed = _read_full(src, chunk_size + TAG_SIZE)
+        final = len(sealed) < chunk_size + TAG_SIZE
+        if final and len(sealed) < TAG_SIZE:
+            raise ValueError(f"{DECRYPT_ERROR} (truncated after chunk {index})")
+        try:
+            plaintext = aead.decrypt(_nonce(index, final), bytes(sealed), header)
+        except InvalidTag:
+            raise ValueError(f"{DECRYPT_ERROR} (chunk {index} failed authentication)") from None
+        yield plaintext
+        if final:
+            if src.read(1):
+                raise ValueError(f"{DECRYPT_ERROR} (data after the final chunk)")
+            return
+        index += 1
+
+
+def decrypt_bytes(data, key):
+    """Decrypt a v2 or legacy ciphertext held in memory; returns a bytearray."""
+    plaintext = bytearray()
+    try:
+        for chunk in iter_decrypt_stream(io.BytesIO(data), key):
+            plaintext += chunk
+    except BaseException:
+        _zeroize(plaintext)
+        raise
+    return plaintext
+
+
+def encrypt_bytes(plaintext, key, chunk_size=CHUNK_SIZE):
+    """Encrypt plaintext held in memory to the v2 format."""
+    out = io.BytesIO()
+    encrypt_stream(io.BytesIO(bytes(plaintext)), out, key, chunk_size)
+    return out.getvalue()
+
+
+def _is_envelope(f):
+    import secrets_envelope  # imports this module, so it is loaded on first use
+    prefix = f.read(len(secrets_envelope.MAGIC))
+    f.seek(0)
+    return secrets_envelope.is_envelope(prefix)
+
+
+def iter_decrypt_file(enc_path, key_path, only=None):
+    """Yield the plaintext of enc_path in pieces: per subtree for envelopes, per chunk otherwise."""
+    import secrets_envelope
+    key, _ = _cached_key(key_path)
+    with open(enc_path, 'rb') as f:
+        if _is_envelope(f):
+            envelope = secrets_envelope.Envelope(f, key)
+            for name in secrets_envelope.select(envelope.names, only):
+                yield from envelope.iter_decrypt(name)
+        elif only is None:
+            yield from iter_decrypt_stream(f, key)
+        else:
+            # Whole-file formats have to be decrypted in full before subtrees can be picked out
+            plaintext = bytearray()
+            for chunk in iter_decrypt_stream(f, key):
+                plaintext += chunk
+            subtrees = dict(secrets_envelope.split_subtrees(plaintext.decode('utf-8')))
+            _zeroize(plaintext)
+            for name in secrets_envelope.select(list(subtrees), only):
+                yield subtrees[name].encode('utf-8')
+
+
+def decrypt_file_to(enc_path, key_path, dst, only=None):
+    """Decrypt enc_path into the binary file object dst, one chunk or subtree in memory at a time."""
+    for piece in iter_decrypt_file(enc_path, key_path, only):
+        dst.write(piece)
+
+
+def _load_envelope(data, key, only):
+    import secrets_envelope
+    envelope = secrets_envelope.Envelope(io.BytesIO(data), key)
+    secrets = {}
+    for name in secrets_envelope.select(envelope.names, only):
+        # Decrypting and parsing are one stage: the subtree is parsed as its chunks decrypt
+        with profiler.stage(f"decrypt + yaml parse secrets [{name}]"):
+            secrets[name] = envelope.load(name)
+    return secrets
+
+
+def load_secrets(enc_path, key_path, only=None):
+    """Parsed secrets (or the `only` top-level subtrees) from enc_path, decrypted and parsed at most once."""
+    with open(enc_path, 'rb') as f:
+        data = f.read()
+    return load_secrets_bytes(data, key_path, only)
+
+
+def load_secrets_bytes(data, key_path, only=None):
+    """load_secrets() for ciphertext already in memory (e.g. a blob read from git)."""
+    import secrets_envelope
+    key, key_id = _cached_key(key_path)
+    cache_key = (hashlib.sha256(data).hexdigest(), key_id, None if only is None else tuple(sorted(only)))
+    with _lock:
+        if cache_key in _secrets:
+            return copy.deepcopy(_secrets[cache_key])
+    if secrets_envelope.is_envelope(data):
+        secrets = _load_envelope(data, key, only)
+    else:
+        with profiler.stage('decrypt'):
+            plaintext = decrypt_bytes(data, key)
+        try:
+            with profiler.stage('yaml parse secrets'):
+                secrets = yaml_loader.safe_load(plaintext.decode('utf-8'))
+        finally:
+            _zeroize(plaintext)
+        if only is not None:
+            secrets = {name: secrets[name] for name in secrets_envelope.select(list(secrets or {}), only)}
+    with _lock:
+        _secrets[cache_key] = secrets
+    return copy.deepcopy(secrets)
+
+
+def invalidate():
+    """Forget all cached keys and secrets, overwriting cached key bytes."""
+    with _lock:
+        for _, key, _ in _keys.values():
+            _zeroize(key)
+        _keys.clear()
+        _secrets.clear()
+
+
+atexit.register(invalidate)
@@ -0,0 +1,112 @@
+"""
+stage_profile.py: Opt-in wall time and peak memory per export stage.
+
+Enabled with --profile on update.py / export-config.py, or by setting
+SE_LAB_PROFILE=table (human-readable table) or SE_LAB_PROFILE=json (one JSON
+object per line). The setting is passed on through the environment, so the
+interpreter started by update.py reports its stages too. Output goes to stderr.
+
+Peak memory is the tracemalloc peak of Python allocations during the stage. The
+peak is process-wide and measuring it resets it, so it is only recorded for stages
+on the main thread. A stage opened inside another first hands the peak so far to
+the enclosing stage, so an outer stage's peak covers its nested stages. Stages on
+other threads (the parallel writers) report wall time only, and the main-thread
+'write targets' stage around them has their combined peak. When profiling is
+off, stage() costs one attribute check.
+"""
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+ENV_VAR = 'SE_LAB_PROFILE'
+# Wall-clock time.time() at which the parent started the child interpreter
+SPAWN_ENV_VAR = 'SE_LAB_PROFILE_SPAWN_T0'
+FORMATS = ['table', 'json']
+
+
+class Profiler:
+    def __init__(self, output_format=None, label=''):
+        self.output_format = None
+        self.label = label
+        self.records = []
+        # Running tracemalloc peak of each open main-thread stage, outermost first
+        self._open = []
+        self._lock = threading.Lock()
+        if output_format:
+            self.enable(output_format)
+
+    @property
+    def enabled(self):
+        return self.output_format is not None
+
+    def enable(self, output_format='table'):
+        if output_format not in FORMATS:
+            output_format = 'table'
+        self.output_format = output_format
+        os.environ[ENV_VAR] = output_format
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _add(self, name, wall_ms, peak_bytes, info):
+        record = {'process': self.label, 'stage': name, 'wall_ms': round(wall_ms, 3),
+                  'peak_kib': None if peak_bytes is None else round(peak_bytes / 1024, 1)}
+        record.update(info)
+        with self._lock:
+            self.records.append(record)
+
+    @contextlib.contextmanager
+    def stage(self, name, **info):
+        if not self.enabled:
+            yield
+            return
+        # Resetting the peak from another thread would clobber a main-thread stage still running
+        measure_peak = threading.current_thread() is threading.main_thread()
+        if measure_peak:
+            if self._open:
+                # Fold the enclosing stage's high-water mark so far into its running max before resetting
+                self._open[-1] = max(self._open[-1], tracemalloc.get_traced_memory()[1])
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            self._open.append(0)
+        start_current = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall_ms = (time.perf_counter() - start) * 1000
+            peak = None
+            if measure_peak:
+                high = max(self._open.pop(), tracemalloc.get_traced_memory()[1])
+                if self._open:
+                    self._open[-1] = max(self._open[-1], high)
+                peak = max(0, high - start_current)
+            self._add(name, wall_ms, peak, info)
+
+    def record_since(self, name, wall_t0, **info):
+        """Record a stage that started at wall-clock time wall_t0 (e.g. in another process)."""
+        if self.enabled:
+            self._add(name, (time.time() - wall_t0) * 1000, None, info)
+
+    def report(self, stream=None):
+        if not self.enabled or not self.records:
+            return
+        stream = stream or sys.stderr
+        if self.output_format == 'json':
+            for record in self.records:
+                stream.write(json.dumps(record) + '\n')
+        else:
+            stream.write(f"\n⏱  Profile: {self.label}\n")
+            stream.write(f"   {'Stage':<48} {'Wall ms':>10} {'Peak KiB':>10}\n")
+            for record in self.records:
+                peak = '-' if record['peak_kib'] is None else f"{record['peak_kib']:.1f}"
+                stream.write(f"   {record['stage']:<48} {record['wall_ms']:>10.3f} {peak:>10}\n")
+        stream.flush()
+        # update.py may run the exporter in-process; each report covers only new stages
+        self.records = []
+
+
+profiler = Profiler(os.environ.get(ENV_VAR) or None, label=os.path.basename(sys.argv[0]) if sys.argv else '')
@@ -0,0 +1,272 @@
+"""
+template_pipeline.py: Resolved index of the VM template pipeline in lab-config.yml.
+
+The pipeline is a graph spread over four sections:
+
+    vm_template_pipeline.candidate_vms
+        <- source_templates.*.source_candidate          (candidate key)
+    vm_template_pipeline.source_templates
+        <- content_library_ovas.*.source_template       (template key)
+    vm_template_pipeline.content_library_ovas
+        <- vm_deployments.*.content_library_template    (OVA file name)
+
+PipelineIndex resolves every link in one pass over the config and keeps forward
+(upstream) and reverse (downstream) lookups, the references that point nowhere
+and per-stage status counts. The CLI prints the pipeline status report, traces a
+single item through the pipeline and checks the references:
+
+    python3 template_pipeline.py status            # what template-pipeline-status.sh shows
+    python3 template_pipeline.py trace ubuntu-2204-base.ova
+    python3 template_pipeline.py check             # exit 1 on dangling references
+"""
+import argparse
+import json
+import sys
+from collections import Counter
+from pathlib import Path
+
+import yaml_loader
+
+# kind -> (config path, name field, field linking to the stage above, kind above, matched by)
+STAGES = {
+    'candidate': (('vm_template_pipeline', 'candidate_vms'), 'vm_name', None, None, None),
+    'template': (('vm_template_pipeline', 'source_templates'), 'template_name', 'source_candidate', 'candidate', 'key'),
+    'ova': (('vm_template_pipeline', 'content_library_ovas'), 'ova_name', 'source_template', 'template', 'key'),
+    'deployment': (('vm_deployments',), 'hostname', 'content_library_template', 'ova', 'ova_name'),
+}
+KINDS = list(STAGES)
+TITLES = {
+    'candidate': '🖥️  Candidate VMs (for installation & customization)',
+    'template': '📋 Source Templates (in vCenter folder)',
+    'ova': '📦 Content Library OVAs (ready for deployment)',
+    'deployment': '🚀 VM Deployments (from Content Library)',
+}
+# Statuses at which an item is usable by the stage below it
+READY_STATUSES = {'active', 'ready', 'completed', 'exported'}
+
+
+def _section(config, path):
+    node = config
+    for part in path:
+        node = node.get(part) if isinstance(node, dict) else None
+    return node if isinstance(node, dict) else {}
+
+
+class PipelineIndex:
+    def __init__(self, config):
+        self.infrastructure = _section(config, ('vm_template_pipeline', 'infrastructure'))
+        self.items = {kind: _section(config, STAGES[kind][0]) for kind in KINDS}
+        self.parent = {}      # (kind, key) -> (kind, key) of the item it was built from
+        self.children = {}    # (kind, key) -> [(kind, key), ...] built from it
+        self.dangling = []    # (kind, key, field, value) references that resolve to nothing
+        self._by_name = {}    # any key or name -> [(kind, key), ...]
+        ova_by_file = {item.get('ova_name'): key for key, item in self.items['ova'].items() if isinstance(item, dict)}
+        for kind in KINDS:
+            _, name_field, link_field, parent_kind, matched_by = STAGES[kind]
+            for key, item in self.items[kind].items():
+                item = item if isinstance(item, dict) else {}
+                self.children.setdefault((kind, key), [])
+                for alias in {key, item.get(name_field)} - {None}:
+                    self._by_name.setdefault(str(alias), []).append((kind, key))
+                if not link_field:
+                    continue
+                target = item.get(link_field)
+                parent_key = ova_by_file.get(target) if matched_by == 'ova_name' else target
+                if parent_key is None or parent_key not in self.items[parent_kind]:
+                    self.dangling.append((kind, key, link_field, target))
+                    continue
+                self.parent[(kind, key)] = (parent_kind, parent_key)
+                self.children.setdefault((parent_kind, parent_key), []).append((kind, key))
+
+    def item(self, node):
+        kind, key = node
+        item = self.items[kind].get(key)
+        return item if isinstance(item, dict) else {}
+
+    def name(self, node):
+        return self.item(node).get(STAGES[node[0]][1]) or node[1]
+
+    def status(self, node):
+        return self.item(node).get('status', 'unknown')
+
+    def find(self, name):
+        """(kind, key) nodes whose key or name (vm_name, template_name, ova_name, hostname) is name."""
+        return list(self._by_name.get(name, []))
+
+    def upstream(self, node):
+        """The chain of items node was built from, nearest first."""
+        chain = []
+        while node in self.parent:
+            node = self.parent[node]
+            chain.append(node)
+        return chain
+
+    def downstream(self, node):
+        """Every item built (directly or not) from node, depth first."""
+        found = []
+        stack = list(reversed(self.children.get(node, [])))
+        while stack:
+            child = stack.pop()
+            found.append(child)
+            stack.extend(reversed(self.children.get(child, [])))
+        return found
+
+    def status_counts(self):
+        return {kind: Counter(self.status((kind, key)) for key in self.items[kind]) for kind in KINDS}
+
+    def blocked(self):
+        """Items marked ready/active whose source is not ready yet."""
+        found = []
+        for node, parent in self.parent.items():
+            if self.status(node) in READY_STATUSES and self.status(parent) not in READY_STATUSES:
+                found.append((node, parent))
+        return found
+
+    def as_dict(self):
+        def describe(node):
+            return {'kind': node[0], 'key': node[1], 'name': self.name(node), 'status': self.status(node)}
+        return {
+            'items': {kind: [dict(describe((kind, key)),
+                                  upstream=[describe(n) for n in self.upstream((kind, key))],
+                                  downstream=[describe(n) for n in self.downstream((kind, key))])
+                             for key in self.items[kind]] for kind in KINDS},
+            'status_counts': {kind: dict(counts) for kind, counts in self.status_counts().items()},
+            'dangling': [{'kind': kind, 'key': key, 'field': field, 'value': value}
+                         for kind, key, field, value in self.dangling],
+            'blocked': [{'item': describe(node), 'source': describe(parent)} for node, parent in self.blocked()],
+        }
+
+
+def load_index(config_path):
+    return PipelineIndex(yaml_loader.load_cached(config_path) or {})
+
+
+def default_config_path():
+    for candidate in (Path.cwd() / 'lab-config.yml', Path(__file__).resolve().parent.parent.parent / 'lab-config.yml'):
+        if candidate.exists():
+            return candidate
+    return Path('lab-config.yml')
+
+
+def print_table(index, kind, extra=None):
+    rows = [(index.name((kind, key)), index.status((kind, key)))
+            + ((str(index.item((kind, key)).get(extra, '')),) if extra else ())
+            for key in index.items[kind]]
+    headers = ({'candidate': 'VM Name', 'template': 'Template Name', 'ova': 'OVA Name',
+                'deployment': 'Hostname'}[kind], 'Status') + ((extra.capitalize(),) if extra else ())
+    widths = [max([len(headers[i])] + [len(str(row[i])) for row in rows]) for i in range(len(headers))]
+    print(f"{TITLES[kind]}:")
+    print("   ┌" + "┬".join("─" * (w + 2) for w in widths) + "┐")
+    print("   │" + "│".join(f" {h:<{w}} " for h, w in zip(headers, widths)) + "│")
+    print("   ├" + "┼".join("─" * (w + 2) for w in widths) + "┤")
+    for row in rows:
+        print("   │" + "│".join(f" {str(c):<{w}} " for c, w in zip(row, widths)) + "│")
+    print("   └" + "┴".join("─" * (w + 2) for w in widths) + "┘")
+    print()
+
+
+def print_status(index):
+    print("🏭 VM Template Creation Pipeline Status")
+    print("=======================================")
+    print()
+    print("📍 Infrastructure:")
+    print(f"   vCenter Folder: {index.infrastructure.get('vcenter_folder', '')}")
+    print(f"   Content Library: {index.infrastructure.get('content_library', '')}")
+    print(f"   Repository: {index.infrastructure.get('repository', '')}")
+    print()
+    print_table(index, 'candidate')
+    print_table(index, 'template')
+    print_table(index, 'ova', extra='version')
+    print_table(index, 'deployment')
+
+    print("🔗 Pipeline Lineage (candidate → template → OVA → deployments):")
+    for key in index.items['candidate']:
+        print(f"   {index.name(('candidate', key))} [{index.status(('candidate', key))}]")
+        for template in index.children[('candidate', key)]:
+            print(f"     └─ {index.name(template)} [{index.status(template)}]")
+            for ova in index.children[template]:
+                deployments = ', '.join(index.name(node) for node in index.children[ova]) or 'no deployments'
+                print(f"          └─ {index.name(ova)} [{index.status(ova)}] → {deployments}")
+    print()
+    print("📊 Status Rollup:")
+    for kind, counts in index.status_counts().items():
+        summary = ', '.join(f"{count} {status}" for status, count in sorted(counts.items())) or 'none'
+        print(f"   {kind + 's':<12} {summary}")
+    print()
+    print_issues(index)
+
+    print("🔧 Pipeline Workflow:")
+    print("   1. Build Candidate VMs from base ISOs")
+    print("   2. Run installation scripts (OS setup, domain join, security)")
+    print("   3. Run customization scripts (tools, configuration)")
+    print("   4. Create Source Templates in vCenter folder")
+    print("   5. Export to Content Library as OVAs")
+    print("   6. Deploy from Content Library for production use")
+    print()
+    print("📋 Status Legend:")
+    print("   planned  - Scheduled for creation")
+    print("   active   - Currently running/available")
+    print("   building - In progress")
+    print("   ready    - Completed and available")
+    print("   exported - Available in content library")
+    print()
+    print("💡 Use these scripts to manage the pipeline:")
+    print("   scripts/build-candidate-vm.sh <vm_name>     - Build a candidate VM")
+    print("   scripts/customize-candidate.sh <vm_name>    - Run customization scripts")
+    print("   scripts/create-source-template.sh <vm_name> - Create source template")
+    print("   scripts/export-to-ova.sh <template_name>    - Export to content library")
+
+
+def print_issues(index):
+    if not index.dangling and not index.blocked():
+        print("✅ All pipeline references resolve")
+        print()
+        return
+    for kind, key, field, value in index.dangling:
+        print(f"❌ {kind} '{key}': {field} '{value}' does not match any {STAGES[kind][3]}")
+    for node, parent in index.blocked():
+        print(f"⚠️  {node[0]} '{index.name(node)}' is {index.status(node)} but its source "
+              f"{parent[0]} '{index.name(parent)}' is {index.status(parent)}")
+    print()
+
+
+def print_trace(index, name):
+    nodes = index.find(name)
+    if not nodes:
+        print(f"❌ Nothing in the pipeline is called '{name}'", file=sys.stderr)
+        return 1
+    for node in nodes:
+        print(f"{node[0]} {node[1]} ({index.name(node)}) [{index.status(node)}]")
+        for above in index.upstream(node):
+            print(f"  ↑ {above[0]} {above[1]} ({index.name(above)}) [{index.status(above)}]")
+        for below in index.downstream(node):
+            print(f"  ↓ {below[0]} {below[1]} ({index.name(below)}) [{index.status(below)}]")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the VM template pipeline in lab-config.yml.")
+    parser.add_argument('--config', default=None, help='Config YAML path (default: ./lab-config.yml or the repo copy)')
+    parser.add_argument('--json', action='store_true', help='Print the resolved index as JSON')
+    sub = parser.add_subparsers(dest='command')
+    sub.add_parser('status', help='Show the pipeline status report (default)')
+    trace = sub.add_parser('trace', help='Show where an item comes from and what is built from it')
+    trace.add_argument('name', help='Key or name of a candidate, template, OVA or deployment')
+    sub.add_parser('check', help='Report dangling references; exit 1 if there are any')
+    args = parser.parse_args()
+
+    index = load_index(args.config or default_config_path())
+    if args.json:
+        print(json.dumps(index.as_dict(), indent=2))
+        return 1 if args.command == 'check' and index.dangling else 0
+    if args.command == 'trace':
+        return print_trace(index, args.name)
+    if args.command == 'check':
+        print_issues(index)
+        return 1 if index.dangling else 0
+    print_status(index)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
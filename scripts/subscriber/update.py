@@ -1,10 +1,30 @@
 """
 update.py: Runs config/secrets export with flexible output options.
+
+Before exporting it checks the export cache manifest, and returns immediately
+when every requested target is already up to date. When the running interpreter
+already has PyYAML and cryptography (e.g. it is the venv python), the exporter is
+imported and run in-process; otherwise it is started in the venv interpreter.
+With --batch SITES.yml it exports every site in a sites manifest in parallel
+(see batch_export.py).
+Outputs that are streams ('-', 'fd:N', a named pipe) are never cached; with
+'-' this script's own messages go to stderr so stdout carries only the export.
 """
 import argparse
+import contextlib
+import importlib
+import importlib.util
+import os
 import subprocess
+import sys
+import time
 from pathlib import Path
 
+import export_cache
+import export_io
+import stage_profile
+from stage_profile import profiler
+
 def find_repo_root():
     cur = Path(__file__).resolve().parent
     while cur != cur.parent:
@@ -16,30 +36,174 @@ def find_repo_root():
 REPO_ROOT = find_repo_root()
 VENV_DIR = REPO_ROOT / '.venv'
 EXPORT_SCRIPT = Path(__file__).parent / 'export-config.py'
+BATCH_SCRIPT = Path(__file__).parent / 'batch_export.py'
+EXPORT_DEPENDENCIES = ('yaml', 'cryptography')
+
+def can_export_in_process():
+    """True when this interpreter can import the exporter's dependencies (without importing them)."""
+    return all(importlib.util.find_spec(name) is not None for name in EXPORT_DEPENDENCIES)
 
-def run_in_venv(args):
+def run_in_process(args):
+    # export-config.py sits next to this file (or in the same zipapp), so it is importable by name
+    with profiler.stage('import export-config'):
+        exporter = importlib.import_module('export-config')
+    print(f"Running in-process: {sys.executable} {EXPORT_SCRIPT.name} {' '.join(args)}")
+    with profiler.stage('export (in-process)'):
+        exporter.main(args)
+
+def run_in_venv(args, script=EXPORT_SCRIPT, pass_fds=()):
     python_path = VENV_DIR / 'bin' / 'python'
-    cmd = [str(python_path), str(EXPORT_SCRIPT)] + args
+    cmd = [str(python_path), str(script)] + args
     print(f"Running: {' '.join(cmd)}")
-    subprocess.run(cmd, check=True)
+    env = os.environ.copy()
+    if profiler.enabled:
+        env[stage_profile.SPAWN_ENV_VAR] = repr(time.time())
+    with profiler.stage('run_in_venv (spawn + export)'):
+        subprocess.run(cmd, check=True, env=env, pass_fds=pass_fds)
+
+def all_fresh(targets, args):
+    """True when the cache manifest shows every target is current; never raises."""
+    try:
+        if args.manifest:
+            recalled = export_cache.recall_targets(args.manifest)
+            if recalled is None:
+                return False
+            targets = recalled + targets
+        if any(export_io.stream_output(output) for _, output in targets):
+            return False
+        fingerprint = export_cache.input_fingerprint(
+            args.config, args.secrets, args.key, export_cache.options_from_args(args))
+        if not all(export_cache.is_fresh(export_type, output, fingerprint) for export_type, output in targets):
+            return False
+        if args.feed:
+            import delta_feed
+            if not delta_feed.Feed(export_cache.resolve_path(args.feed)).is_fresh(fingerprint):
+                return False
+    except (OSError, ValueError):
+        return False
+    for _, output in targets:
+        print(f"✓ {output} is up to date")
+    return True
 
 def main():
     parser = argparse.ArgumentParser(description="Update and export config/secrets files.")
-    parser.add_argument('--type', choices=['env', 'json', 'ps1'], required=True, help='Output file type')
-    parser.add_argument('--output', required=True, help='Output file path')
+    parser.add_argument('--type', action='append', choices=['env', 'json', 'ps1', 'snap'], help='Output file type (repeat with --output for several targets)')
+    parser.add_argument('--output', action='append',
+                        help="Output file path (paired with the --type in the same position); '-', 'fd:N' or 'fifo:PATH' streams it")
+    parser.add_argument('--manifest', help='YAML file listing export targets')
+    parser.add_argument('--batch', metavar='SITES.yml', help='Export every site in a sites manifest in parallel (see batch_export.py)')
+    parser.add_argument('--sites', metavar='NAME[,NAME...]', help='With --batch: export only these sites')
+    parser.add_argument('--jobs', '-j', type=int, help='With --batch: worker processes (default: one per CPU)')
     parser.add_argument('--config', default='lab-config.yml', help='Config YAML path')
+    parser.add_argument('--overlay', action='append', help='YAML file deep-merged over the config (repeat for a chain)')
+    parser.add_argument('--merge-policy', choices=['override', 'keep', 'error'], help='How overlays treat values the config already sets')
+    parser.add_argument('--list-merge', choices=['replace', 'append'], help='Whether overlay lists replace or extend existing lists')
     parser.add_argument('--secrets', default='secrets.yml.encrypted', help='Encrypted secrets file path')
     parser.add_argument('--key', default=str(Path.home() / '.purestorage/se-lab-melau.key'), help='Key file path')
+    parser.add_argument('--list-format', choices=['native', 'join', 'index', 'json'], help='How to flatten list values')
+    parser.add_argument('--only', type=export_cache.parse_only, metavar='NAME[,NAME...]',
+                        help='Decrypt and export only these top-level secrets subtrees')
+    parser.add_argument('--validate', type=export_cache.parse_validate, metavar='NAME[,NAME...]',
+                        help=f"Check the config before writing ({', '.join(export_cache.VALIDATOR_NAMES)})")
+    parser.add_argument('--schema', help='Schema for --validate schema (default: lab-config.schema.yml next to the config)')
+    parser.add_argument('--feed', metavar='DIR', help='Also publish changed exports as versioned deltas to this feed directory')
+    parser.add_argument('--feed-keep', type=int, metavar='N', help='Deltas to keep in the feed')
+    parser.add_argument('--profile', nargs='?', const='table', choices=stage_profile.FORMATS,
+                        help=f"Report wall time and peak memory per stage on stderr (or set {stage_profile.ENV_VAR})")
+    parser.add_argument('--subprocess', action='store_true', help='Always run the exporter in the venv interpreter, never in-process')
+    parser.add_argument('--force', action='store_true', help='Regenerate targets even if they are up to date')
+    parser.add_argument('--no-cache', action='store_true', help='Neither consult nor update the export cache manifest')
     args = parser.parse_args()
 
-    export_args = [
-        '--type', args.type,
-        '--output', args.output,
+    types = args.type or []
+    outputs = args.output or []
+    if args.batch:
+        if types or outputs or args.manifest:
+            parser.error("--batch takes its targets from the sites manifest; drop --type/--output/--manifest")
+    elif args.sites or args.jobs:
+        parser.error("--sites and --jobs need --batch")
+    elif len(types) != len(outputs):
+        parser.error(f"Got {len(types)} --type and {len(outputs)} --output arguments; they must be given in pairs")
+    elif not types and not args.manifest:
+        parser.error("No export targets given; use --type/--output or --manifest")
+    if args.feed_keep is not None and args.feed_keep < 1:
+        parser.error("--feed-keep must be at least 1")
+
+    if args.profile:
+        profiler.enable(args.profile)
+    to_stdout = export_io.STDOUT in outputs
+    try:
+        with contextlib.redirect_stdout(sys.stderr) if to_stdout else contextlib.nullcontext():
+            if args.batch:
+                update_batch(args)
+            else:
+                update(args, types, outputs)
+    except subprocess.CalledProcessError as e:
+        # The exporter has already reported what went wrong (e.g. failed --validate checks)
+        sys.exit(e.returncode)
+    finally:
+        profiler.report()
+
+def update_batch(args):
+    batch_args = [args.batch]
+    if args.sites:
+        batch_args += ['--sites', args.sites]
+    if args.jobs:
+        batch_args += ['--jobs', str(args.jobs)]
+    if args.force:
+        batch_args.append('--force')
+    if args.no_cache:
+        batch_args.append('--no-cache')
+    if not args.subprocess and can_export_in_process():
+        import batch_export
+        print(f"Running in-process: {sys.executable} {BATCH_SCRIPT.name} {' '.join(batch_args)}")
+        batch_export.main(batch_args)
+    else:
+        run_in_venv(batch_args, BATCH_SCRIPT)
+
+def update(args, types, outputs):
+    with profiler.stage('cache check'):
+        fresh = not (args.force or args.no_cache) and all_fresh(list(zip(types, outputs)), args)
+    if fresh:
+        return
+
+    export_args = []
+    for export_type, output in zip(types, outputs):
+        export_args += ['--type', export_type, '--output', output]
+    if args.manifest:
+        export_args += ['--manifest', args.manifest]
+    export_args += [
         '--config', args.config,
         '--secrets', args.secrets,
         '--key', args.key
     ]
-    run_in_venv(export_args)
+    for overlay in args.overlay or []:
+        export_args += ['--overlay', overlay]
+    if args.merge_policy:
+        export_args += ['--merge-policy', args.merge_policy]
+    if args.list_merge:
+        export_args += ['--list-merge', args.list_merge]
+    if args.list_format:
+        export_args += ['--list-format', args.list_format]
+    if args.only:
+        export_args += ['--only', ','.join(args.only)]
+    if args.validate:
+        export_args += ['--validate', ','.join(args.validate)]
+    if args.schema:
+        export_args += ['--schema', args.schema]
+    if args.feed:
+        export_args += ['--feed', args.feed]
+    if args.feed_keep is not None:
+        export_args += ['--feed-keep', str(args.feed_keep)]
+    if args.force:
+        export_args.append('--force')
+    if args.no_cache:
+        export_args.append('--no-cache')
+    if not args.subprocess and can_export_in_process():
+        run_in_process(export_args)
+    else:
+        # Descriptors named by fd:N outputs must survive into the exporter process
+        run_in_venv(export_args, pass_fds=[fd for fd in map(export_io.stream_fd, outputs) if fd not in (None, 1)])
 
 if __name__ == '__main__':
     main()
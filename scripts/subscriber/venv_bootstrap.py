@@ -0,0 +1,105 @@
+"""
+venv_bootstrap.py: Create the .venv from the hash-locked requirements.lock, or reuse it.
+
+All requirements are installed by a single `pip install --require-hashes` run, so
+pip resolves them once and refuses any file whose hash is not in the lockfile.
+After a successful install a stamp inside the venv records a fingerprint of the
+lockfile and of the interpreter that built it. A venv whose stamp matches is
+reused without running pip; a missing, broken or stale venv (no stamp, other
+lockfile, other Python) is rebuilt from scratch.
+
+For offline installs, point --wheelhouse (or $SE_LAB_WHEELHOUSE) at a directory of
+wheels, e.g. one filled by `install.py --download-wheelhouse DIR` on a connected
+machine; pip then runs with --no-index --find-links DIR.
+"""
+import datetime
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+from pathlib import Path
+
+LOCKFILE = Path(__file__).resolve().parent / 'requirements.lock'
+STAMP_NAME = '.se-lab-bootstrap.json'
+WHEELHOUSE_ENV = 'SE_LAB_WHEELHOUSE'
+
+
+def run(cmd, check=True):
+    print(f"Running: {' '.join(str(part) for part in cmd)}")
+    subprocess.run([str(part) for part in cmd], check=check)
+
+
+def venv_python(venv_dir):
+    return Path(venv_dir) / 'bin' / 'python'
+
+
+def fingerprint(lockfile=LOCKFILE):
+    """Hash of the lockfile and the interpreter that builds the venv."""
+    digest = hashlib.sha256()
+    digest.update(Path(lockfile).read_bytes())
+    for part in (os.path.realpath(sys.executable), sys.version, platform.machine()):
+        digest.update(b'\0' + part.encode())
+    return digest.hexdigest()
+
+
+def read_stamp(venv_dir):
+    try:
+        with open(Path(venv_dir) / STAMP_NAME, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_current(venv_dir, lockfile=LOCKFILE):
+    """True when venv_dir was built from this lockfile by this interpreter and still has its python."""
+    stamp = read_stamp(venv_dir)
+    return bool(stamp) and stamp.get('fingerprint') == fingerprint(lockfile) and venv_python(venv_dir).exists()
+
+
+def _write_stamp(venv_dir, lockfile):
+    stamp = {
+        'fingerprint': fingerprint(lockfile),
+        'lockfile_sha256': hashlib.sha256(Path(lockfile).read_bytes()).hexdigest(),
+        'python': os.path.realpath(sys.executable),
+        'python_version': platform.python_version(),
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+    }
+    tmp_path = Path(venv_dir) / f".{STAMP_NAME}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(stamp, f, indent=2)
+    os.replace(tmp_path, Path(venv_dir) / STAMP_NAME)
+
+
+def pip_install_args(lockfile=LOCKFILE, wheelhouse=None):
+    args = ['-m', 'pip', 'install', '--disable-pip-version-check', '--require-hashes', '-r', lockfile]
+    if wheelhouse:
+        args += ['--no-index', '--find-links', wheelhouse]
+    return args
+
+
+def ensure_venv(venv_dir, lockfile=LOCKFILE, wheelhouse=None, force=False):
+    """Make venv_dir match lockfile; returns True if it was (re)built, False if reused."""
+    venv_dir = Path(venv_dir)
+    wheelhouse = wheelhouse or os.environ.get(WHEELHOUSE_ENV)
+    if not force and is_current(venv_dir, lockfile):
+        print(f"Virtualenv at {venv_dir} is up to date with {Path(lockfile).name}")
+        return False
+    if venv_dir.exists():
+        reason = 'rebuild requested' if force else 'lockfile or interpreter changed, or venv incomplete'
+        print(f"Rebuilding virtualenv at {venv_dir} ({reason})")
+    # --clear empties an existing directory, so no stale packages survive
+    run([sys.executable, '-m', 'venv', '--clear', venv_dir])
+    run([venv_python(venv_dir)] + pip_install_args(lockfile, wheelhouse))
+    _write_stamp(venv_dir, lockfile)
+    print(f"Installed {Path(lockfile).name} into {venv_dir}")
+    return True
+
+
+def download_wheelhouse(venv_dir, directory, lockfile=LOCKFILE):
+    """Download every locked file this platform needs into directory, for later offline installs."""
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    run([venv_python(venv_dir), '-m', 'pip', 'download', '--disable-pip-version-check',
+         '--require-hashes', '-r', lockfile, '-d', directory])
+    print(f"Wheelhouse ready at {directory}")
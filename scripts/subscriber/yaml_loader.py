@@ -0,0 +1,120 @@
+"""
+yaml_loader.py: Fast YAML loading with the libyaml C loader and an on-disk parse cache.
+
+safe_load() uses yaml.CSafeLoader when PyYAML was built with libyaml and falls back
+to the pure-Python SafeLoader otherwise; LOADER_NAME says which one is in use.
+PyYAML is imported on first use, so a load_cached() hit never imports it.
+
+load_cached() keeps a pickled copy of a parsed config file under
+~/.cache/se-lab-melau-config/yaml/. The pickle is reused while the file's size and
+mtime are unchanged, or, if those changed, while its SHA-256 still matches (e.g.
+after a git checkout that rewrote an identical file). Only non-secret config goes
+through this cache; decrypted secrets are never written to disk.
+
+    python3 yaml_loader.py lab-config.yml   # show loader and parse/cache timings
+"""
+import hashlib
+import os
+import pickle
+import sys
+import time
+from pathlib import Path
+
+CACHE_DIR = Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'se-lab-melau-config' / 'yaml'
+CACHE_FORMAT = 1
+
+# How the most recent load_cached() call was satisfied: 'cache', 'cache (hash match)' or LOADER_NAME
+last_source = None
+_loader = None
+
+
+def _safe_loader():
+    """(yaml module, loader class, loader name), importing PyYAML on first call."""
+    global _loader
+    if _loader is None:
+        import yaml
+        try:
+            _loader = (yaml, yaml.CSafeLoader, 'CSafeLoader (libyaml)')
+        except AttributeError:
+            _loader = (yaml, yaml.SafeLoader, 'SafeLoader (pure Python)')
+    return _loader
+
+
+def __getattr__(name):
+    if name == 'LOADER_NAME':
+        return _safe_loader()[2]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def safe_load(stream):
+    yaml, loader, _ = _safe_loader()
+    return yaml.load(stream, Loader=loader)
+
+
+def compose(stream):
+    """Node tree of a YAML document (keeps line/column marks and duplicate keys)."""
+    yaml, loader, _ = _safe_loader()
+    return yaml.compose(stream, Loader=loader)
+
+
+def _cache_path(path):
+    return CACHE_DIR / f"{hashlib.sha256(str(path).encode()).hexdigest()}.pickle"
+
+
+def _write_cache(cache_path, entry):
+    cache_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    tmp_path = cache_path.with_name(f".{cache_path.name}.{os.getpid()}.tmp")
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+
+
+def load_cached(path):
+    """Parse the YAML file at path, reusing the cached parse when the file is unchanged."""
+    global last_source
+    path = Path(path).resolve()
+    st = path.stat()
+    stamp = (st.st_size, st.st_mtime_ns)
+    cache_path = _cache_path(path)
+    entry = None
+    try:
+        with open(cache_path, 'rb') as f:
+            entry = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        pass
+    if entry and entry.get('format') == CACHE_FORMAT and entry.get('stamp') == stamp:
+        last_source = 'cache'
+        return entry['data']
+
+    raw = path.read_bytes()
+    digest = hashlib.sha256(raw).hexdigest()
+    if entry and entry.get('format') == CACHE_FORMAT and entry.get('sha256') == digest:
+        data = entry['data']
+        last_source = 'cache (hash match)'
+    else:
+        data = safe_load(raw)
+        last_source = _safe_loader()[2]
+    try:
+        _write_cache(cache_path, {'format': CACHE_FORMAT, 'stamp': stamp, 'sha256': digest, 'data': data})
+    except OSError:
+        pass
+    return data
+
+
+def main():
+    print(f"YAML loader: {_safe_loader()[2]}")
+    for name in sys.argv[1:]:
+        raw = Path(name).read_bytes()
+        start = time.perf_counter()
+        safe_load(raw)
+        parse_ms = (time.perf_counter() - start) * 1000
+        load_cached(name)
+        start = time.perf_counter()
+        load_cached(name)
+        cached_ms = (time.perf_counter() - start) * 1000
+        print(f"{name}: parse {parse_ms:.2f} ms, cached load {cached_ms:.2f} ms ({last_source})")
+
+
+if __name__ == '__main__':
+    main()
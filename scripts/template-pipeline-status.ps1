@@ -1,58 +1,53 @@
 # template-pipeline-status.ps1
 # PowerShell script to show VM template creation pipeline status
+#
+# Like template-pipeline-status.sh, the report comes from
+# scripts/subscriber/template_pipeline.py, which resolves candidate VMs, source
+# templates, OVAs and deployments straight from lab-config.yml. Extra arguments
+# are passed through, e.g.:
+#   .\scripts\template-pipeline-status.ps1 --json
+#   .\scripts\template-pipeline-status.ps1 trace ubuntu-2204-base.ova
+#   .\scripts\template-pipeline-status.ps1 check
 
 $ErrorActionPreference = "Stop"
 
-Write-Host "🏭 VM Template Creation Pipeline Status (PowerShell)" -ForegroundColor Cyan
-Write-Host "=====================================================" -ForegroundColor Cyan
-Write-Host ""
+$configDir = Join-Path $PSScriptRoot ".."
 
-# Load the PowerShell configuration
-$configPath = Join-Path $PSScriptRoot "..\export\lab-config.ps1"
-if (Test-Path $configPath) {
-    . $configPath
-    Write-Host "✅ Configuration loaded from $configPath" -ForegroundColor Green
-} else {
-    Write-Host "❌ Error: Configuration not found at $configPath" -ForegroundColor Red
-    Write-Host "   Run 'make export' first to generate configuration files." -ForegroundColor Yellow
+# The venv `make install` created is in the first directory above this one that has a
+# .venv (the parent repo when this is its config/ submodule), as in update.py's
+# find_repo_root; python3/python are only used if they have PyYAML too
+$dir = $PSScriptRoot
+while ($dir -and -not (Test-Path (Join-Path $dir ".venv"))) {
+    $dir = Split-Path $dir -Parent
+}
+$candidates = @()
+if ($dir) {
+    $candidates += (Join-Path $dir ".venv\Scripts\python.exe"), (Join-Path $dir ".venv/bin/python")
+}
+$candidates += "python3", "python"
+
+$python = $null
+foreach ($candidate in $candidates) {
+    if (-not (Get-Command $candidate -ErrorAction SilentlyContinue)) {
+        continue
+    }
+    try {
+        # Windows PowerShell turns stderr into an error under "Stop"; a failed import just means "not this one"
+        & $candidate -c "import yaml" 2>$null | Out-Null
+    } catch {
+        continue
+    }
+    if ($LASTEXITCODE -eq 0) {
+        $python = $candidate
+        break
+    }
+}
+if (-not $python) {
+    Write-Host "❌ Error: no Python with PyYAML found for template_pipeline.py" -ForegroundColor Red
+    Write-Host "   Looked for a .venv above $PSScriptRoot, then python3 and python; run 'make install' first." -ForegroundColor Yellow
     exit 1
 }
 
-Write-Host ""
-Write-Host "📍 Infrastructure:" -ForegroundColor Yellow
-Write-Host "   vCenter Folder: $VM_TEMPLATE_PIPELINE_INFRASTRUCTURE_VCENTER_FOLDER"
-Write-Host "   Content Library: $VM_TEMPLATE_PIPELINE_INFRASTRUCTURE_CONTENT_LIBRARY"
-Write-Host "   Repository: $VM_TEMPLATE_PIPELINE_INFRASTRUCTURE_REPOSITORY"
-Write-Host ""
-
-Write-Host "🖥️  Candidate VMs:" -ForegroundColor Yellow
-Write-Host "   Ubuntu 22.04: $VM_TEMPLATE_PIPELINE_CANDIDATE_VMS_UBUNTU_2204_CANDIDATE_VM_NAME ($VM_TEMPLATE_PIPELINE_CANDIDATE_VMS_UBUNTU_2204_CANDIDATE_STATUS)"
-Write-Host "   Ubuntu 24.04: $VM_TEMPLATE_PIPELINE_CANDIDATE_VMS_UBUNTU_2404_CANDIDATE_VM_NAME ($VM_TEMPLATE_PIPELINE_CANDIDATE_VMS_UBUNTU_2404_CANDIDATE_STATUS)"
-Write-Host "   Windows 2022: $VM_TEMPLATE_PIPELINE_CANDIDATE_VMS_WINDOWS_2022_CANDIDATE_VM_NAME ($VM_TEMPLATE_PIPELINE_CANDIDATE_VMS_WINDOWS_2022_CANDIDATE_STATUS)"
-Write-Host ""
-
-Write-Host "📋 Source Templates:" -ForegroundColor Yellow
-Write-Host "   Ubuntu 22.04 Single: $VM_TEMPLATE_PIPELINE_SOURCE_TEMPLATES_UBUNTU_2204_SINGLE_HOMED_TEMPLATE_NAME ($VM_TEMPLATE_PIPELINE_SOURCE_TEMPLATES_UBUNTU_2204_SINGLE_HOMED_STATUS)"
-Write-Host "   Ubuntu 22.04 Dual:   $VM_TEMPLATE_PIPELINE_SOURCE_TEMPLATES_UBUNTU_2204_DUAL_HOMED_TEMPLATE_NAME ($VM_TEMPLATE_PIPELINE_SOURCE_TEMPLATES_UBUNTU_2204_DUAL_HOMED_STATUS)"
-Write-Host "   Ubuntu 24.04 Single: $VM_TEMPLATE_PIPELINE_SOURCE_TEMPLATES_UBUNTU_2404_SINGLE_HOMED_TEMPLATE_NAME ($VM_TEMPLATE_PIPELINE_SOURCE_TEMPLATES_UBUNTU_2404_SINGLE_HOMED_STATUS)"
-Write-Host "   Windows 2022 Single: $VM_TEMPLATE_PIPELINE_SOURCE_TEMPLATES_WINDOWS_2022_SINGLE_HOMED_TEMPLATE_NAME ($VM_TEMPLATE_PIPELINE_SOURCE_TEMPLATES_WINDOWS_2022_SINGLE_HOMED_STATUS)"
-Write-Host ""
-
-Write-Host "📦 Content Library OVAs:" -ForegroundColor Yellow
-Write-Host "   $VM_TEMPLATE_PIPELINE_CONTENT_LIBRARY_OVAS_UBUNTU_2204_BASE_OVA_NAME ($VM_TEMPLATE_PIPELINE_CONTENT_LIBRARY_OVAS_UBUNTU_2204_BASE_STATUS) v$VM_TEMPLATE_PIPELINE_CONTENT_LIBRARY_OVAS_UBUNTU_2204_BASE_VERSION"
-Write-Host "   $VM_TEMPLATE_PIPELINE_CONTENT_LIBRARY_OVAS_UBUNTU_2204_DUAL_OVA_NAME ($VM_TEMPLATE_PIPELINE_CONTENT_LIBRARY_OVAS_UBUNTU_2204_DUAL_STATUS) v$VM_TEMPLATE_PIPELINE_CONTENT_LIBRARY_OVAS_UBUNTU_2204_DUAL_VERSION"
-Write-Host "   $VM_TEMPLATE_PIPELINE_CONTENT_LIBRARY_OVAS_UBUNTU_2404_BASE_OVA_NAME ($VM_TEMPLATE_PIPELINE_CONTENT_LIBRARY_OVAS_UBUNTU_2404_BASE_STATUS) v$VM_TEMPLATE_PIPELINE_CONTENT_LIBRARY_OVAS_UBUNTU_2404_BASE_VERSION"
-Write-Host "   $VM_TEMPLATE_PIPELINE_CONTENT_LIBRARY_OVAS_WINDOWS_2022_BASE_OVA_NAME ($VM_TEMPLATE_PIPELINE_CONTENT_LIBRARY_OVAS_WINDOWS_2022_BASE_STATUS) v$VM_TEMPLATE_PIPELINE_CONTENT_LIBRARY_OVAS_WINDOWS_2022_BASE_VERSION"
-Write-Host ""
-
-Write-Host "💡 Example Usage in PowerShell Scripts:" -ForegroundColor Green
-Write-Host @"
-   # Deploy a VM from the pipeline
-   `$ovaPath = "`$VM_TEMPLATE_PIPELINE_INFRASTRUCTURE_CONTENT_LIBRARY/`$VM_TEMPLATE_PIPELINE_CONTENT_LIBRARY_OVAS_UBUNTU_2204_BASE_OVA_NAME"
-   New-VM -Name "my-new-vm" -Template `$ovaPath
-   
-   # Check if a template is ready
-   if (`$VM_TEMPLATE_PIPELINE_CONTENT_LIBRARY_OVAS_UBUNTU_2204_BASE_STATUS -eq "active") {
-       Write-Host "Ubuntu 22.04 template is ready for deployment"
-   }
-"@
+$pipelineArgs = if ($args.Count -eq 0) { @("status") } else { $args }
+& $python (Join-Path $PSScriptRoot "subscriber/template_pipeline.py") --config (Join-Path $configDir "lab-config.yml") @pipelineArgs
+exit $LASTEXITCODE
@@ -1,11 +1,18 @@
 #!/bin/bash
 # verify-certificates.sh
 # Verifies that SE Lab Melbourne CA certificates are properly installed
+#
+# The checks come from scripts/subscriber/cert_index.py: expiry, drift between
+# the files and the certificates section of lab-config.yml, ca_bundle.cer
+# membership and issuer signatures. Extra arguments are passed through, e.g.:
+#   ./scripts/verify-certificates.sh --warn-days 365
+#   ./scripts/verify-certificates.sh --json
 
 set -e
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
-CERT_DIR="$SCRIPT_DIR/../certificates"
+CONFIG_DIR="$SCRIPT_DIR/.."
+CERT_DIR="$CONFIG_DIR/certificates"
 
 echo "🔐 SE Lab Melbourne Certificate Verification"
 echo "=============================================="
@@ -16,18 +23,31 @@ if [ ! -d "$CERT_DIR" ]; then
     exit 1
 fi
 
-echo "📁 Certificate files:"
-for cert in "$CERT_DIR"/*.cer; do
-    if [ -f "$cert" ]; then
-        echo "   ✓ $(basename "$cert")"
-        # Verify it's a valid certificate
-        if openssl x509 -in "$cert" -noout -text >/dev/null 2>&1; then
-            echo "     Valid X.509 certificate"
-        else
-            echo "     ⚠️  Warning: Not a valid X.509 certificate"
+# The venv `make install` created is in the first directory above this one that has a
+# .venv (the parent repo when this is its config/ submodule), as in update.py's
+# find_repo_root; python3 is only used if it has the modules too
+find_python() {
+    local dir="$SCRIPT_DIR" candidate
+    while [ "$dir" != "/" ] && [ ! -e "$dir/.venv" ]; do
+        dir="$(dirname "$dir")"
+    done
+    for candidate in "$dir/.venv/bin/python" python3; do
+        if "$candidate" -c "import yaml, cryptography" >/dev/null 2>&1; then
+            echo "$candidate"
+            return 0
         fi
-    fi
-done
+    done
+    return 1
+}
+
+# Parse, check expiry, config drift, bundle membership and chains in one process
+if ! PYTHON="$(find_python)"; then
+    echo "❌ Error: no Python with PyYAML and cryptography found for cert_index.py"
+    echo "   Looked for a .venv above $SCRIPT_DIR, then python3; run 'make install' first."
+    exit 1
+fi
+STATUS=0
+"$PYTHON" "$SCRIPT_DIR/subscriber/cert_index.py" --config "$CONFIG_DIR/lab-config.yml" --cert-dir "$CERT_DIR" "$@" check || STATUS=$?
 
 echo ""
 echo "🖥️  System certificate store status:"
@@ -54,3 +74,5 @@ echo "   - export/lab-config.ps1 (PowerShell variables)"
 
 echo ""
 echo "📖 For detailed installation instructions, see certificates/README.md"
+
+exit $STATUS